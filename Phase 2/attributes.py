@@ -5,14 +5,18 @@ AttributeTypes = TypeVarTuple('AttributeTypes')
 class Attributes(Generic[*AttributeTypes]):
 
     def __init__(self, attribute_pairs: list[tuple[str, str]],
-                 primary_keys: list[str] = [], foreign_keys: dict[str, tuple[str, str]] = {}) -> None:
+                 primary_keys: list[str] = [], foreign_keys: dict[str, tuple[str, str]] = {},
+                 indexes: list[list[str]] = []) -> None:
         
         self.attribute_names, self.attribute_types = tuple(zip(*attribute_pairs))
         if not set(primary_keys) <= set(self.attribute_names)\
             or not set(foreign_keys) <= set(self.attribute_names):
             raise ValueError("Primary keys and foreign keys need to be a subset of attributes")
+        if not all(index and set(index) <= set(self.attribute_names) for index in indexes):
+            raise ValueError("Indexed columns need to be a non-empty subset of attributes")
         self.primary_keys = primary_keys
         self.foreign_keys = foreign_keys
+        self.indexes = indexes # Columns of each secondary index, in index order
         self.length = len(self.attribute_names)
 
     def __str__(self) -> str:
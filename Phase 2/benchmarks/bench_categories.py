@@ -0,0 +1,70 @@
+"""
+This script benchmarks extracting every table from the coordinates (extract.py) against extracting them
+from the mmCIF categories alone (categories.py), and checks that both give the same rows.
+Each file is extracted in a fresh worker process, so the peak RSS reported is that of extracting the one file.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_categories [rootdir]".
+"""
+
+import sys
+import time
+import resource
+import multiprocessing
+
+from ingest import find_files, extract_file
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+repeats = 3
+
+def extract(file_path: str, from_categories: bool) -> tuple[float, float, dict[str, list[tuple]]]:
+    """
+    Extracts a protein file and returns the time taken in seconds, the increase in peak RSS in MiB and the rows.
+    """
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    result = extract_file(file_path, from_categories=from_categories)
+    elapsed = time.perf_counter() - start
+    if result.error is not None:
+        raise RuntimeError(f"{file_path} failed at {result.stage}: {result.error}")
+    # ru_maxrss is in KiB on Linux
+    return elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024, result.rows
+
+def measure(file_path: str, from_categories: bool) -> tuple[float, float, dict[str, list[tuple]]]:
+    """
+    Returns the best time, the peak RSS increase and the rows of extracting a file over several fresh processes.
+    """
+    results = []
+    for _ in range(repeats):
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            results.append(pool.apply(extract, (file_path, from_categories)))
+    return min(result[0] for result in results), max(result[1] for result in results), results[0][2]
+
+def different_tables(rows: dict[str, list[tuple]], other_rows: dict[str, list[tuple]]) -> list[str]:
+    return [name for name in rows if sorted(map(repr, rows[name])) != sorted(map(repr, other_rows.get(name, [])))]
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    totals = {False: [0.0, 0.0], True: [0.0, 0.0]}
+    file_paths = sorted(find_files(rootdir))
+    mismatches = 0
+    print(f"{'file':<30} {'coordinates (s)':>16} {'categories (s)':>15} {'coordinates (MiB)':>18} "
+          f"{'categories (MiB)':>17}  different tables")
+    for file_path in file_paths:
+        before = measure(file_path, from_categories=False)
+        after = measure(file_path, from_categories=True)
+        for mode, (elapsed, rss, _) in ((False, before), (True, after)):
+            totals[mode][0] += elapsed
+            totals[mode][1] = max(totals[mode][1], rss)
+        different = different_tables(before[2], after[2])
+        mismatches += bool(different)
+        print(f"{file_path[-30:]:<30} {before[0]:>16.4f} {after[0]:>15.4f} {before[1]:>18.1f} {after[1]:>17.1f}  "
+              f"{' '.join(different) or '-'}")
+
+    count = max(len(file_paths), 1)
+    print(f"\nMean time per file: {totals[False][0] / count:.4f} s from the coordinates, "
+          f"{totals[True][0] / count:.4f} s from the categories")
+    print(f"Largest peak RSS increase: {totals[False][1]:.1f} MiB from the coordinates, "
+          f"{totals[True][1]:.1f} MiB from the categories")
+    print(f"{mismatches} of {len(file_paths)} files with different rows")
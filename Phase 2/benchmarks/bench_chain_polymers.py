@@ -0,0 +1,71 @@
+"""
+This script benchmarks the extractors of the chain and coil tables with the polymer of every chain computed once per
+structure and shared between them (see PolymerSequence.get_chain_polymers), against computing them again in every
+extractor, as each extractor did on its own before.
+It is meant for entries with thousands of chains, where computing the polymers dominates these extractors.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_chain_polymers [rootdir]".
+"""
+
+import sys
+import time
+from gemmi import cif
+
+import cif_file
+import extract
+from ingest import find_files
+from polymer_sequence import PolymerSequence
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+repeats = 3
+extractors = [extract.insert_into_chain_table, extract.insert_into_coil_table]
+
+def extract_tables(struct, doc, sequence: PolymerSequence, shared: bool) -> tuple[float, list]:
+    """
+    Runs the extractors and returns the time taken in seconds and their rows.
+    """
+    start = time.perf_counter()
+    rows = []
+    for extractor in extractors:
+        if not shared:
+            sequence.polymers = None
+        rows.append(extractor(struct, doc, sequence))
+    return time.perf_counter() - start, rows
+
+def measure(file_path: str) -> tuple[int, float, float, bool]:
+    """
+    Returns the number of chains of a file, the best time of the extractors computing the polymers in each
+    extractor and computing them once, and whether both give the same rows.
+    """
+    doc = cif.Document()
+    struct = cif_file.read_structure(file_path, save_doc=doc)
+    times = {False: [], True: []}
+    rows = {}
+    for _ in range(repeats):
+        for shared in (False, True):
+            sequence = PolymerSequence(doc)
+            # The helices and strands are shared either way, only the polymers are measured
+            sequence.get_helices(struct)
+            sequence.get_strands(struct)
+            elapsed, rows[shared] = extract_tables(struct, doc, sequence, shared)
+            times[shared].append(elapsed)
+    return len(struct[0]), min(times[False]), min(times[True]), rows[False] == rows[True]
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    totals = [0.0, 0.0]
+    file_paths = sorted(find_files(rootdir))
+    mismatches = 0
+    print(f"{'file':<30} {'chains':>7} {'per extractor (s)':>18} {'shared (s)':>11}  same")
+    for file_path in file_paths:
+        count, before, after, same = measure(file_path)
+        totals[0] += before
+        totals[1] += after
+        mismatches += not same
+        print(f"{file_path[-30:]:<30} {count:>7} {before:>18.4f} {after:>11.4f}  {'yes' if same else 'NO'}")
+
+    print(f"\nTotal time: {totals[0]:.4f} s computing the polymers in every extractor, "
+          f"{totals[1]:.4f} s computing them once")
+    print(f"{mismatches} of {len(file_paths)} files with different rows")
@@ -0,0 +1,107 @@
+"""
+This script benchmarks extracting the coils table by removing the merged helices and strands from every chain at once
+and slicing the sequences, annotated sequences and unconfirmed flags of all the coils of a chain in one scan (see
+extract.coil_ranges, PolymerSequence.get_chain_ranges and get_chain_annotated_ranges), against scanning through the
+sorted helices and strands one coil at a time, with separate binary searches for the sequence, annotated sequence and
+unconfirmed flag of every coil, as the coil extractor did before.
+It checks that both give the same rows, and is meant for entries with many chains or many helices and strands.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_coils [rootdir]".
+"""
+
+import sys
+import time
+from gemmi import cif
+
+import cif_file
+import extract
+from extract import CoilData
+from ingest import find_files
+from polymer_sequence import PolymerSequence, empty_polymer
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+repeats = 3
+
+def scan_coils(struct, doc, sequence: PolymerSequence) -> CoilData:
+    """
+    The coil extractor as it was before, kept as the reference for the rows.
+    """
+    data = []
+    id = struct.info["_entry.id"]
+    secondary_structures = extract.secondary_structure_ranges(id, struct, sequence)
+    if secondary_structures is None:
+        return data
+    polymers = sequence.get_chain_polymers(struct)
+    secondary_structures.sort(key=lambda x : (len(x[0]), x[0], x[1], x[2]))
+    coil_id = 1
+    ss_index = 0
+    for chain in sequence.chain_start_indices:
+        polymer = polymers.get(chain, empty_polymer)
+        while True:
+            if ss_index == 0 or secondary_structures[ss_index - 1][0] != chain:
+                coil_start = sequence.get_chain_start_id(chain)
+            else:
+                coil_start = max(coil_start, secondary_structures[ss_index - 1][2] + 1)
+            if ss_index >= len(secondary_structures) or secondary_structures[ss_index][0] != chain:
+                coil_end = sequence.get_chain_end_id(chain)
+            else:
+                coil_end = secondary_structures[ss_index][1] - 1
+            if coil_start <= coil_end:
+                coil_sequence = sequence.get_chain_subsequence(chain, coil_start, coil_end)[0]
+                annotated_sequence = sequence.get_chain_annotated_subsequence(polymer.residues,
+                                                                            polymer.annotated_sequence,
+                                                                            coil_start, coil_end)
+                unconfirmed = sequence.contains_unconfirmed_residues(chain, coil_start, coil_end)
+                data.append((id, coil_id, chain, unconfirmed, coil_sequence, annotated_sequence,
+                             coil_start, coil_end, len(coil_sequence)))
+                coil_id += 1
+            if ss_index < len(secondary_structures) and secondary_structures[ss_index][0] == chain:
+                ss_index += 1
+            else:
+                break
+    return data
+
+def best_time(extractor, struct, doc, sequence: PolymerSequence) -> tuple[float, CoilData]:
+    """
+    Returns the best time in seconds of extracting the coils over several runs, and the rows.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = extractor(struct, doc, sequence)
+        times.append(time.perf_counter() - start)
+    return min(times), rows
+
+def measure(file_path: str) -> tuple[int, float, float, bool]:
+    """
+    Returns the number of coils of a file, the best time of scanning one coil at a time and of the interval
+    complement, and whether both give the same rows.
+    """
+    doc = cif.Document()
+    struct = cif_file.read_structure(file_path, save_doc=doc)
+    sequence = PolymerSequence(doc)
+    # The helices, strands and polymers are shared by both, so they are computed before timing either
+    extract.secondary_structure_ranges(struct.info["_entry.id"], struct, sequence)
+    sequence.get_chain_polymers(struct)
+    before, rows = best_time(scan_coils, struct, doc, sequence)
+    after, new_rows = best_time(extract.insert_into_coil_table, struct, doc, sequence)
+    return len(new_rows), before, after, rows == new_rows
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    totals = [0.0, 0.0]
+    file_paths = sorted(find_files(rootdir))
+    mismatches = 0
+    print(f"{'file':<30} {'coils':>7} {'per coil (s)':>13} {'per chain (s)':>14}  same")
+    for file_path in file_paths:
+        count, before, after, same = measure(file_path)
+        totals[0] += before
+        totals[1] += after
+        mismatches += not same
+        print(f"{file_path[-30:]:<30} {count:>7} {before:>13.4f} {after:>14.4f}  {'yes' if same else 'NO'}")
+
+    print(f"\nTotal time: {totals[0]:.4f} s scanning one coil at a time, "
+          f"{totals[1]:.4f} s with the interval complement")
+    print(f"{mismatches} of {len(file_paths)} files with different rows")
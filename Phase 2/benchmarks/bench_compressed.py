@@ -0,0 +1,72 @@
+"""
+This script benchmarks the end-to-end ingestion throughput of gzipped protein files against plain ones.
+The protein files under rootdir (plain or gzipped) are copied into a temporary directory in both forms,
+and each copy is ingested into a fresh in-memory database with ingest.ingest_files.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_compressed [rootdir] [workers]".
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+import commands
+import cif_file
+from ingest import find_files, ingest_files
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+workers = 1
+repeats = 3
+
+def make_copies(file_paths: list[str], directory: str) -> tuple[str, str]:
+    """
+    Writes a plain and a gzipped copy of every file, and returns the directories holding each form.
+    """
+    plain_dir = os.path.join(directory, "plain")
+    compressed_dir = os.path.join(directory, "compressed")
+    os.makedirs(plain_dir)
+    os.makedirs(compressed_dir)
+    for index, file_path in enumerate(file_paths):
+        content = cif_file.read_bytes(file_path)
+        # Files are numbered, as the same entry may be found both plain and gzipped under rootdir
+        name = f"{index}_" + os.path.basename(file_path).removesuffix(".gz")
+        with open(os.path.join(plain_dir, name), "wb") as file:
+            file.write(content)
+        with cif_file.gzip.open(os.path.join(compressed_dir, name + ".gz"), "wb") as file:
+            file.write(content)
+    return plain_dir, compressed_dir
+
+def directory_size(directory: str) -> int:
+    return sum(os.path.getsize(file_path) for file_path in find_files(directory))
+
+def measure(directory: str) -> float:
+    """
+    Returns the best time in seconds of ingesting all the files of a directory into an empty database.
+    """
+    times = []
+    for _ in range(repeats):
+        con = sqlite3.connect(":memory:")
+        commands.init_database(con.cursor())
+        start = time.perf_counter()
+        ingest_files(con, sorted(find_files(directory)), workers, verbose=False)
+        times.append(time.perf_counter() - start)
+        con.close()
+    return min(times)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    if len(sys.argv) > 2:
+        workers = int(sys.argv[2])
+    file_paths = sorted(find_files(rootdir))
+    print(f"{len(file_paths)} files, {workers} worker(s), decompressing with {cif_file.gzip.__name__}")
+    with tempfile.TemporaryDirectory() as directory:
+        plain_dir, compressed_dir = make_copies(file_paths, directory)
+        print(f"{'form':<12} {'on disk (MiB)':>14} {'time (s)':>10} {'files/s':>10}")
+        for form, form_dir in (("plain", plain_dir), ("gzipped", compressed_dir)):
+            elapsed = measure(form_dir)
+            print(f"{form:<12} {directory_size(form_dir) / (1 << 20):>14.1f} {elapsed:>10.3f} "
+                  f"{len(file_paths) / elapsed:>10.1f}")
@@ -0,0 +1,70 @@
+"""
+This script benchmarks extracting the rows of every table at once, walking the chains of the model only once and
+sharing the helix rows with the secondary structures table (see extract.insert_into_all_tables), against running the
+extractor of every table one after the other, as ingest.extract_file does without --fused.
+It checks that both give the same rows, and is meant for entries with many chains and subchains, where the subchain
+extractor looking each subchain up in the whole model dominates.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_fused [rootdir]".
+"""
+
+import sys
+import time
+from gemmi import cif
+
+import cif_file
+import extract
+from database import table_schemas
+from ingest import find_files
+from polymer_sequence import PolymerSequence
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+repeats = 3
+
+def per_table(struct, doc, sequence: PolymerSequence) -> dict[str, list[tuple]]:
+    return {table_scheme.name: table_scheme.extract_data(struct, doc, sequence) for table_scheme in table_schemas}
+
+def fused(struct, doc, sequence: PolymerSequence) -> dict[str, list[tuple]]:
+    return extract.insert_into_all_tables(struct, doc, sequence)._asdict()
+
+def best_time(extractor, struct, doc) -> tuple[float, dict[str, list[tuple]]]:
+    """
+    Returns the best time in seconds of extracting every table over several runs, and the rows.
+    A new PolymerSequence is built for every run, so that nothing resolved in a run is shared with the next.
+    """
+    times = []
+    for _ in range(repeats):
+        sequence = PolymerSequence(doc)
+        start = time.perf_counter()
+        rows = extractor(struct, doc, sequence)
+        times.append(time.perf_counter() - start)
+    return min(times), rows
+
+def measure(file_path: str) -> tuple[int, float, float, bool]:
+    """
+    Returns the number of chains of a file, the best time of extracting one table at a time and all at once,
+    and whether both give the same rows.
+    """
+    doc = cif.Document()
+    struct = cif_file.read_structure(file_path, save_doc=doc)
+    before, rows = best_time(per_table, struct, doc)
+    after, new_rows = best_time(fused, struct, doc)
+    return len(struct[0]), before, after, rows == new_rows
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    totals = [0.0, 0.0]
+    file_paths = sorted(find_files(rootdir))
+    mismatches = 0
+    print(f"{'file':<30} {'chains':>7} {'per table (s)':>14} {'fused (s)':>10}  same")
+    for file_path in file_paths:
+        count, before, after, same = measure(file_path)
+        totals[0] += before
+        totals[1] += after
+        mismatches += not same
+        print(f"{file_path[-30:]:<30} {count:>7} {before:>14.4f} {after:>10.4f}  {'yes' if same else 'NO'}")
+
+    print(f"\nTotal time: {totals[0]:.4f} s extracting one table at a time, {totals[1]:.4f} s extracting all at once")
+    print(f"{mismatches} of {len(file_paths)} files with different rows")
@@ -0,0 +1,126 @@
+"""
+This script benchmarks a fixed workload of Phase 3 queries with and without the secondary indexes
+declared in database.py, on a generated database holding entries_count entries.
+Before timing, the plan of every query is checked with EXPLAIN QUERY PLAN: with the indexes, each query
+must use its index, and without them, it must not.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_indexes [entries_count]".
+"""
+
+import sys
+import time
+import random
+import sqlite3
+
+import commands
+from database import table_schemas, entity_table, subchain_table, helix_table, strand_table, coil_table
+
+entries_count = 20000
+chains_per_entry = 4
+spans_per_chain = 25 # Rows per chain in the helices, strands and coils tables
+repeats = 3
+
+# Name, query, parameters and the index the query must use
+workload = [
+    ("entities by type",
+     "SELECT COUNT(*) FROM entities WHERE entity_type = ?", ("water",),
+     entity_table.index_name(["entity_type"])),
+    ("subchains of a chain",
+     "SELECT subchain_id, length FROM subchains WHERE entry_id = ? AND chain_id = ?", ("1005", "C"),
+     subchain_table.index_name(["entry_id", "chain_id"])),
+    ("subchains of an entity",
+     "SELECT subchain_id FROM subchains WHERE entry_id = ? AND entity_id = ?", ("1005", "2"),
+     subchain_table.index_name(["entry_id", "entity_id"])),
+    ("helices of a chain",
+     "SELECT helix_id, length FROM helices WHERE entry_id = ? AND chain_id = ?", ("1005", "C"),
+     helix_table.index_name(["entry_id", "chain_id"])),
+    ("strands of a chain",
+     "SELECT strand_id, length FROM strands WHERE entry_id = ? AND chain_id = ?", ("1005", "C"),
+     strand_table.index_name(["entry_id", "chain_id"])),
+    ("coils of a chain",
+     "SELECT coil_id, length FROM coils WHERE entry_id = ? AND chain_id = ?", ("1005", "C"),
+     coil_table.index_name(["entry_id", "chain_id"])),
+    ("chains joined with their coils",
+     "SELECT chains.chain_id, SUM(coils.length) FROM chains JOIN coils "
+     "ON coils.entry_id = chains.entry_id AND coils.chain_id = chains.chain_id "
+     "WHERE chains.length > ? GROUP BY chains.entry_id, chains.chain_id", (395,),
+     coil_table.index_name(["entry_id", "chain_id"])),
+    ("polymer entities joined with their subchains",
+     "SELECT COUNT(*) FROM entities JOIN subchains "
+     "ON subchains.entry_id = entities.entry_id AND subchains.entity_id = entities.entity_id "
+     "WHERE entities.entity_type = ?", ("branched",),
+     subchain_table.index_name(["entry_id", "entity_id"])),
+]
+
+def fill_database(cur: sqlite3.Cursor):
+    """
+    Inserts entries_count generated entries, with the same shape of rows as the extractors produce.
+    """
+    random.seed(0)
+    rows = {table_scheme.name: [] for table_scheme in table_schemas}
+    for entry in range(entries_count):
+        entry_id = str(1000 + entry)
+        rows["main"].append((entry_id, "protein", "title", "organism", "2000-01-01", "A",
+                             "P 1", 1, 1.0, 1.0, 1.0, 90.0, 90.0, 90.0))
+        entity_types = ["polymer", "non-polymer", "water", "branched"]
+        for entity in range(len(entity_types)):
+            rows["entities"].append((entry_id, str(entity + 1), "name", random.choice(entity_types), None, "A"))
+        for chain in range(chains_per_entry):
+            chain_id = chr(ord("A") + chain)
+            rows["chains"].append((entry_id, chain_id, chain_id, 0, "SEQ", "SEQ", 1, 400, random.randint(1, 400),
+                                   1, 400))
+            rows["subchains"].append((entry_id, str(chain % 4 + 1), chain_id, chain_id, "SEQ", "SEQ", 1, 400, 400))
+            for span in range(spans_per_chain):
+                span_id = chain * spans_per_chain + span
+                rows["helices"].append((entry_id, span_id, chain_id, "SEQ", "1", 1, 10, 10))
+                rows["strands"].append((entry_id, "S", str(span_id), chain_id, "SEQ", 1, 10, 10))
+                rows["coils"].append((entry_id, span_id, chain_id, 0, "SEQ", "SEQ", 1, 10, 10))
+    for table_scheme in table_schemas:
+        commands.insert_rows(cur, table_scheme, rows[table_scheme.name])
+
+def query_plan(cur: sqlite3.Cursor, query: str, parameters: tuple) -> str:
+    return "\n".join(row[3] for row in cur.execute("EXPLAIN QUERY PLAN " + query, parameters))
+
+def check_plans(cur: sqlite3.Cursor, indexed: bool):
+    for name, query, parameters, index in workload:
+        plan = query_plan(cur, query, parameters)
+        assert (f"INDEX {index}" in plan) == indexed, f"{name}:\n{plan}"
+
+def measure(cur: sqlite3.Cursor) -> list[float]:
+    """
+    Returns the best time in seconds of running each query of the workload.
+    """
+    times = []
+    for name, query, parameters, index in workload:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            cur.execute(query, parameters).fetchall()
+            best = min(best, time.perf_counter() - start)
+        times.append(best)
+    return times
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        entries_count = int(sys.argv[1])
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur, create_indexes=False)
+    fill_database(cur)
+    cur.execute("ANALYZE")
+    check_plans(cur, indexed=False)
+    before = measure(cur)
+
+    for statement in commands.index_statements():
+        cur.execute(statement)
+    cur.execute("ANALYZE")
+    check_plans(cur, indexed=True)
+    after = measure(cur)
+
+    print(f"{entries_count} entries, {entries_count * chains_per_entry * spans_per_chain} coils")
+    print(f"{'query':<46} {'no indexes (ms)':>16} {'indexes (ms)':>13}")
+    for (name, *_), without, with_indexes in zip(workload, before, after):
+        print(f"{name:<46} {without * 1000:>16.2f} {with_indexes * 1000:>13.2f}")
+    print(f"{'total':<46} {sum(before) * 1000:>16.2f} {sum(after) * 1000:>13.2f}")
+    con.close()
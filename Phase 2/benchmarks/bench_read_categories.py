@@ -0,0 +1,63 @@
+"""
+This script benchmarks reading whole protein files into a cif Document (cif.read, or decompressing in memory for
+gzipped files) against reading only the categories the metadata and sequence tables need (cif_file.read_categories),
+and checks that both give the same values for those categories and the same PolymerSequence.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_read_categories [rootdir]".
+"""
+
+import os
+import sys
+import time
+from gemmi import cif
+
+import cif_file
+from ingest import find_files
+from polymer_sequence import PolymerSequence
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+repeats = 3
+categories = ["_entry", "_pdbx_audit_revision_history", "_pdbx_poly_seq_scheme", "_struct_conf", "_entity",
+              "_exptl_crystal_grow"]
+
+def best_time(read, file_path: str) -> tuple[float, cif.Document]:
+    """
+    Returns the best time in seconds of reading a file over several runs, and the document read.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        doc = read(file_path)
+        times.append(time.perf_counter() - start)
+    return min(times), doc
+
+def same_categories(doc: cif.Document, selected_doc: cif.Document) -> bool:
+    block, selected_block = doc.sole_block(), selected_doc.sole_block()
+    names = [category + "." for category in categories]
+    return all(block.get_mmcif_category(name) == selected_block.get_mmcif_category(name) for name in names) \
+        and PolymerSequence(doc).sequence == PolymerSequence(selected_doc).sequence
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    totals = [0.0, 0.0]
+    total_bytes = 0
+    file_paths = sorted(find_files(rootdir))
+    mismatches = 0
+    print(f"{'file':<30} {'size (MiB)':>11} {'whole file (s)':>15} {'categories (s)':>15}  same")
+    for file_path in file_paths:
+        before, doc = best_time(cif_file.read_document, file_path)
+        after, selected_doc = best_time(lambda file_path: cif_file.read_categories(file_path, categories), file_path)
+        totals[0] += before
+        totals[1] += after
+        size = os.path.getsize(file_path)
+        total_bytes += size
+        same = same_categories(doc, selected_doc)
+        mismatches += not same
+        print(f"{file_path[-30:]:<30} {size / 2**20:>11.2f} {before:>15.4f} {after:>15.4f}  {'yes' if same else 'NO'}")
+
+    megabytes = total_bytes / 2**20
+    print(f"\nThroughput of the files on disk: {megabytes / max(totals[0], 1e-9):.1f} MiB/s reading whole files, "
+          f"{megabytes / max(totals[1], 1e-9):.1f} MiB/s reading only {', '.join(categories)}")
+    print(f"{mismatches} of {len(file_paths)} files with different values")
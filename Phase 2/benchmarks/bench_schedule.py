@@ -0,0 +1,52 @@
+"""
+This script benchmarks the scheduling of the protein files between the worker processes: the files under rootdir
+are ingested into a fresh in-memory database in discovery (os.walk) order and largest first, with one file per
+task and with small files packed into tasks. The tail of each order estimated from the file sizes is printed
+along with the measured times.
+The benchmark is only meaningful with a mirror whose file sizes are as skewed as the PDB's, on a machine with
+at least as many cores as workers.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_schedule [rootdir] [workers]".
+"""
+
+import sys
+import time
+import sqlite3
+
+import commands
+import schedule
+from ingest import find_files, ingest_files
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+workers = 4
+repeats = 3
+
+def measure(file_paths: list[str], task_bytes: int) -> float:
+    """
+    Returns the best time in seconds of ingesting the files in the given order into an empty database.
+    """
+    times = []
+    for _ in range(repeats):
+        con = sqlite3.connect(":memory:")
+        commands.init_database(con.cursor())
+        start = time.perf_counter()
+        ingest_files(con, file_paths, workers, verbose=False, task_bytes=task_bytes)
+        times.append(time.perf_counter() - start)
+        con.close()
+    return min(times)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    if len(sys.argv) > 2:
+        workers = int(sys.argv[2])
+    sized_paths = schedule.file_sizes(find_files(rootdir))
+    discovery_order = [file_path for file_path, size in sized_paths]
+    largest_first = schedule.largest_first(sized_paths)
+    print(f"{len(sized_paths)} files, {workers} workers")
+    print(schedule.report(sized_paths, workers))
+    print(f"{'order':<16} {'files per task':<15} {'time (s)':>10}")
+    for order, file_paths in (("discovery", discovery_order), ("largest first", largest_first)):
+        for packing, task_bytes in (("one", 0), ("packed", 1 << 20)):
+            print(f"{order:<16} {packing:<15} {measure(file_paths, task_bytes):>10.3f}")
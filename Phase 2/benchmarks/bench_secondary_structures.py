@@ -0,0 +1,68 @@
+"""
+This script benchmarks the extractors of the helix, secondary structure, strand and coil tables with the helices and
+strands resolved once per structure and shared between them (see PolymerSequence.get_helices and get_strands),
+against resolving them again in every extractor, as each extractor did on its own before.
+It is meant for entries with thousands of helices and strands, where resolving them dominates these extractors.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_secondary_structures [rootdir]".
+"""
+
+import sys
+import time
+from gemmi import cif
+
+import cif_file
+import extract
+from ingest import find_files
+from polymer_sequence import PolymerSequence
+
+rootdir = "./database" # Location of .cif or .cif.gz files
+repeats = 3
+extractors = [extract.insert_into_helix_table, extract.insert_into_secondary_structures_table,
+              extract.insert_into_strand_table, extract.insert_into_coil_table]
+
+def extract_tables(struct, doc, sequence: PolymerSequence, shared: bool) -> tuple[float, list]:
+    """
+    Runs the extractors and returns the time taken in seconds and their rows.
+    """
+    start = time.perf_counter()
+    rows = []
+    for extractor in extractors:
+        if not shared:
+            sequence.helices = sequence.strands = None
+        rows.append(extractor(struct, doc, sequence))
+    return time.perf_counter() - start, rows
+
+def measure(file_path: str) -> tuple[int, float, float, bool]:
+    """
+    Returns the number of helices and strands of a file, the best time of the extractors resolving them in each
+    extractor and resolving them once, and whether both give the same rows.
+    """
+    doc = cif.Document()
+    struct = cif_file.read_structure(file_path, save_doc=doc)
+    times = {False: [], True: []}
+    rows = {}
+    for _ in range(repeats):
+        for shared in (False, True):
+            elapsed, rows[shared] = extract_tables(struct, doc, PolymerSequence(doc), shared)
+            times[shared].append(elapsed)
+    count = len(struct.helices) + sum(len(sheet.strands) for sheet in struct.sheets)
+    return count, min(times[False]), min(times[True]), rows[False] == rows[True]
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    totals = [0.0, 0.0]
+    file_paths = sorted(find_files(rootdir))
+    mismatches = 0
+    print(f"{'file':<30} {'helices and strands':>20} {'per extractor (s)':>18} {'shared (s)':>11}  same")
+    for file_path in file_paths:
+        count, before, after, same = measure(file_path)
+        totals[0] += before
+        totals[1] += after
+        mismatches += not same
+        print(f"{file_path[-30:]:<30} {count:>20} {before:>18.4f} {after:>11.4f}  {'yes' if same else 'NO'}")
+
+    print(f"\nTotal time: {totals[0]:.4f} s resolving in every extractor, {totals[1]:.4f} s resolving once")
+    print(f"{mismatches} of {len(file_paths)} files with different rows")
@@ -0,0 +1,68 @@
+"""
+This script benchmarks reading protein files with two parses (gemmi.read_structure followed by cif.read)
+against a single parse (gemmi.read_structure filling the cif Document through save_doc).
+Each file is read in a fresh worker process, so the peak RSS reported is that of reading the one file.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run the benchmark, use the command "python -m benchmarks.bench_single_parse [rootdir]".
+"""
+
+import sys
+import time
+import resource
+import multiprocessing
+import gemmi
+from gemmi import cif
+
+from ingest import find_files
+from polymer_sequence import PolymerSequence
+
+rootdir = "./database" # Location of .cif files
+repeats = 3
+
+def read_file(file_path: str, single_parse: bool) -> tuple[float, float]:
+    """
+    Reads a protein file and returns the time taken in seconds and the increase in peak RSS in MiB.
+    """
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if single_parse:
+        doc = cif.Document()
+        struct = gemmi.read_structure(file_path, save_doc=doc)
+    else:
+        struct = gemmi.read_structure(file_path)
+        doc = cif.read(file_path)
+    PolymerSequence(doc)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    return elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024
+
+def measure(file_path: str, single_parse: bool) -> tuple[float, float]:
+    """
+    Returns the best time and the peak RSS increase of reading a file over several fresh processes.
+    """
+    results = []
+    for _ in range(repeats):
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            results.append(pool.apply(read_file, (file_path, single_parse)))
+    return min(result[0] for result in results), max(result[1] for result in results)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        rootdir = sys.argv[1]
+    totals = {False: [0.0, 0.0], True: [0.0, 0.0]}
+    file_paths = sorted(find_files(rootdir))
+    print(f"{'file':<30} {'two parses (s)':>15} {'one parse (s)':>15} {'two parses (MiB)':>17} {'one parse (MiB)':>16}")
+    for file_path in file_paths:
+        before = measure(file_path, single_parse=False)
+        after = measure(file_path, single_parse=True)
+        for mode, (elapsed, rss) in ((False, before), (True, after)):
+            totals[mode][0] += elapsed
+            totals[mode][1] = max(totals[mode][1], rss)
+        print(f"{file_path[-30:]:<30} {before[0]:>15.4f} {after[0]:>15.4f} {before[1]:>17.1f} {after[1]:>16.1f}")
+
+    count = max(len(file_paths), 1)
+    print(f"\nMean time per file: {totals[False][0] / count:.4f} s with two parses, "
+          f"{totals[True][0] / count:.4f} s with one parse")
+    print(f"Largest peak RSS increase: {totals[False][1]:.1f} MiB with two parses, "
+          f"{totals[True][1]:.1f} MiB with one parse")
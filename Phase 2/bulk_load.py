@@ -0,0 +1,71 @@
+"""
+This script contains the database settings of the bulk-load mode, used for full rebuilds of the database,
+and the safe settings restored for incremental runs.
+In bulk-load mode, the pragmas trade durability for speed, the rows of each batch are inserted in
+primary key order, and the secondary indexes are only built (and the tables analyzed) once all the rows
+are in, rather than being updated with every insertion.
+"""
+
+import sqlite3
+from table import Table
+
+page_size = 16384 # Only takes effect on a new database, before any table is created
+# A rolled back batch is written again one entry at a time (see BatchWriter.flush), so the journal cannot be
+# turned off; WAL with synchronous off never waits for the disk but can still roll back.
+bulk_pragmas = {"journal_mode": "WAL", "synchronous": "OFF", "cache_size": -1048576, # 1 GiB
+                "mmap_size": 1 << 30, "temp_store": "MEMORY"}
+safe_pragmas = {"journal_mode": "DELETE", "synchronous": "FULL", "cache_size": -2000, "mmap_size": 0,
+                "temp_store": "DEFAULT"}
+
+def apply_pragmas(cur: sqlite3.Cursor, pragmas: dict[str, str | int]):
+    for name, value in pragmas.items():
+        cur.execute(f"PRAGMA {name} = {value}")
+
+def is_empty(cur: sqlite3.Cursor) -> bool:
+    return cur.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+
+def secondary_indexes(cur: sqlite3.Cursor) -> list[tuple[str, str]]:
+    """
+    Returns the name and CREATE INDEX statement of every secondary index in the database.
+    The indexes SQLite creates for primary keys have no statement, and are left out.
+    """
+    return cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+
+def begin_bulk_load(cur: sqlite3.Cursor) -> list[str]:
+    """
+    Applies the bulk-load pragmas and drops the secondary indexes.
+    Must be called before the tables are created, so that the page size applies to a new database.
+    Returns the statements recreating the dropped indexes, to give to end_bulk_load.
+    """
+    if is_empty(cur):
+        cur.execute(f"PRAGMA page_size = {page_size}")
+    apply_pragmas(cur, bulk_pragmas)
+    indexes = secondary_indexes(cur)
+    for name, sql in indexes:
+        cur.execute(f"DROP INDEX {name}")
+    return [sql for name, sql in indexes]
+
+def end_bulk_load(con: sqlite3.Connection, index_statements: list[str]):
+    """
+    Builds the secondary indexes, analyzes the tables for the query planner and restores the safe pragmas.
+    """
+    con.commit()
+    cur = con.cursor()
+    for sql in index_statements:
+        cur.execute(sql)
+    cur.execute("ANALYZE")
+    con.commit()
+    apply_pragmas(cur, safe_pragmas)
+
+def sort_rows(table_scheme: Table, rows: list[tuple]) -> list[tuple]:
+    """
+    Sorts rows in the primary key order of their table, so they are appended to the table's B-tree
+    instead of being inserted all over it. Missing values sort first.
+    """
+    attribute_names = table_scheme.attributes.attribute_names
+    key_indices = [attribute_names.index(key) for key in table_scheme.attributes.primary_keys]
+    try:
+        return sorted(rows, key=lambda row: [(row[index] is not None, row[index]) for index in key_indices])
+    except TypeError:
+        # Values of different types in the same column cannot be compared, and are inserted as they are
+        return rows
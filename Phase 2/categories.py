@@ -0,0 +1,175 @@
+"""
+This script contains the extraction of the tables that depend on the coordinates (see extract.py) from the mmCIF
+categories alone, so that the atoms of an entry never have to be parsed or built into a gemmi Structure.
+The extractors of extract.py only read the coordinates to find which residues of every chain were observed,
+the chains and subchains these residues are in, and the sequence ID of the residue a helix or strand starts and ends
+at. The _pdbx_poly_seq_scheme, _pdbx_nonpoly_scheme and _pdbx_branch_scheme categories list the same residues,
+chains and subchains, so CategorySequence indexes them once per entry, alongside the PolymerSequence it extends.
+CategorySequence also locates the residues helices and strands start and end at, and gives the observed polymer of
+every chain, so the helix, strand and coil tables are extracted by the functions of extract.py. The extractors below
+produce the same rows as those of extract.py, except that a gap in an annotated sequence is where the sequence IDs
+of two observed residues are not consecutive: gemmi also looks at the distance between the atoms of consecutive
+residues, which only differs for residues that are badly placed in the model.
+The other tables are extracted by the functions of extract.py, from a structure built without the atoms
+(see cif_file.model_structure).
+The rows can only be the same if every subchain of _struct_asym is listed in its scheme category. When one is not,
+for instance in a file without _pdbx_nonpoly_scheme, CategorySequence raises a MissingSchemeError, and the file is
+extracted from the coordinates instead (see ingest.extract_file).
+"""
+
+import functools
+from typing import NamedTuple
+import gemmi
+from gemmi import cif
+import extract
+from extract import MainData, ChainData, SubchainData
+from polymer_sequence import PolymerSequence, ChainPolymer, empty_polymer
+
+class Residue(NamedTuple):
+    label_seq: int # Same as gemmi.Residue.label_seq
+    name: str
+    seq_num: int # Author sequence ID, same as gemmi.SeqId.num
+    icode: str # Insertion code, ' ' if none, same as gemmi.SeqId.icode
+
+class MissingSchemeError(ValueError):
+    """
+    Raised when a subchain of the model is not listed in any of the _pdbx_*_scheme categories,
+    so that the chains and subchains cannot be built from them.
+    """
+
+class CategorySequence(PolymerSequence):
+    """
+    PolymerSequence which also indexes the chains, subchains and observed polymer residues of the model,
+    as gemmi would build them from the coordinates, from the _pdbx_*_scheme categories.
+    Raises a MissingSchemeError if a subchain of _struct_asym is not listed in these categories.
+    """
+    def __init__(self, doc: cif.Document):
+        super().__init__(doc)
+        block = doc.sole_block()
+        # Observed residues of every polymer subchain, keeping only the first residue of a microheterogeneity
+        self.subchain_residues: dict[str, list[Residue]] = {}
+        # Sequence ID of every observed polymer residue, by chain, author sequence ID and insertion code
+        self.label_seqs: dict[tuple[str, int, str], int] = {}
+        # Chain of every subchain of the model
+        self.parent_chains: dict[str, str] = {}
+        scheme = zip(*(block.find_loop("_pdbx_poly_seq_scheme." + tag) for tag in
+                       ("asym_id", "seq_id", "pdb_mon_id", "pdb_seq_num", "pdb_ins_code", "pdb_strand_id")))
+        last_subchain = residues = None
+        # Subchains listed in the scheme categories, including polymers of which no residue was observed
+        schemed = set()
+        for subchain, label_seq, name, seq_num, icode, chain in scheme:
+            schemed.add(subchain)
+            # Residues that were not observed have no atoms, so they are not in the model
+            if name == "?":
+                continue
+            if subchain != last_subchain:
+                residues = self.subchain_residues.setdefault(subchain, [])
+                self.parent_chains.setdefault(subchain, chain)
+                last_subchain = subchain
+            label_seq = int(label_seq)
+            if residues and residues[-1].label_seq == label_seq:
+                continue
+            residue = Residue(label_seq, name, int(seq_num), ' ' if icode in ("?", ".") else icode)
+            residues.append(residue)
+            self.label_seqs.setdefault((chain, residue.seq_num, residue.icode), label_seq)
+        for row in block.find("_pdbx_branch_scheme.", ["asym_id", "pdb_asym_id"]):
+            self.parent_chains.setdefault(row.str(0), row.str(1))
+        for row in block.find("_pdbx_nonpoly_scheme.", ["asym_id", "pdb_strand_id"]):
+            self.parent_chains.setdefault(row.str(0), row.str(1))
+        schemed.update(self.parent_chains)
+
+        # The atoms are listed by subchain in the order of _struct_asym, and gemmi merges the parts of a chain
+        subchain_order = [row.str(0) for row in block.find("_struct_asym.", ["id"])]
+        if not subchain_order:
+            raise MissingSchemeError("No _struct_asym category to check the scheme categories against")
+        missing = [subchain for subchain in subchain_order if subchain not in schemed]
+        if missing:
+            raise MissingSchemeError(f"{len(missing)} subchains are not in the scheme categories: "
+                                     f"{', '.join(missing[:20])}")
+        listed = set(subchain_order)
+        subchain_order += [subchain for subchain in self.parent_chains if subchain not in listed]
+        # Subchains of every chain of the model, in the order of the model
+        self.chains: dict[str, list[str]] = {}
+        for subchain in subchain_order:
+            if subchain in self.parent_chains:
+                self.chains.setdefault(self.parent_chains[subchain], []).append(subchain)
+
+    def get_polymer(self, chain: str) -> list[Residue]:
+        """
+        Returns the observed residues of the polymer of a chain, like gemmi.Chain.get_polymer().first_conformer().
+        """
+        for subchain in self.chains.get(chain, []):
+            if subchain in self.subchain_residues:
+                return self.subchain_residues[subchain]
+        return []
+
+    def get_chain_polymers(self, struct: gemmi.Structure | None = None) -> dict[str, ChainPolymer]:
+        """
+        Returns the observed polymer of every chain, from the scheme rather than the model, like
+        PolymerSequence.get_chain_polymers.
+        """
+        if self.polymers is None:
+            polymers = {}
+            for chain in self.chains:
+                residues = self.get_polymer(chain)
+                polymers[chain] = ChainPolymer(residues, make_one_letter_sequence(residues), residues[0].seq_num,
+                                               residues[-1].seq_num) if residues else empty_polymer
+            self.polymers = (struct, polymers)
+        return self.polymers[1]
+
+    def get_subchain(self, subchain: str) -> list[Residue]:
+        return self.subchain_residues.get(subchain, [])
+
+    def locate(self, address: gemmi.AtomAddress, struct: gemmi.Structure | None = None) -> tuple[str, int]:
+        """
+        Returns the chain and sequence ID of the residue at an address, such as the start or end of a helix,
+        from the scheme rather than the model, so that the helices and strands are resolved without the coordinates
+        by PolymerSequence.get_helices and get_strands. Raises a KeyError if the residue was not observed.
+        """
+        seqid = address.res_id.seqid
+        return address.chain_name, self.label_seqs[(address.chain_name, seqid.num, seqid.icode)]
+
+@functools.cache
+def one_letter_code(name: str) -> str:
+    info = gemmi.find_tabulated_residue(name)
+    return info.one_letter_code if info is not None and info.one_letter_code != ' ' else 'X'
+
+def make_one_letter_sequence(residues: list[Residue]) -> str:
+    """
+    Same as gemmi.ResidueSpan.make_one_letter_sequence, with a gap wherever the sequence IDs are not consecutive.
+    """
+    letters = []
+    for index, residue in enumerate(residues):
+        if index > 0 and residue.label_seq != residues[index - 1].label_seq + 1:
+            letters.append('-')
+        letters.append(one_letter_code(residue.name))
+    return ''.join(letters)
+
+def insert_into_main_table(struct: gemmi.Structure, doc: cif.Document, sequence: CategorySequence) -> MainData:
+    return extract.main_table_rows(struct, doc, list(sequence.chains))
+
+def insert_into_subchain_table(struct: gemmi.Structure, doc: cif.Document, sequence: CategorySequence) -> SubchainData:
+    data = []
+    id = struct.info["_entry.id"]
+    for entity in struct.entities:
+        if entity.polymer_type in [gemmi.PolymerType.PeptideD, gemmi.PolymerType.PeptideL]:
+            for subchain_name in entity.subchains:
+                subchain = sequence.get_subchain(subchain_name)
+                if len(subchain) == 0:
+                    continue
+                parent_chain = sequence.parent_chains[subchain_name]
+                start_id = subchain[0].label_seq
+                end_id = subchain[-1].label_seq
+                annotated_sequence = make_one_letter_sequence(subchain)
+                unannotated_sequence = sequence.get_chain_subsequence(parent_chain, start_id, end_id)[0]
+                data.append((id, entity.name, subchain_name, parent_chain,
+                        unannotated_sequence, annotated_sequence, start_id, end_id, len(subchain)))
+    return data
+
+def insert_into_chain_table(struct: gemmi.Structure, doc: cif.Document, sequence: CategorySequence) -> ChainData:
+    data = []
+    id = struct.info["_entry.id"]
+    polymers = sequence.get_chain_polymers(struct)
+    for chain, subchains in sequence.chains.items():
+        data.append(extract.chain_row(id, chain, ' '.join(subchains), polymers[chain], sequence))
+    return data
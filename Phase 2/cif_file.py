@@ -0,0 +1,240 @@
+"""
+This script contains the reading of mmCIF files, which can be either plain or gzipped (.cif.gz),
+so the rsync mirror of the PDB can be ingested without decompressing it on disk.
+Gzipped files are decompressed in memory, with python-isal or zlib-ng if either is installed,
+as both decompress several times faster than the zlib bundled with Python and gemmi.
+"""
+
+from typing import BinaryIO, Iterable
+import gemmi
+from gemmi import cif
+
+try:
+    from isal import igzip as gzip
+    from isal.isal_zlib import error as decompression_error
+except ImportError:
+    try:
+        from zlib_ng import gzip_ng as gzip
+        from zlib_ng.zlib_ng import error as decompression_error
+    except ImportError:
+        import gzip
+        from zlib import error as decompression_error
+
+file_extensions = (".cif", ".cif.gz")
+
+def is_compressed(file_path: str) -> bool:
+    return file_path.endswith(".gz")
+
+def open_file(file_path: str) -> BinaryIO:
+    """
+    Opens a protein file for reading its raw (decompressed) bytes.
+    """
+    if is_compressed(file_path):
+        return gzip.open(file_path, "rb")
+    return open(file_path, "rb")
+
+def decompress(file_path: str, content: bytes) -> bytes:
+    """
+    Returns the decompressed content of a protein file, given the raw bytes read from it.
+    """
+    if is_compressed(file_path):
+        return gzip.decompress(content)
+    return content
+
+def read_bytes(file_path: str) -> bytes:
+    """
+    Returns the whole decompressed content of a protein file.
+    """
+    with open(file_path, "rb") as file:
+        content = file.read()
+    return decompress(file_path, content)
+
+def parse_structure(content: bytes, save_doc: cif.Document | None = None) -> gemmi.Structure:
+    """
+    Parses the decompressed content of a protein file into a gemmi Structure, like gemmi.read_structure.
+    If save_doc is given, it is filled from the same parse, so the content is only tokenized once.
+    """
+    doc = save_doc if save_doc is not None else cif.Document()
+    doc.parse_string(content)
+    struct = gemmi.make_structure_from_block(doc.sole_block())
+    # Same as gemmi.read_structure, which merges chain parts by default
+    struct.merge_chain_parts()
+    return struct
+
+def parse_document(content: bytes) -> cif.Document:
+    return cif.read_string(content)
+
+# Categories with a row for every atom, which make up most of a file
+atom_categories = (b"_atom_site.", b"_atom_site_anisotrop.")
+
+def without_atoms(content: bytes) -> bytes:
+    """
+    Returns the decompressed content of a protein file without the categories listing its atoms,
+    so that parsing it into a cif Document never holds the atoms in memory.
+    The rows of a category end at the first line starting with a comment, a tag, or a reserved word,
+    as no row of these categories can start with one.
+    """
+    for category in atom_categories:
+        first_tag = content.find(b"\n" + category)
+        if first_tag == -1:
+            continue
+        line_start = content.rfind(b"\n", 0, first_tag) + 1
+        start = line_start if content[line_start:first_tag].strip() == b"loop_" else first_tag + 1
+        rows = first_tag + 1
+        while content.startswith(category, rows):
+            rows = content.find(b"\n", rows) + 1
+            if rows == 0:
+                return content[:start]
+        ends = [content.find(b"\n" + delimiter, rows - 1) for delimiter in (b"#", b"_", b"loop_", b"data_", b"save_")]
+        end = min((end for end in ends if end != -1), default=len(content) - 1) + 1
+        content = content[:start] + content[end:]
+    return content
+
+chunk_size = 1 << 20
+# Lines starting a new tag, loop, block or text field, where the rows or values of a category may end
+row_delimiters = (b"\n_", b"\nloop_", b"\ndata_", b"\nsave_", b"\n;")
+
+def category_name(category: str) -> bytes:
+    """
+    Returns the name of a category as it starts its tags, e.g. b"_entity." for "_entity" or "_entity.".
+    """
+    return (category.lower().rstrip(".") + ".").encode()
+
+def select_categories(chunks: Iterable[bytes], categories: Iterable[str]) -> bytes:
+    """
+    Returns the decompressed content of a protein file, given as consecutive chunks of bytes, with only the data
+    block header and the given categories, so that parsing it into a cif Document only tokenizes those.
+    Every tag, loop_ and block header is expected at the start of a line, as in the files of the PDB.
+    The rows of every category are copied or skipped whole by searching the bytes for the next line that can start
+    a tag, so they are never split into lines, which leaves only the tags to go through line by line.
+    """
+    names = frozenset(category_name(category) for category in categories)
+    chunks = iter(chunks)
+    selected = []
+    # A newline is kept before pos, so that a delimiter at the start of the buffer is found as well
+    buffer, pos, at_end = b"\n", 1, False
+    keep = False
+    loop_started = False # After loop_, before its first tag
+    in_loop_tags = False # Among the tags of a loop, before its first row
+
+    # Where each delimiter was last found in the buffer, or -1, as long as it is not before pos
+    found_at: list[int | None] = [None] * len(row_delimiters)
+    def read_more() -> bool:
+        nonlocal buffer, pos, at_end, found_at
+        found_at = [None] * len(row_delimiters)
+        if at_end:
+            return False
+        chunk = next(chunks, b"")
+        if chunk:
+            buffer = buffer[pos - 1:] + chunk
+        else:
+            at_end = True
+            buffer = buffer[pos - 1:] + (b"" if buffer.endswith(b"\n") else b"\n")
+        pos = 1
+        return True
+
+    while True:
+        if not loop_started and not in_loop_tags:
+            # The rows or values of the current category run up to the next delimiter, and are copied or skipped whole
+            for index, delimiter in enumerate(row_delimiters):
+                if found_at[index] is None or -1 < found_at[index] < pos - 1:
+                    found_at[index] = buffer.find(delimiter, pos - 1)
+            found = [start for start in found_at if start != -1]
+            # Without a delimiter, only the last, possibly partial, line is left in the buffer
+            rows_end = min(found) + 1 if found else max(buffer.rfind(b"\n"), pos - 1) + 1
+            if keep:
+                selected.append(buffer[pos:rows_end])
+            pos = rows_end
+            if not found:
+                if read_more():
+                    continue
+                break
+        line_end = buffer.find(b"\n", pos)
+        if line_end == -1:
+            if read_more():
+                continue
+            break
+        line = buffer[pos:line_end + 1]
+        if line.startswith(b";"):
+            # A text field ends at the next line starting with a semicolon
+            field_end = buffer.find(b"\n;", line_end)
+            close_end = buffer.find(b"\n", field_end + 1) if field_end != -1 else -1
+            if close_end == -1:
+                if read_more():
+                    continue
+                break
+            line = buffer[pos:close_end + 1]
+            in_loop_tags = False
+        elif line.startswith(b"_"):
+            name = line[:line.find(b".") + 1].lower()
+            if loop_started:
+                keep = name in names
+                if keep:
+                    selected.append(b"loop_\n")
+                loop_started, in_loop_tags = False, True
+            elif not in_loop_tags:
+                keep = name in names
+        elif line.startswith(b"loop_"):
+            keep, loop_started, in_loop_tags = False, True, False
+        elif line.startswith((b"data_", b"save_")):
+            selected.append(line)
+            keep, loop_started, in_loop_tags = False, False, False
+        elif line.startswith(b"#"):
+            line = b""
+        else:
+            in_loop_tags = False
+        if keep:
+            selected.append(line)
+        pos += len(line) if line else line_end + 1 - pos
+    return b"".join(selected)
+
+def read_categories(file_path: str, categories: Iterable[str]) -> cif.Document:
+    """
+    Reads only the given categories of a protein file into a cif Document, streaming the file in chunks
+    so that it is never held in memory whole. See select_categories.
+    """
+    with open_file(file_path) as file:
+        return parse_document(select_categories(iter(lambda: file.read(chunk_size), b""), categories))
+
+def model_structure(doc: cif.Document) -> gemmi.Structure:
+    """
+    Builds a gemmi Structure without coordinates from the document, which is much faster than with them.
+    The _atom_site category is removed from the document beforehand.
+    """
+    block = doc.sole_block()
+    block.find_mmcif_category("_atom_site.").erase()
+    struct = gemmi.make_structure_from_block(block)
+    struct.merge_chain_parts()
+    return struct
+
+def header_structure(doc: cif.Document) -> gemmi.Structure:
+    """
+    Returns an empty gemmi Structure with only the name and entry ID of the document, for the extractors that
+    read nothing else from the structure, so that the model of the structure is not built.
+    """
+    block = doc.sole_block()
+    struct = gemmi.Structure()
+    struct.name = block.name
+    entry_id = block.find_value("_entry.id")
+    if entry_id is not None:
+        struct.info["_entry.id"] = cif.as_string(entry_id)
+    return struct
+
+def read_structure(file_path: str, save_doc: cif.Document | None = None) -> gemmi.Structure:
+    """
+    Reads a protein file into a gemmi Structure, like gemmi.read_structure.
+    If save_doc is given, it is filled from the same parse, so the file is only tokenized once.
+    """
+    if not is_compressed(file_path):
+        if save_doc is not None:
+            return gemmi.read_structure(file_path, save_doc=save_doc)
+        return gemmi.read_structure(file_path)
+    return parse_structure(read_bytes(file_path), save_doc)
+
+def read_document(file_path: str) -> cif.Document:
+    """
+    Reads a protein file into a cif Document, like cif.read.
+    """
+    if not is_compressed(file_path):
+        return cif.read(file_path)
+    return parse_document(read_bytes(file_path))
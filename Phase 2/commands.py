@@ -1,51 +1,86 @@
 import sqlite3
+from collections import Counter
+from typing import NamedTuple, Iterable
 import gemmi
 from gemmi import cif
 from database import table_schemas
+from table import Table
 from polymer_sequence import PolymerSequence
+import manifest
+import probe
+import cif_file
+import bulk_load
+import journal
+import failures
+import upsert
+from manifest import FileState
+from journal import JournalRecord
+from failures import Failure
+from entry_states import EntryStates
 
-def init_database(cur: sqlite3.Cursor):
+def init_database(cur: sqlite3.Cursor, create_indexes: bool = True):
+    """
+    Creates the tables and, unless create_indexes is False (see bulk_load), their secondary indexes.
+    """
     for table_schema in table_schemas:
         cur.execute(table_schema.create_table())
+    if create_indexes:
+        for statement in index_statements():
+            cur.execute(statement)
+
+def index_statements() -> list[str]:
+    return [statement for table_schema in table_schemas for statement in table_schema.create_indexes()]
 
-def check_file(cur: sqlite3.Cursor, file_path: str, verbose: bool = True):
+def check_files(cur: sqlite3.Cursor, file_paths: Iterable[str], verbose: bool = True, single_parse: bool = False):
+    """
+    Checks the protein files like check_file, deciding what to do with each from the states of every entry,
+    loaded with a single query beforehand, instead of querying the database for every file.
+    """
+    entry_states = EntryStates.load(cur)
+    for file_path in file_paths:
+        check_file(cur, file_path, verbose, single_parse, entry_states)
+
+def check_file(cur: sqlite3.Cursor, file_path: str, verbose: bool = True, single_parse: bool = False,
+               entry_states: EntryStates | None = None):
+    """
+    Inserts, updates or repairs the data of a protein file in the database, as needed.
+    With single_parse, the file is only tokenized once: gemmi builds the Structure from the same parse
+    that fills the cif Document, instead of reading the file a second time with cif.read.
+    The entry ID and revision date are probed first, so up to date files are never parsed.
+    If entry_states is given, the actions are decided from it (see entry_action), and the state of an entry is
+    loaded again once its file is written.
+    """
     try:
         if verbose:
             print("Checking " + file_path)
         struct = None
-        struct = gemmi.read_structure(file_path)
-        doc = cif.read(file_path)
+        probed = probe.probe_file(file_path)
+        if probed is not None and entry_action(cur, *probed, entry_states=entry_states) is None:
+            return
+        if single_parse:
+            doc = cif.Document()
+            struct = cif_file.read_structure(file_path, save_doc=doc)
+        else:
+            struct = cif_file.read_structure(file_path)
+            doc = cif_file.read_document(file_path)
         sequence = PolymerSequence(doc)
 
-        # Check if protein file exists in database
-        res = cur.execute("SELECT entry_id FROM " + table_schemas[0].name\
-                            + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-        if not res.fetchone(): # if there is no row in the main table with such entry ID
+        entry_id = struct.info["_entry.id"]
+        action = entry_action(cur, entry_id, get_revision_date(doc), entry_states=entry_states)
+        if action == "insert":
             if verbose:
                 print("Adding " + file_path)
             insert_file(cur, struct, doc, sequence)
-
-        else: # Check if protein file data is up to date
-            block = doc.sole_block()
-            revision_date = block.find_value("_pdbx_audit_revision_history.revision_date")
-            if revision_date is None:
-                revision_date = block.find_loop("_pdbx_audit_revision_history.revision_date")[-1]
-            res = cur.execute("SELECT revision_date FROM " + table_schemas[0].name\
-                              + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-            if res.fetchone()[0] < revision_date:
-                if verbose:
-                    print("Updating " + file_path)
-                update_file(cur, struct, doc, sequence)
-
-            else: # Check that protein file data did not get corrupted
-                res = cur.execute("SELECT entry_id FROM " + table_schemas[-1].name\
-                                + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-                # if there is no row in the last table (coils) with such entry ID, then something went wrong.
-                # I checked and every protein has some rows in the coils table.
-                if not res.fetchone():
-                    if verbose:
-                        print("Data corrupted, fixing " + file_path)
-                    update_file(cur, struct, doc, sequence)
+        elif action == "update":
+            if verbose:
+                print("Updating " + file_path)
+            update_file(cur, struct, doc, sequence)
+        elif action == "repair":
+            if verbose:
+                print("Data corrupted, fixing " + file_path)
+            update_file(cur, struct, doc, sequence)
+        if action is not None and entry_states is not None:
+            entry_states.states.update(EntryStates.load(cur, [entry_id]).states)
 
     except Exception as error:
         if struct is not None:  
@@ -53,13 +88,32 @@ def check_file(cur: sqlite3.Cursor, file_path: str, verbose: bool = True):
             print(error)
         else:
             print(error)
-            
+
+def get_revision_date(doc: cif.Document) -> str:
+    """
+    Returns the latest revision date of the protein file.
+    """
+    block = doc.sole_block()
+    revision_date = block.find_value("_pdbx_audit_revision_history.revision_date")
+    if revision_date is None:
+        revision_date = block.find_loop("_pdbx_audit_revision_history.revision_date")[-1]
+    return revision_date
+
+def entry_action(cur: sqlite3.Cursor, entry_id: str, revision_date: str,
+                 entry_states: EntryStates | None = None) -> str | None:
+    """
+    Decides what needs to be done with a protein file, given its entry ID and latest revision date.
+    See EntryStates.action for the possible results.
+    The action is decided from entry_states if given, without querying the database, and otherwise from the state
+    of the entry alone, loaded for this file.
+    """
+    if entry_states is None:
+        entry_states = EntryStates.load(cur, [entry_id])
+    return entry_states.action(entry_id, revision_date)
 
 def insert_file(cur: sqlite3.Cursor, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence):
     for table_scheme in table_schemas:
-        for data in table_scheme.extract_data(struct, doc, sequence):
-            statement = table_scheme.insert_row(data)
-            cur.execute(statement, data)
+        insert_rows(cur, table_scheme, table_scheme.extract_data(struct, doc, sequence))
 
 def update_file(cur: sqlite3.Cursor, struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence):
     """
@@ -67,7 +121,163 @@ def update_file(cur: sqlite3.Cursor, struct: gemmi.Structure, doc: cif.Document,
     This may happen if regular file insertion was interrupted.
     """
     for table_scheme in table_schemas:
-        cur.execute("DELETE FROM " + table_scheme.name + " WHERE entry_id = '" + struct.info["_entry.id"] + "'")
-        for data in table_scheme.extract_data(struct, doc, sequence):
-            statement = table_scheme.insert_row(data)
-            cur.execute(statement, data)
\ No newline at end of file
+        cur.execute(table_scheme.delete_entry(), (struct.info["_entry.id"],))
+        insert_rows(cur, table_scheme, table_scheme.extract_data(struct, doc, sequence))
+
+def insert_rows(cur: sqlite3.Cursor, table_scheme: Table, rows: list[tuple]):
+    """
+    Inserts the given extracted rows into the given table, with a single statement for all the rows.
+    """
+    if rows:
+        cur.executemany(table_scheme.insert_row(rows[0]), rows)
+
+class PendingEntry(NamedTuple):
+    entry_id: str
+    name: str # Name of the gemmi structure, printed if writing the entry fails
+    rows: dict[str, list[tuple]] # Rows of each table to insert
+    replaced_tables: tuple[str, ...] # Tables whose existing rows for the entry are replaced by the rows (see upsert.py)
+    file_state: FileState | None # Recorded in the file manifest once the rows are written
+    journal_record: JournalRecord | None = None # Recorded in the journal along with the rows
+    file_path: str | None = None # Protein file of the rows, whose failure is cleared once they are written
+
+class BatchWriter:
+    """
+    Gathers the rows of many protein files per table, and writes them with one executemany per table.
+    The database is committed after every batch, once enough rows or entries have been gathered.
+    With sort_rows, the rows of each table are inserted in primary key order (see bulk_load.sort_rows).
+    With use_journal, the files are also recorded in the journal, so an interrupted run can be resumed.
+    With use_failures, the failed files are recorded in the failures table, and the files written are removed from it.
+    The failures of the run are kept in run_failures either way.
+    The rows of replaced tables are diffed with the stored rows, so only those that changed are written, and the
+    numbers of rows inserted, updated, deleted and left unchanged by the run are counted in row_changes.
+    """
+    def __init__(self, con: sqlite3.Connection, batch_entries: int = 500, batch_rows: int = 50000,
+                 sort_rows: bool = False, use_journal: bool = False, use_failures: bool = False):
+        self.con = con
+        self.cur = con.cursor()
+        self.batch_entries = batch_entries
+        self.batch_rows = batch_rows
+        self.sort_rows = sort_rows
+        self.use_journal = use_journal
+        self.use_failures = use_failures
+        self.pending: list[PendingEntry] = []
+        self.pending_ids = set()
+        self.pending_rows = 0
+        self.pending_failures: list[Failure] = []
+        self.run_failures: list[Failure] = []
+        self.row_changes = Counter()
+
+    def add(self, entry_id: str, name: str, rows: dict[str, list[tuple]], replaced_tables: tuple[str, ...] = (),
+            file_state: FileState | None = None, journal_record: JournalRecord | None = None,
+            file_path: str | None = None):
+        """
+        Queues the rows of an entry, replacing the entry's rows in replaced_tables.
+        If file_state is given, the file is recorded in the manifest along with the rows.
+        If journal_record is given, it is recorded in the journal along with the rows.
+        If file_path is given, a failure recorded for the file is cleared along with the rows.
+        """
+        self.pending.append(PendingEntry(entry_id, name, rows, tuple(replaced_tables), file_state, journal_record,
+                                         file_path))
+        self.pending_ids.add(entry_id)
+        self.pending_rows += sum(len(table_rows) for table_rows in rows.values())
+        if len(self.pending) >= self.batch_entries or self.pending_rows >= self.batch_rows:
+            self.flush()
+
+    def add_failure(self, failure: Failure):
+        """
+        Queues the failure of a file, recorded in the failures table with the next batch.
+        """
+        self.run_failures.append(failure)
+        if self.use_failures:
+            self.pending_failures.append(failure)
+
+    def flush(self):
+        """
+        Writes all the queued rows and commits them.
+        If the batch fails as a whole (e.g. a row breaks a primary key), the batch is rolled back
+        and written again one entry at a time, so only the entries at fault are affected: their rows are left out
+        entirely, and the rest of the batch is committed.
+        """
+        if self.pending or self.pending_failures:
+            self.cur.execute("SAVEPOINT batch")
+            row_changes = Counter()
+            try:
+                for table_scheme in table_schemas:
+                    replaced = [entry for entry in self.pending if table_scheme.name in entry.replaced_tables]
+                    if replaced:
+                        upsert.count_changes(row_changes, upsert.replace_rows(
+                            self.cur, table_scheme, [entry.entry_id for entry in replaced],
+                            [row for entry in replaced for row in entry.rows.get(table_scheme.name, [])]))
+                    rows = [row for entry in self.pending if table_scheme.name not in entry.replaced_tables
+                            for row in entry.rows.get(table_scheme.name, [])]
+                    if self.sort_rows:
+                        rows = bulk_load.sort_rows(table_scheme, rows)
+                    insert_rows(self.cur, table_scheme, rows)
+                    row_changes["inserted"] += len(rows)
+                manifest.record_files(self.cur, [(entry.file_state, entry.entry_id) for entry in self.pending
+                                                 if entry.file_state is not None])
+                journal.record_files(self.cur, [entry.journal_record for entry in self.pending
+                                                if entry.journal_record is not None])
+                if self.use_failures:
+                    failures.clear_failures(self.cur, [entry.file_path for entry in self.pending
+                                                       if entry.file_path is not None])
+                self.cur.execute("RELEASE batch")
+            except sqlite3.Error:
+                self.cur.execute("ROLLBACK TO batch")
+                row_changes = Counter()
+                # Each entry is written within a savepoint of its own, nested in that of the batch
+                for entry in self.pending:
+                    failure = write_entry(self.cur, entry, self.use_failures, row_changes)
+                    if failure is not None:
+                        self.run_failures.append(failure)
+                self.cur.execute("RELEASE batch")
+            self.row_changes.update(row_changes)
+            # Recorded last, as the failure of a file may come along with the rows extracted before it
+            failures.record_failures(self.cur, self.pending_failures)
+        self.con.commit()
+        self.pending = []
+        self.pending_ids = set()
+        self.pending_rows = 0
+        self.pending_failures = []
+
+def write_entry(cur: sqlite3.Cursor, entry: PendingEntry, use_failures: bool = False,
+                row_changes: Counter | None = None) -> Failure | None:
+    """
+    Writes the rows of a single entry table by table, like update_file but only writing the rows of replaced tables
+    that changed. The rows written are counted in row_changes if given.
+    The entry is written within a savepoint, so if writing it fails partway, none of its rows are left behind.
+    Returns the failure of the entry's file if writing it fails, which is also recorded with use_failures.
+    """
+    if row_changes is None:
+        row_changes = Counter()
+    entry_changes = Counter()
+    cur.execute("SAVEPOINT entry")
+    try:
+        for table_scheme in table_schemas:
+            rows = entry.rows.get(table_scheme.name, [])
+            if table_scheme.name in entry.replaced_tables:
+                upsert.count_changes(entry_changes, upsert.replace_rows(cur, table_scheme, [entry.entry_id], rows))
+            else:
+                insert_rows(cur, table_scheme, rows)
+                entry_changes["inserted"] += len(rows)
+        if entry.file_state is not None:
+            manifest.record_files(cur, [(entry.file_state, entry.entry_id)])
+        if entry.journal_record is not None:
+            journal.record_files(cur, [entry.journal_record])
+        if use_failures and entry.file_path is not None:
+            failures.clear_failures(cur, [entry.file_path])
+        cur.execute("RELEASE entry")
+    except Exception as error:
+        cur.execute("ROLLBACK TO entry")
+        cur.execute("RELEASE entry")
+        print(entry.name)
+        print(error)
+        # The file is not written again when the run is resumed, as it would fail the same way
+        if entry.journal_record is not None:
+            journal.record_files(cur, [entry.journal_record._replace(status="failed")])
+        failure = failures.from_error(entry.file_path, entry.entry_id, "write", error)
+        if use_failures and entry.file_path is not None:
+            failures.record_failures(cur, [failure])
+        return failure
+    row_changes.update(entry_changes)
+    return None
@@ -1,10 +1,15 @@
 import sqlite3
+import table
 from table import Table
 from attributes import Attributes
 import extract
+import categories
 
 # All the table schemas that get produced in the database.
 # First component is table name, second is all the attributes.
+# Secondary indexes cover the joins of the child tables with chains and entities that the primary keys don't.
+# The next component is the inputs the extractor reads (see table.py), so that only those are built,
+# and the last, if given, the only categories of the document it reads.
 
 entry_id = ("entry_id", "VARCHAR(5) NOT NULL")
 chain_id = ("chain_id", "VARCHAR(5) NOT NULL")
@@ -20,7 +25,8 @@ main_table_attributes = Attributes[extract.MainData]\
       ("space_group", "VARCHAR(20)"), ("Z_value", "INT"), ("a", "FLOAT"), ("b", "FLOAT"), ("c", "FLOAT"),
       ("alpha", "FLOAT"), ("beta", "FLOAT"), ("gamma", "FLOAT")],
       primary_keys=["entry_id"])
-main_table = Table("main", main_table_attributes, extract.insert_into_main_table)
+main_table = Table("main", main_table_attributes, extract.insert_into_main_table,
+                   frozenset((table.document, table.coordinates)))
 
 experimental_table_attributes = Attributes[extract.ExperimentalData]\
     ([entry_id, ("Matthews_coefficient", "FLOAT"), ("percent_solvent_content", "FLOAT"),
@@ -29,21 +35,25 @@ experimental_table_attributes = Attributes[extract.ExperimentalData]\
       ("crystal_growth_pH", "FLOAT"), ("crystal_growth_temperature", "FLOAT")],
       primary_keys=["entry_id"],
       foreign_keys={"entry_id": ("main", "entry_id")})
-experimental_table = Table("experimental", experimental_table_attributes, extract.insert_into_experimental_table)
+experimental_table = Table("experimental", experimental_table_attributes, extract.insert_into_experimental_table,
+                           frozenset((table.document,)), frozenset(("_exptl_crystal", "_exptl_crystal_grow")))
 
 entity_table_attributes = Attributes[extract.EntityData]\
     ([entry_id, ("entity_id", "VARCHAR(5) NOT NULL"), ("entity_name", "VARCHAR(200)"),
       ("entity_type", "VARCHAR(25)"), ("polymer_type", "VARCHAR(25)"), ("subchains", "VARCHAR")],
       primary_keys=["entry_id", "entity_id"],
-      foreign_keys={"entry_id": ("main", "entry_id")})
-entity_table = Table("entities", entity_table_attributes, extract.insert_into_entity_table)
+      foreign_keys={"entry_id": ("main", "entry_id")},
+      indexes=[["entity_type"]])
+entity_table = Table("entities", entity_table_attributes, extract.insert_into_entity_table,
+                     frozenset((table.document, table.model)))
 
 chain_table_attributes = Attributes[extract.ChainData]\
     ([entry_id, chain_id, ("subchains", "VARCHAR"), unconfirmed, ("chain_sequence", "VARCHAR"),
       ("annotated_chain_sequence", "VARCHAR"), start_id, end_id, length, ("author_start_id", "INT"), ("author_end_id", "INT")],
       primary_keys=["entry_id", "chain_id"],
       foreign_keys={"entry_id": ("main", "entry_id")})
-chain_table = Table("chains", chain_table_attributes, extract.insert_into_chain_table)
+chain_table = Table("chains", chain_table_attributes, extract.insert_into_chain_table,
+                    frozenset((table.coordinates, table.sequence)))
 
 subchain_table_attributes = Attributes[extract.SubchainData]\
     ([entry_id, ("entity_id", "VARCHAR(5) NOT NULL"), ("subchain_id", "VARCHAR(5) NOT NULL"), chain_id,
@@ -51,36 +61,44 @@ subchain_table_attributes = Attributes[extract.SubchainData]\
       start_id, end_id, length],
       primary_keys=["entry_id", "subchain_id"],
       foreign_keys={"entry_id": ("main", "entry_id"), "entity_id": ("entities", "entity_id"),
-                    "chain_id": ("chains", "chain_id")})
-subchain_table = Table("subchains", subchain_table_attributes, extract.insert_into_subchain_table)
+                    "chain_id": ("chains", "chain_id")},
+      indexes=[["entry_id", "chain_id"], ["entry_id", "entity_id"]])
+subchain_table = Table("subchains", subchain_table_attributes, extract.insert_into_subchain_table,
+                       frozenset((table.coordinates, table.sequence)))
 
 helix_table_attributes = Attributes[extract.HelixData]\
     ([entry_id, ("helix_id", "INT"), chain_id, ("helix_sequence", "VARCHAR"), ("helix_type", "VARCHAR"),
       start_id, end_id, length],
       primary_keys=["entry_id", "helix_id"],
-      foreign_keys={"entry_id": ("main", "entry_id"), "chain_id": ("chains", "chain_id")})
-helix_table = Table("helices", helix_table_attributes, extract.insert_into_helix_table)
+      foreign_keys={"entry_id": ("main", "entry_id"), "chain_id": ("chains", "chain_id")},
+      indexes=[["entry_id", "chain_id"]])
+helix_table = Table("helices", helix_table_attributes, extract.insert_into_helix_table,
+                    frozenset((table.coordinates, table.sequence)))
 
 sheet_table_attributes = Attributes[extract.SheetData]\
     ([entry_id, sheet_id, ("number_strands", "INT"), ("sense_sequence", "VARCHAR")],
      primary_keys=["entry_id", "sheet_id"],
      foreign_keys={"entry_id": ("main", "entry_id")})
-sheet_table = Table("sheets", sheet_table_attributes, extract.insert_into_sheet_table)
+sheet_table = Table("sheets", sheet_table_attributes, extract.insert_into_sheet_table, frozenset((table.model,)))
 
 strand_table_attributes = Attributes[extract.StrandData]\
     ([entry_id, sheet_id, ("strand_id", "VARCHAR(5) NOT NULL"), chain_id,
       ("strand_sequence", "VARCHAR"), start_id, end_id, length],
       primary_keys=["entry_id", "sheet_id", "strand_id"],
       foreign_keys={"entry_id": ("main", "entry_id"), "sheet_id": ("sheets", "sheet_id"),
-                    "chain_id": ("chains", "chain_id")})
-strand_table = Table("strands", strand_table_attributes, extract.insert_into_strand_table)
+                    "chain_id": ("chains", "chain_id")},
+      indexes=[["entry_id", "chain_id"]])
+strand_table = Table("strands", strand_table_attributes, extract.insert_into_strand_table,
+                     frozenset((table.coordinates, table.sequence)))
 
 coil_table_attributes = Attributes[extract.CoilData]\
     ([entry_id, ("coil_id", "INT"), chain_id, unconfirmed, ("coil_sequence", "VARCHAR"),
       ("annotated_coil_sequence", "VARCHAR"), start_id, end_id, length],
       primary_keys=["entry_id", "coil_id"],
-      foreign_keys={"entry_id": ("main", "entry_id"), "chain_id": ("chains", "chain_id")})
-coil_table = Table("coils", coil_table_attributes, extract.insert_into_coil_table)
+      foreign_keys={"entry_id": ("main", "entry_id"), "chain_id": ("chains", "chain_id")},
+      indexes=[["entry_id", "chain_id"]])
+coil_table = Table("coils", coil_table_attributes, extract.insert_into_coil_table,
+                   frozenset((table.coordinates, table.sequence)))
 
 # Define secondary_structures table attributes with updated foreign key column names
 secondary_structures_table_attributes = Attributes[extract.HelixData]\
@@ -102,12 +120,30 @@ secondary_structures_table_attributes = Attributes[extract.HelixData]\
 # Create the secondary_structures table using the new attributes and an insert function in extract module.
 secondary_structures_table = Table("secondary_structures",
                                    secondary_structures_table_attributes,
-                                   extract.insert_into_secondary_structures_table)
+                                   extract.insert_into_secondary_structures_table,
+                                   frozenset((table.coordinates, table.sequence)))
 
 table_schemas: list[Table] = [main_table, experimental_table, entity_table, chain_table,
                               subchain_table, helix_table, sheet_table, strand_table, coil_table,
                               secondary_structures_table]
 
+# The same tables, extracted from the mmCIF categories instead of the coordinates (see categories.py)
+structure_inputs = frozenset((table.document, table.model, table.residues))
+category_table_schemas: list[Table] = [
+    Table("main", main_table_attributes, categories.insert_into_main_table, structure_inputs),
+    experimental_table,
+    entity_table,
+    Table("chains", chain_table_attributes, categories.insert_into_chain_table,
+          frozenset((table.document, table.residues))),
+    Table("subchains", subchain_table_attributes, categories.insert_into_subchain_table, structure_inputs),
+    # The helices, strands and polymers are read from the scheme by CategorySequence
+    Table("helices", helix_table_attributes, extract.insert_into_helix_table, structure_inputs),
+    sheet_table,
+    Table("strands", strand_table_attributes, extract.insert_into_strand_table, structure_inputs),
+    Table("coils", coil_table_attributes, extract.insert_into_coil_table, structure_inputs),
+    Table("secondary_structures", secondary_structures_table_attributes,
+          extract.insert_into_secondary_structures_table, structure_inputs)]
+
 def insert_into_table(cur: sqlite3.Cursor, table_name: str, data):
     """
     Inserts the given data into the given table
@@ -0,0 +1,103 @@
+"""
+This script contains the in-memory map of what the database already holds for each protein entry.
+The map is loaded with a single aggregated query over all the tables, after which deciding whether
+a protein file needs to be inserted, updated or repaired takes a dictionary lookup.
+"""
+
+import sqlite3
+from typing import NamedTuple, Iterable
+from database import table_schemas, main_table, coil_table
+
+# Largest number of entry IDs looked up by a single query, below SQLite's default limit of 999 parameters
+max_query_entries = 900
+
+class EntryState(NamedTuple):
+    revision_date: str | None # Revision date in the main table, None if the entry has no row there
+    tables: int # Bitmask of the tables holding rows of the entry, bit i standing for table_schemas[i]
+
+def table_bit(table_name: str) -> int:
+    for index, table_scheme in enumerate(table_schemas):
+        if table_scheme.name == table_name:
+            return 1 << index
+    raise ValueError("No table named " + table_name)
+
+def entry_states_query(entry_count: int = 0) -> str:
+    """
+    Returns the query giving the entry ID, revision date and table bitmask of every entry in the database.
+    If entry_count is nonzero, the query is restricted to that many entry IDs given as parameters.
+    """
+    # Numbered parameters can be reused in every subquery
+    condition = ''
+    if entry_count:
+        condition = f" WHERE {{}} IN ({', '.join(f'?{i + 1}' for i in range(entry_count))})"
+    subqueries = []
+    for index, table_scheme in enumerate(table_schemas):
+        # The first attribute of every table is its entry ID
+        entry_column = table_scheme.attributes.attribute_names[0]
+        revision_column = "revision_date" if table_scheme is main_table else "NULL"
+        subqueries.append(f"SELECT DISTINCT {entry_column} AS entry_id, {revision_column} AS revision_date, "
+                          f"{1 << index} AS bit FROM {table_scheme.name}" + condition.format(entry_column))
+    return "SELECT entry_id, MAX(revision_date), SUM(bit) FROM (" + " UNION ALL ".join(subqueries)\
+        + ") GROUP BY entry_id"
+
+class EntryStates:
+    def __init__(self, states: dict[str, EntryState] | None = None):
+        self.states = states if states is not None else {}
+
+    @classmethod
+    def load(cls, cur: sqlite3.Cursor, entry_ids: Iterable[str] | None = None) -> 'EntryStates':
+        """
+        Loads the states of the given entries, or of every entry in the database if entry_ids is None.
+        """
+        if entry_ids is None:
+            return cls({row[0]: EntryState(row[1], row[2]) for row in cur.execute(entry_states_query())})
+        entry_ids = list(dict.fromkeys(entry_ids))
+        states = {}
+        for start in range(0, len(entry_ids), max_query_entries):
+            batch = entry_ids[start:start + max_query_entries]
+            for row in cur.execute(entry_states_query(len(batch)), batch):
+                states[row[0]] = EntryState(row[1], row[2])
+        return cls(states)
+
+    def action(self, entry_id: str, revision_date: str) -> str | None:
+        """
+        Decides what needs to be done with a protein file, given its entry ID and latest revision date.
+        Returns "insert" if the protein is not in the database, "update" if its data is not up to date,
+        "repair" if its data got corrupted and None if nothing needs to be done.
+        """
+        state = self.states.get(entry_id)
+        if state is None:
+            return "insert"
+        # Rows in other tables but none in the main table can only be left over from an interrupted insertion
+        if state.revision_date is None:
+            return "repair"
+        if state.revision_date < revision_date:
+            return "update"
+        # If there is no row in the coils table with such entry ID, then something went wrong.
+        # Every protein has some rows in the coils table.
+        if not state.tables & table_bit(coil_table.name):
+            return "repair"
+        return None
+
+    def actions(self, entries: Iterable[tuple[str, str]]) -> list[str | None]:
+        """
+        Decides what needs to be done with each (entry ID, revision date) pair of a batch of protein files.
+        """
+        return [self.action(entry_id, revision_date) for entry_id, revision_date in entries]
+
+    def record(self, entry_id: str, revision_date: str, rows: dict[str, list[tuple]],
+               replaced_tables: Iterable[str] = ()):
+        """
+        Updates the state of an entry after its rows are queued for writing,
+        so that later files of the same entry see it.
+        """
+        state = self.states.get(entry_id, EntryState(None, 0))
+        tables = state.tables
+        for table_name in replaced_tables:
+            tables &= ~table_bit(table_name)
+        for table_name in rows:
+            if rows[table_name]:
+                tables |= table_bit(table_name)
+        if not rows.get(main_table.name):
+            revision_date = None if main_table.name in replaced_tables else state.revision_date
+        self.states[entry_id] = EntryState(revision_date, tables)
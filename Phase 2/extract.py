@@ -14,10 +14,11 @@ Important things to note:
   author sequence ID, but have different 'icode's (see gemmi.SeqId.icode).
 """
 
-from typing import NewType
+from typing import NewType, NamedTuple
+import itertools
 import gemmi
 from gemmi import cif, EntityType, PolymerType
-from polymer_sequence import PolymerSequence
+from polymer_sequence import PolymerSequence, ChainPolymer, SecondaryStructure, empty_polymer
 from enum import Enum
 
 MainData = NewType("MainData", tuple[str, str, str, str, str, str, str, int, float, float, float, float, float, float])
@@ -88,6 +89,12 @@ def get_complex_type(struct: gemmi.Structure) -> ComplexType:
     return pending_complex_type
 
 def insert_into_main_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> MainData:
+    return main_table_rows(struct, doc, [chain.name for chain in struct[0]])
+
+def main_table_rows(struct: gemmi.Structure, doc: cif.Document, chains: list[str]) -> MainData:
+    """
+    For the main table, given the names of the chains of the model, which are the only data read from its atoms.
+    """
     id = struct.info["_entry.id"]
     struct_title = struct.info["_struct.title"]
     block = doc.sole_block()
@@ -99,7 +106,6 @@ def insert_into_main_table(struct: gemmi.Structure, doc: cif.Document, sequence:
     if revision_date is None:
         revision_date = block.find_loop("_pdbx_audit_revision_history.revision_date")[-1]
     complex_type = get_complex_type(struct)
-    chains = [chain.name for chain in struct[0]]
     cell = struct.cell
     z_value = ''
     if "_cell.Z_PDB" in struct.info:
@@ -151,52 +157,56 @@ def insert_into_subchain_table(struct: gemmi.Structure, doc: cif.Document, seque
                 if len(subchain) == 0:
                     continue
                 parent_chain = struct[0].get_parent_of(subchain[0])
-                start_id = subchain[0].label_seq
-                end_id = subchain[-1].label_seq
-                annotated_sequence = subchain.make_one_letter_sequence()
-                unannotated_sequence = sequence.get_chain_subsequence(parent_chain.name, start_id, end_id)[0]
-                data.append((id, entity.name, subchain.subchain_id(), parent_chain.name,
-                        unannotated_sequence, annotated_sequence, start_id, end_id, subchain.length()))
+                data.append(subchain_row(id, entity, subchain, parent_chain.name, sequence))
     return data
 
+def subchain_row(id: str, entity: gemmi.Entity, subchain: gemmi.ResidueSpan, parent_chain: str,
+                 sequence: PolymerSequence) -> tuple:
+    start_id = subchain[0].label_seq
+    end_id = subchain[-1].label_seq
+    annotated_sequence = subchain.make_one_letter_sequence()
+    unannotated_sequence = sequence.get_chain_subsequence(parent_chain, start_id, end_id)[0]
+    return (id, entity.name, subchain.subchain_id(), parent_chain,
+            unannotated_sequence, annotated_sequence, start_id, end_id, subchain.length())
+
 def insert_into_chain_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> ChainData:
     data = []
     id = struct.info["_entry.id"]
+    polymers = sequence.get_chain_polymers(struct)
     for chain in struct[0]:
-        if len(chain.get_polymer()) == 0:
-            start_id = end_id = unconfirmed = None
-        else:
-            start_id = sequence.get_chain_start_id(chain.name)
-            end_id = sequence.get_chain_end_id(chain.name)
-            unconfirmed = sequence.contains_unconfirmed_residues(chain.name, start_id, end_id)
         subchains = ' '.join([subchain.subchain_id() for subchain in chain.subchains()])
-        annotated_sequence = chain.get_polymer().make_one_letter_sequence()
-        unannotated_sequence = sequence.get_chain_sequence(chain.name)
-        author_start_id = chain.get_polymer()[0].seqid.num if len(chain.get_polymer()) > 0 else None
-        author_end_id = chain.get_polymer()[-1].seqid.num if len(chain.get_polymer()) > 0 else None
-        data.append((id, chain.name, subchains, unconfirmed,
-                unannotated_sequence, annotated_sequence, start_id, end_id,
-                chain.get_polymer().length(), author_start_id, author_end_id))
+        data.append(chain_row(id, chain.name, subchains, polymers[chain.name], sequence))
     return data
+
+def chain_row(id: str, chain: str, subchains: str, polymer: ChainPolymer, sequence: PolymerSequence) -> tuple:
+    if len(polymer.residues) == 0:
+        start_id = end_id = unconfirmed = None
+    else:
+        start_id = sequence.get_chain_start_id(chain)
+        end_id = sequence.get_chain_end_id(chain)
+        unconfirmed = sequence.contains_unconfirmed_residues(chain, start_id, end_id)
+    unannotated_sequence = sequence.get_chain_sequence(chain)
+    return (id, chain, subchains, unconfirmed,
+            unannotated_sequence, polymer.annotated_sequence, start_id, end_id,
+            len(polymer.residues), polymer.author_start_id, polymer.author_end_id)
         
 def insert_into_helix_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> HelixData:
     data = []
     id = struct.info["_entry.id"]
-    for index, helix in enumerate(struct.helices):
-        helix_sequence = sequence.get_helix_sequence(helix, struct)
-        chain = struct[0].find_cra(helix.start).chain
-        end_chain = struct[0].find_cra(helix.end).chain
-        start_auth_label = str(helix.start.res_id.seqid.num) + helix.start.res_id.seqid.icode
-        end_auth_label = str(helix.end.res_id.seqid.num) + helix.end.res_id.seqid.icode
-        start_id = chain[start_auth_label][0].label_seq
-        end_id = end_chain[end_auth_label][0].label_seq
-        if chain != end_chain:
-            chain_names = chain.name + ' ' + end_chain.name
-            data.append((id, index + 1, chain_names, helix_sequence, helix.type, start_id, end_id, helix.length))
-        else:
-            data.append((id, index + 1, chain.name, helix_sequence, helix.type, start_id, end_id, helix.length))
+    for index, (helix, resolved) in enumerate(zip(struct.helices, sequence.get_helices(struct))):
+        data.append(helix_row(id, index, helix, resolved, sequence))
     return data
 
+def helix_row(id: str, index: int, helix: gemmi.Helix, resolved: SecondaryStructure,
+              sequence: PolymerSequence) -> tuple:
+    helix_sequence = sequence.get_secondary_structure_sequence(resolved)[0]
+    if resolved.chain != resolved.end_chain:
+        chain_names = resolved.chain + ' ' + resolved.end_chain
+        return (id, index + 1, chain_names, helix_sequence, helix.type, resolved.start_id, resolved.end_id,
+                helix.length)
+    return (id, index + 1, resolved.chain, helix_sequence, helix.type, resolved.start_id, resolved.end_id,
+            helix.length)
+
 def insert_into_secondary_structures_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> list:
     """
     Extracts secondary structures (based on helices) from the structure and returns a list of tuples.
@@ -210,130 +220,196 @@ def insert_into_secondary_structures_table(struct: gemmi.Structure, doc: cif.Doc
     """
     data = []
     entry_id = struct.info["_entry.id"]
-    for index, helix in enumerate(struct.helices):
-        helix_sequence = sequence.get_helix_sequence(helix, struct)
-        chain = struct[0].find_cra(helix.start).chain
-        end_chain = struct[0].find_cra(helix.end).chain
-        start_auth_label = str(helix.start.res_id.seqid.num) + helix.start.res_id.seqid.icode
-        end_auth_label = str(helix.end.res_id.seqid.num) + helix.end.res_id.seqid.icode
-        start_id = chain[start_auth_label][0].label_seq
-        end_id = end_chain[end_auth_label][0].label_seq
+    for index, (helix, resolved) in enumerate(zip(struct.helices, sequence.get_helices(struct))):
+        helix_sequence = sequence.get_secondary_structure_sequence(resolved)[0]
         # If the helix spans different chains, concatenate the names for reference.
-        chain_id = chain.name if chain == end_chain else f"{chain.name} {end_chain.name}"
-        data.append((entry_id, index + 1, chain_id, helix_sequence, helix.type, start_id, end_id, helix.length))
+        chain_id = resolved.chain if resolved.chain == resolved.end_chain \
+            else f"{resolved.chain} {resolved.end_chain}"
+        data.append((entry_id, index + 1, chain_id, helix_sequence, helix.type, resolved.start_id, resolved.end_id,
+                     helix.length))
     return data
         
 def insert_into_sheet_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> SheetData:
     data = []
     id = struct.info["_entry.id"]
     for sheet in struct.sheets:
-        data.append((id, sheet.name, len(sheet.strands), sense_sequence(sheet)))
+        data.append(sheet_row(id, sheet))
     return data
 
+def sheet_row(id: str, sheet: gemmi.Sheet) -> tuple:
+    return (id, sheet.name, len(sheet.strands), sense_sequence(sheet))
+
 def insert_into_strand_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> StrandData:
     data = []
     id = struct.info["_entry.id"]
-    for sheet in struct.sheets:
-        for strand in sheet.strands:
-            strand_sequence, length = sequence.get_strand_sequence(strand, struct)
-            chain = struct[0].find_cra(strand.start).chain
-            end_chain = struct[0].find_cra(strand.end).chain
-            start_auth_label = str(strand.start.res_id.seqid.num) + strand.start.res_id.seqid.icode
-            end_auth_label = str(strand.end.res_id.seqid.num) + strand.end.res_id.seqid.icode
-            start_id = chain[start_auth_label][0].label_seq
-            end_id = end_chain[end_auth_label][0].label_seq
-            data.append((id, sheet.name, strand.name, chain.name,
-                         strand_sequence, start_id, end_id, length))
+    for sheet, strands in zip(struct.sheets, sequence.get_strands(struct)):
+        for strand, resolved in zip(sheet.strands, strands):
+            data.append(strand_row(id, sheet, strand, resolved, sequence))
     return data
 
-def insert_into_coil_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> CoilData:
-    data = []
+def strand_row(id: str, sheet: gemmi.Sheet, strand: gemmi.Sheet.Strand, resolved: SecondaryStructure,
+               sequence: PolymerSequence) -> tuple:
+    strand_sequence, length = sequence.get_secondary_structure_sequence(resolved)
+    return (id, sheet.name, strand.name, resolved.chain, strand_sequence, resolved.start_id, resolved.end_id, length)
+
+def secondary_structure_ranges(id: str, struct: gemmi.Structure,
+                               sequence: PolymerSequence) -> list[tuple[str, int, int]] | None:
+    """
+    Returns the chain and the range of sequence IDs of every helix and strand, to 'remove' from the polymer sequences
+    when extracting the coils, or None if one of them spans several chains.
+    """
     secondary_structures = []
+    for index, resolved in enumerate(sequence.get_helices(struct)):
+        if resolved.chain != resolved.end_chain:
+            print(ill_defined_helix(id, index))
+            return None
+        secondary_structures.append(secondary_structure_range(resolved))
+
+    for sheet, strands in zip(struct.sheets, sequence.get_strands(struct)):
+        for strand, resolved in zip(sheet.strands, strands):
+            if resolved.chain != resolved.end_chain:
+                print(ill_defined_strand(id, sheet, strand))
+                return None
+            secondary_structures.append(secondary_structure_range(resolved))
+    return secondary_structures
+
+def secondary_structure_range(resolved: SecondaryStructure) -> tuple[str, int, int]:
+    return (resolved.chain, min(resolved.start_id, resolved.end_id), max(resolved.start_id, resolved.end_id))
+
+def ill_defined_helix(id: str, index: int) -> str:
+    return 'Helix ' + str(index) + ' in protein ' + id + ' is ill-defined. Unable to extract random coils.'
+
+def ill_defined_strand(id: str, sheet: gemmi.Sheet, strand: gemmi.Sheet.Strand) -> str:
+    return 'Strand ' + strand.name + ' in sheet ' + sheet.name + ' in protein ' + id\
+        + ' is ill-defined. Unable to extract random coils.'
+
+def coil_ranges(chain_start_id: int, chain_end_id: int,
+                secondary_structures: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    Returns the ranges of sequence IDs of a chain that are in none of its helices and strands, which are given as
+    ranges of sequence IDs sorted by their start. These are the gaps between the merged helices and strands.
+    """
+    coils = []
+    coil_start = chain_start_id
+    for start_id, end_id in secondary_structures:
+        # A helix or strand at the start of the chain, or overlapping the previous ones, leaves no coil before it
+        if coil_start <= start_id - 1:
+            coils.append((coil_start, start_id - 1))
+        coil_start = max(coil_start, end_id + 1)
+    if coil_start <= chain_end_id:
+        coils.append((coil_start, chain_end_id))
+    return coils
+
+def insert_into_coil_table(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> CoilData:
     id = struct.info["_entry.id"]
+    secondary_structures = secondary_structure_ranges(id, struct, sequence)
+    if secondary_structures is None:
+        return []
+    return coil_rows(id, sequence, sequence.get_chain_polymers(struct), secondary_structures)
 
-    # We first gather all the helix and sheet secondary structures to 'remove' from the polymer sequences.
-    for index, helix in enumerate(struct.helices):
-        chain = struct[0].find_cra(helix.start).chain
-        end_chain = struct[0].find_cra(helix.end).chain
-        start_auth_label = str(helix.start.res_id.seqid.num) + helix.start.res_id.seqid.icode
-        end_auth_label = str(helix.end.res_id.seqid.num) + helix.end.res_id.seqid.icode
-        start_id = chain[start_auth_label][0].label_seq
-        end_id = end_chain[end_auth_label][0].label_seq
-        left = min(start_id, end_id)
-        right = max(start_id, end_id)
-        if chain != end_chain:
-            print('Helix ' + str(index) + ' in protein ' + id\
-                               + ' is ill-defined. Unable to extract random coils.')
-            return data
-        else:
-            secondary_structures.append((chain.name, left, right))
-    
-    for sheet in struct.sheets:
-        for strand in sheet.strands:
-            chain = struct[0].find_cra(strand.start).chain
-            end_chain = struct[0].find_cra(strand.end).chain
-            start_auth_label = str(strand.start.res_id.seqid.num) + strand.start.res_id.seqid.icode
-            end_auth_label = str(strand.end.res_id.seqid.num) + strand.end.res_id.seqid.icode
-            start_id = chain[start_auth_label][0].label_seq
-            end_id = end_chain[end_auth_label][0].label_seq
-            left = min(start_id, end_id)
-            right = max(start_id, end_id)
-            if chain != end_chain:
-                print('Strand ' + strand.name + ' in sheet ' + sheet.name + ' in protein ' + id\
-                                + ' is ill-defined. Unable to extract random coils.')
-                return data
-            else:
-                secondary_structures.append((chain.name, left, right))
-    
-    # We want to scan through the secondary structures in order of chain, then by the starting sequence id.
+def coil_rows(id: str, sequence: PolymerSequence, polymers: dict[str, ChainPolymer],
+              secondary_structures: list[tuple[str, int, int]]) -> CoilData:
+    """
+    For the coil table, given the observed polymer of every chain and the ranges of every helix and strand
+    (see secondary_structure_ranges).
+    """
+    data = []
+    # We group the secondary structures by chain, in order of chain, then by the starting sequence id.
     secondary_structures.sort(key=lambda x : (len(x[0]), x[0], x[1], x[2]))
+    chain_secondary_structures = [(chain, [(start_id, end_id) for _, start_id, end_id in group])
+                                  for chain, group in itertools.groupby(secondary_structures, key=lambda x : x[0])]
     coil_id = 1
-    ss_index = 0 # secondary structure index
+    ss_index = 0 # index of the next chain in chain_secondary_structures
     for chain in sequence.chain_start_indices:
-        chain_object = struct[0].find_chain(chain)
-        # If chain_object is None (which may happen if the whole chain is experimentally unconfirmed)
-        if not chain_object:
-            span = []
-            chain_string = ""
+        # The polymer is empty if the whole chain is experimentally unconfirmed
+        polymer = polymers.get(chain, empty_polymer)
+
+        # The chains are scanned in the order of chain_start_indices, so the helices and strands of a chain are only
+        # removed if its group is the next one, as when scanning through the sorted secondary structures.
+        if ss_index < len(chain_secondary_structures) and chain_secondary_structures[ss_index][0] == chain:
+            ranges = chain_secondary_structures[ss_index][1]
+            ss_index += 1
         else:
-            span = list(chain_object.get_polymer().first_conformer())
-            chain_string = chain_object.get_polymer().make_one_letter_sequence()
-
-        # Keep scanning through chain, iterating through helices and sheets/strands in the chain
-        # until we run out of helices and sheets/strands that are in the chain.
-        # We add any random coils that are before the current helix or strand pointed to by ss_index,
-        # or add the rest of the random coils if there are no more helices or strands.
-        while(True):
-            # if ss_index points to the first helix or strand in the chain
-            if ss_index == 0 or secondary_structures[ss_index - 1][0] != chain:
-                coil_start = sequence.get_chain_start_id(chain)
-            else:
-                # coil starts after any other helix or strand that has come before the current helix or strand.
-                coil_start = max(coil_start, secondary_structures[ss_index - 1][2] + 1)
-            # if ss_index points to the first helix or strand in a subsequent chain,
-            # or if we are out of helices or strands
-            if ss_index >= len(secondary_structures) or secondary_structures[ss_index][0] != chain:
-                coil_end = sequence.get_chain_end_id(chain)
-            else:
-                coil_end = secondary_structures[ss_index][1] - 1
-            
-            # In the case where the current helix/strand is at the start of a chain,
-            # or there is a previous helix/strand at the end of the chain,
-            # we get that coil_start = coil_end + 1, so we use this condition to ignore those cases.
-            if coil_start <= coil_end:
-                coil_sequence = sequence.get_chain_subsequence(chain, coil_start, coil_end)[0]
-                annotated_sequence = sequence.get_chain_annotated_subsequence(span, chain_string, coil_start, coil_end)
-                length = len(coil_sequence)
-                unconfirmed = sequence.contains_unconfirmed_residues(chain, coil_start, coil_end)
-                data.append((id, coil_id, chain, unconfirmed, coil_sequence, annotated_sequence,
-                             coil_start, coil_end, length))
-                coil_id += 1
-
-            # If the current helix or strand is in the chain, then there may be more coils after
-            # the current helix or strand, so we iterate to the next secondary structure.
-            if ss_index < len(secondary_structures) and secondary_structures[ss_index][0] == chain:
-                ss_index += 1
-            else:
-                break
+            ranges = []
+        coils = coil_ranges(sequence.get_chain_start_id(chain), sequence.get_chain_end_id(chain), ranges)
+
+        annotated_sequences = sequence.get_chain_annotated_ranges(polymer.residues, polymer.annotated_sequence, coils)
+        for (coil_start, coil_end), (coil_sequence, unconfirmed), annotated_sequence in \
+                zip(coils, sequence.get_chain_ranges(chain, coils), annotated_sequences):
+            data.append((id, coil_id, chain, unconfirmed, coil_sequence, annotated_sequence,
+                         coil_start, coil_end, len(coil_sequence)))
+            coil_id += 1
     
     return data
+
+class EntryData(NamedTuple):
+    """
+    The rows of every table of an entry, each named after its table (see database.table_schemas).
+    """
+    main: MainData
+    experimental: ExperimentalData
+    entities: EntityData
+    chains: ChainData
+    subchains: SubchainData
+    helices: HelixData
+    sheets: SheetData
+    strands: StrandData
+    coils: CoilData
+    secondary_structures: HelixData
+
+def insert_into_all_tables(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> EntryData:
+    """
+    For every table at once, giving the same rows as their extractors, in one pass over the chains of the model,
+    one over the helices and one over the sheets. The main, chain and subchain tables share the chains and subchains
+    found, instead of the subchain table looking each subchain and its parent chain up in the whole model.
+    The helix and strand rows are extracted along with the ranges the coils are found from, instead of the coil
+    extractor going through the helices and strands again, and the secondary structures table, which has the same
+    rows as the helix table, is given these rows.
+    """
+    id = struct.info["_entry.id"]
+    polymers = sequence.get_chain_polymers(struct)
+    chains = []
+    chain_data = []
+    subchains = {} # Observed residues and parent chain of every subchain, by name
+    for chain in struct[0]:
+        chain_subchains = chain.subchains()
+        for subchain in chain_subchains:
+            # Like gemmi.Model.get_subchain, the first residues of a subchain found are kept
+            subchains.setdefault(subchain.subchain_id(), (subchain, chain.name))
+        chains.append(chain.name)
+        chain_data.append(chain_row(id, chain.name, ' '.join([subchain.subchain_id() for subchain in chain_subchains]),
+                                    polymers[chain.name], sequence))
+    subchain_data = []
+    for entity in struct.entities:
+        if entity.polymer_type in [PolymerType.PeptideD, PolymerType.PeptideL]:
+            for subchain_name in entity.subchains:
+                if subchain_name in subchains:
+                    subchain, parent_chain = subchains[subchain_name]
+                    subchain_data.append(subchain_row(id, entity, subchain, parent_chain, sequence))
+
+    secondary_structures = [] # Ranges of the helices and strands, see secondary_structure_ranges
+    ill_defined = None # The first helix or strand spanning several chains, in which case there are no coils
+    helix_data = []
+    for index, (helix, resolved) in enumerate(zip(struct.helices, sequence.get_helices(struct))):
+        helix_data.append(helix_row(id, index, helix, resolved, sequence))
+        if resolved.chain != resolved.end_chain:
+            ill_defined = ill_defined or ill_defined_helix(id, index)
+        secondary_structures.append(secondary_structure_range(resolved))
+    sheet_data = []
+    strand_data = []
+    for sheet, strands in zip(struct.sheets, sequence.get_strands(struct)):
+        sheet_data.append(sheet_row(id, sheet))
+        for strand, resolved in zip(sheet.strands, strands):
+            strand_data.append(strand_row(id, sheet, strand, resolved, sequence))
+            if resolved.chain != resolved.end_chain:
+                ill_defined = ill_defined or ill_defined_strand(id, sheet, strand)
+            secondary_structures.append(secondary_structure_range(resolved))
+    if ill_defined is not None:
+        print(ill_defined)
+        coil_data = []
+    else:
+        coil_data = coil_rows(id, sequence, polymers, secondary_structures)
+
+    return EntryData(main_table_rows(struct, doc, chains), insert_into_experimental_table(struct, doc, sequence),
+                     insert_into_entity_table(struct, doc, sequence), chain_data, subchain_data, helix_data,
+                     sheet_data, strand_data, coil_data, list(helix_data))
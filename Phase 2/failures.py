@@ -0,0 +1,58 @@
+"""
+This script contains the failures table, which records every protein file whose last ingestion failed,
+with the stage it failed at and the exception raised, so that failed files can be found and retried
+(with main.py --retry-failed) without scraping the output of a run or walking the whole mirror again.
+A file is removed from the table once it is written again.
+"""
+
+import sqlite3
+import datetime
+from collections import Counter
+from typing import NamedTuple
+from table import Table
+from attributes import Attributes
+
+class Failure(NamedTuple):
+    path: str
+    entry_id: str | None # None if the file failed before its entry ID was read
+    stage: str # "read", "parse", "sequence", "extract TABLE", "write", or "guard" (see guard.py)
+    error_type: str # Name of the exception class
+    message: str
+    time: str # ISO 8601 time, in UTC
+
+failure_table_attributes = Attributes[Failure]\
+    ([("path", "VARCHAR NOT NULL"), ("entry_id", "VARCHAR(5)"), ("stage", "VARCHAR"), ("error_type", "VARCHAR"),
+      ("message", "VARCHAR"), ("time", "VARCHAR")],
+      primary_keys=["path"])
+failure_table = Table("failures", failure_table_attributes, None)
+
+def init_failures(cur: sqlite3.Cursor):
+    cur.execute(failure_table.create_table())
+
+def now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+def from_error(path: str, entry_id: str | None, stage: str, error: BaseException) -> Failure:
+    return Failure(path, entry_id, stage, type(error).__name__, str(error), now())
+
+def load_failed_paths(cur: sqlite3.Cursor) -> list[str]:
+    return [row[0] for row in cur.execute(failure_table.retrieve(("path",)) + " ORDER BY path")]
+
+def record_failures(cur: sqlite3.Cursor, failures: list[Failure]):
+    if failures:
+        cur.executemany("INSERT OR REPLACE INTO " + failure_table.name + " VALUES(?, ?, ?, ?, ?, ?)", failures)
+
+def clear_failures(cur: sqlite3.Cursor, paths: list[str]):
+    if paths:
+        cur.executemany("DELETE FROM " + failure_table.name + " WHERE path = ?", [(path,) for path in paths])
+
+def summarize(file_count: int, failures: list[Failure]) -> str:
+    """
+    Describes the failure rate of a run of file_count files, overall and by stage and exception.
+    """
+    rate = len(failures) / file_count if file_count else 0.0
+    lines = [f"{file_count} files checked, {len(failures)} failed ({rate:.2%})"]
+    for (stage, error_type), count in sorted(Counter((failure.stage, failure.error_type)
+                                                     for failure in failures).items()):
+        lines.append(f"  {stage}: {error_type} x{count}")
+    return "\n".join(lines)
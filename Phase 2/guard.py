@@ -0,0 +1,89 @@
+"""
+This script contains the guard on the time and memory used to extract a single entry, so that a malformed or
+gigantic entry can neither hang a run nor have it killed by the kernel for running out of memory.
+The address space of every worker process is limited to memory_limit bytes, so that an entry needing more fails
+with a MemoryError in its worker. Each entry gets time_limit seconds of wall-clock time, after which an
+EntryTimeout is raised in its worker; if the worker is stuck in gemmi and cannot handle it, it exits
+kill_grace seconds later.
+When a worker dies, the files it was extracting are extracted again one at a time with run_in_process,
+to find the one that killed it.
+"""
+
+import signal
+import resource
+import contextlib
+import faulthandler
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Callable, Any
+
+kill_grace = 30 # Seconds a worker gets to handle an EntryTimeout before it exits
+
+class EntryTimeout(BaseException):
+    """
+    Raised in a worker when an entry runs out of time. It is not an Exception,
+    so it is not caught by the error handling of the extractors.
+    """
+
+def limit_memory(memory_limit: int | None):
+    """
+    Limits the address space of the current process. Runs in every worker process as it starts.
+    """
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+@contextlib.contextmanager
+def time_limit(seconds: float | None):
+    """
+    Raises an EntryTimeout in the block once it has run for the given number of seconds,
+    and makes the process exit if the block is still running kill_grace seconds later.
+    Must be used from the main thread of the process.
+    """
+    if seconds is None:
+        yield
+        return
+    def timeout(signum, frame):
+        raise EntryTimeout(f"Ran out of time after {seconds} seconds")
+    previous = signal.signal(signal.SIGALRM, timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    # Runs in a thread of its own that does not need the GIL, so it also fires while gemmi holds it
+    faulthandler.dump_traceback_later(seconds + kill_grace, exit=True)
+    try:
+        yield
+    finally:
+        faulthandler.cancel_dump_traceback_later()
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def call_in_process(connection: Connection, memory_limit: int | None, function: Callable, args: tuple):
+    limit_memory(memory_limit)
+    connection.send(function(*args))
+    connection.close()
+
+def run_in_process(function: Callable, args: tuple, memory_limit: int | None,
+                   timeout: float | None) -> tuple[Any, str | None]:
+    """
+    Runs the function in a process of its own, killed if it runs for longer than timeout seconds.
+    Returns the result of the function, or None and the reason the process died.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=call_in_process, args=(sender, memory_limit, function, args))
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            return None, f"Ran out of time after {timeout} seconds"
+        return receiver.recv(), None
+    except EOFError:
+        # The process died before sending its result
+        pass
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+    if process.exitcode == -signal.SIGKILL:
+        return None, "Killed by SIGKILL, most likely by the kernel after running out of memory"
+    if process.exitcode < 0:
+        return None, f"Killed by {signal.Signals(-process.exitcode).name}"
+    return None, f"Exited with code {process.exitcode}"
@@ -0,0 +1,611 @@
+"""
+This script contains the ingestion loop of main.py.
+With several workers, the files go through a pipeline of stages that all run at the same time:
+read -- threads probe the entry ID and revision date of each file, and read the raw bytes of the files whose
+        entry was not already up to date when ingestion started (still compressed for .cif.gz files)
+extract -- worker processes parse the bytes with gemmi and run all the table extractors
+write -- the calling process, the single writer that owns the sqlite3 connection and applies the rows in batches
+The files are discovered by the writer as it goes, and no more than in_flight files are between discovery and
+the write stage at a time, so memory stays bounded however many files there are, and a stage that falls behind
+holds back the stages before it.
+Consecutive small files are packed into a single task, read by one reader thread and extracted by one worker,
+so that fewer and larger messages go between the processes.
+Each file can be given a time and memory limit in the workers (see guard.py); a file that runs out of either,
+or kills its worker, is quarantined (see quarantine.py).
+Every failed file is recorded with the stage it failed at (see failures.py), and the failures of the run are
+summarized once it ends.
+Results are written in the same order the files are discovered in, so the database ends up the same as after
+a serial run of commands.check_file.
+Given a selection of tables, only their extractors are run, and only those tables are filled for the entries
+already in the database, e.g. to backfill a new table or one whose extractor changed.
+"""
+
+import os
+import time
+import sqlite3
+import functools
+import threading
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Iterable, Iterator
+import gemmi
+from gemmi import cif
+import commands
+import extract
+import probe
+import cif_file
+import journal
+import quarantine
+import guard
+import failures
+import table
+import shard
+from database import table_schemas, category_table_schemas
+from table import Table
+from polymer_sequence import PolymerSequence
+from categories import CategorySequence, MissingSchemeError
+from manifest import FileState
+from entry_states import EntryStates
+from journal import JournalRecord
+from failures import Failure
+
+class EntryResult(NamedTuple):
+    file_path: str
+    name: str | None # Name of the gemmi structure, None if the file could not be read
+    entry_id: str | None
+    revision_date: str | None
+    rows: dict[str, list[tuple]] # Extracted rows of each table, in the order of table_schemas
+    error: str | None # Message of the error raised while reading or extracting the file
+    up_to_date: bool = False # Whether the file was skipped without parsing, as its entry was up to date
+    quarantined: bool = False # Whether the file ran out of time or memory, or killed its worker
+    stage: str | None = None # Stage the error was raised at, see failures.Failure
+    error_type: str | None = None # Name of the exception class of the error
+    build_times: dict[str, float] | None = None # Seconds spent building each input of the extractors, see table.py
+
+class IngestSummary(NamedTuple):
+    file_count: int # Number of files checked, including those skipped as up to date
+    failures: list[Failure] # Failures of the run, see failures.summarize
+    row_changes: dict[str, int] # Numbers of rows inserted, updated, deleted and left unchanged, see upsert.describe
+    build_times: dict[str, float] # Seconds spent building each input of the extractors, summed over the workers
+
+read_threads = 4 # Number of threads reading files ahead of the worker processes
+in_flight = 64 # Number of files between discovery and the write stage at a time
+task_bytes = 1 << 20 # Size of the files packed into a task, a larger file making a task of its own
+task_files = 16 # Number of files packed into a task at most
+
+def find_files(rootdir: str) -> Iterator[str]:
+    """
+    Yields the paths of all the mmCIF files (plain or gzipped) under rootdir, in os.walk order.
+    """
+    for subdir, dirs, files in os.walk(rootdir):
+        for file in files:
+            if file.endswith(cif_file.file_extensions):
+                yield os.path.join(subdir, file)
+
+def probe_up_to_date(file_path: str, entry_states: EntryStates) -> EntryResult | None:
+    """
+    Returns the result of skipping the file if its probed entry is up to date in entry_states, None otherwise.
+    """
+    probed = probe.probe_file(file_path)
+    if probed is not None and entry_states.action(*probed) is None:
+        return EntryResult(file_path, None, *probed, {}, None, up_to_date=True)
+    return None
+
+def read_file(file_path: str, entry_states: EntryStates | None = None) -> EntryResult | bytes:
+    """
+    Returns the raw bytes of a protein file for extract_file. Runs in the reader threads.
+    If entry_states is given and the probed entry is up to date in it, the result of skipping the file is returned
+    instead, as it is if the file cannot be read.
+    """
+    if entry_states is not None:
+        skipped = probe_up_to_date(file_path, entry_states)
+        if skipped is not None:
+            return skipped
+    try:
+        with open(file_path, "rb") as file:
+            return file.read()
+    except OSError as error:
+        return EntryResult(file_path, None, None, None, {}, str(error), stage="read", error_type=type(error).__name__)
+
+def selected_tables(tables: tuple[str, ...] | None, from_categories: bool = False) -> list[Table]:
+    schemas = category_table_schemas if from_categories else table_schemas
+    return [table_scheme for table_scheme in schemas if tables is None or table_scheme.name in tables]
+
+def required_inputs(extracted_tables: list[Table]) -> frozenset[str]:
+    return frozenset().union(*(table_scheme.inputs for table_scheme in extracted_tables))
+
+def required_categories(extracted_tables: list[Table], inputs: frozenset[str]) -> frozenset[str] | None:
+    """
+    Returns the only categories of the document the extracted tables need, or None if they need the whole document.
+    """
+    if inputs - {table.document, table.sequence} or any(table_scheme.categories is None
+                                                        for table_scheme in extracted_tables):
+        return None
+    categories = table.entry_categories.union(*(table_scheme.categories for table_scheme in extracted_tables))
+    return categories | table.sequence_categories if table.sequence in inputs else categories
+
+def parse_file(file_path: str, single_parse: bool = False, content: bytes | None = None,
+               inputs: frozenset[str] = table.all_inputs, build_times: dict[str, float] | None = None,
+               categories: frozenset[str] | None = None) -> tuple[gemmi.Structure, cif.Document]:
+    """
+    Parses a protein file, or its raw bytes if content is given, into a gemmi Structure and cif Document,
+    building only what the given inputs need (see table.py). The document is always parsed, as the entry ID and
+    revision date are read from it, and the structure comes from cif_file.header_structure if neither the model
+    nor the coordinates are needed. Without the coordinates, the atoms are cut out of the content before it is
+    parsed (see cif_file.without_atoms). If categories is given, only those categories of the document are parsed
+    (see cif_file.select_categories), which is only done when the inputs are just the document and sequence.
+    See check_file for single_parse.
+    The seconds spent building each input are added to build_times if given; with single_parse, the document
+    comes out of the same parse as the coordinates, so the time is all counted for the coordinates.
+    """
+    build_times = build_times if build_times is not None else {}
+    start = time.perf_counter()
+    def built(input: str):
+        nonlocal start
+        now = time.perf_counter()
+        build_times[input] = build_times.get(input, 0.0) + now - start
+        start = now
+
+    if content is not None:
+        content = cif_file.decompress(file_path, content)
+    if table.coordinates in inputs:
+        if single_parse:
+            doc = cif.Document()
+            struct = cif_file.read_structure(file_path, save_doc=doc) if content is None \
+                else cif_file.parse_structure(content, save_doc=doc)
+            built(table.coordinates)
+            return struct, doc
+        struct = cif_file.read_structure(file_path) if content is None else cif_file.parse_structure(content)
+        built(table.coordinates)
+        doc = cif_file.read_document(file_path) if content is None else cif_file.parse_document(content)
+        built(table.document)
+        return struct, doc
+    if categories is not None and not inputs - {table.document, table.sequence}:
+        doc = cif_file.read_categories(file_path, categories) if content is None \
+            else cif_file.parse_document(cif_file.select_categories([content], categories))
+        built(table.document)
+        return cif_file.header_structure(doc), doc
+    if content is None:
+        content = cif_file.read_bytes(file_path)
+    doc = cif_file.parse_document(cif_file.without_atoms(content))
+    built(table.document)
+    if table.model in inputs:
+        struct = cif_file.model_structure(doc)
+        built(table.model)
+        return struct, doc
+    return cif_file.header_structure(doc), doc
+
+def extract_file(file_path: str, single_parse: bool = False, entry_states: EntryStates | None = None,
+                 content: bytes | None = None, tables: tuple[str, ...] | None = None,
+                 from_categories: bool = False, fused: bool = False) -> EntryResult:
+    """
+    Parses a protein file and extracts the rows of every table. Runs in the worker processes.
+    If an extractor fails, the rows of the tables extracted before it are kept,
+    as check_file would have already written them by then.
+    See check_file for single_parse.
+    If entry_states is given and the probed entry is up to date in it, the file is not parsed at all.
+    If content is given, it is parsed instead of reading the file again.
+    If tables is given, only the extractors of those tables are run, and only the inputs they need are built,
+    parsing only the categories they read if they declare them.
+    If from_categories is True, the tables are extracted without the coordinates (see categories.py),
+    unless the scheme categories of the file do not list every subchain.
+    If fused is True and every table is extracted from the coordinates, their rows are extracted at once
+    (see fused_rows).
+    """
+    if entry_states is not None:
+        skipped = probe_up_to_date(file_path, entry_states)
+        if skipped is not None:
+            return skipped
+    struct = None
+    entry_id = revision_date = None
+    rows = {}
+    stage = "parse"
+    extracted_tables = selected_tables(tables, from_categories)
+    inputs = required_inputs(extracted_tables)
+    build_times = {}
+    try:
+        struct, doc = parse_file(file_path, single_parse, content, inputs, build_times,
+                                 required_categories(extracted_tables, inputs))
+        stage = "sequence"
+        sequence = None
+        start = time.perf_counter()
+        if table.residues in inputs:
+            try:
+                sequence = CategorySequence(doc)
+            except MissingSchemeError:
+                # The categories do not list every subchain, so the coordinates are read after all
+                return extract_file(file_path, single_parse, None, content, tables, False, fused)
+            build_times[table.residues] = time.perf_counter() - start
+        elif table.sequence in inputs:
+            sequence = PolymerSequence(doc)
+            build_times[table.sequence] = time.perf_counter() - start
+        entry_id = struct.info["_entry.id"]
+        revision_date = commands.get_revision_date(doc)
+        if fused and tables is None and not from_categories:
+            stage = "extract"
+            rows = fused_rows(struct, doc, sequence)
+        for table_scheme in extracted_tables:
+            if table_scheme.name in rows:
+                continue
+            stage = "extract " + table_scheme.name
+            rows[table_scheme.name] = table_scheme.extract_data(struct, doc, sequence)
+    except MemoryError:
+        # Left to extract_guarded, which quarantines the file
+        raise
+    except Exception as error:
+        name = struct.name if struct is not None else None
+        return EntryResult(file_path, name, entry_id, revision_date, rows, str(error), stage=stage,
+                           error_type=type(error).__name__, build_times=build_times)
+    return EntryResult(file_path, struct.name, entry_id, revision_date, rows, None, build_times=build_times)
+
+def fused_rows(struct: gemmi.Structure, doc: cif.Document, sequence: PolymerSequence) -> dict[str, list[tuple]]:
+    """
+    Returns the rows of every table, extracted at once by extract.insert_into_all_tables, which walks the structure
+    only once. If it fails, no rows are returned, so that the tables are extracted one at a time by their own
+    extractors, which tell which table failed and keep the rows of the tables before it, as without fusing them.
+    """
+    try:
+        return extract.insert_into_all_tables(struct, doc, sequence)._asdict()
+    except MemoryError:
+        raise
+    except Exception:
+        return {}
+
+def describe_build_times(build_times: dict[str, float]) -> str:
+    total = sum(build_times.values())
+    return "Time spent building the inputs of the extractors: " + (", ".join(
+        f"{input} {seconds:.1f}s ({seconds / total:.0%})" for input, seconds in
+        sorted(build_times.items(), key=lambda item: -item[1])) if total else "none")
+
+def write_result(writer: commands.BatchWriter, entry_states: EntryStates, result: EntryResult,
+                 verbose: bool = True, file_state: FileState | None = None, tables: tuple[str, ...] | None = None):
+    """
+    Queues the rows extracted by a worker in the writer, and records them in entry_states.
+    Runs in the writer process.
+    If file_state is given, the file is recorded in the manifest, unless reading or extracting it failed.
+    If the file failed, its failure is queued in the writer.
+    If tables is given, the rows of those tables replace the stored ones if the entry is in the database,
+    and the file is skipped otherwise.
+    """
+    journal_record = None
+    if writer.use_journal:
+        status = "done" if result.error is None else "failed"
+        journal_record = JournalRecord(result.file_path, result.entry_id, status)
+    try:
+        if verbose:
+            print("Checking " + result.file_path)
+        if result.quarantined:
+            print("Quarantining " + result.file_path)
+            quarantine.quarantine_file(writer.cur, result.file_path, result.error)
+        # The file could not be read, so check_file would not have written anything either
+        if result.revision_date is None:
+            if journal_record is not None:
+                writer.add(result.entry_id, result.name, {}, journal_record=journal_record)
+            raise Exception(result.error)
+
+        # Queued rows of the same entry are written first, so the batch never holds the entry twice
+        if result.entry_id in writer.pending_ids:
+            writer.flush()
+        if result.error is not None:
+            file_state = None
+        action = entry_states.action(result.entry_id, result.revision_date)
+        if tables is not None:
+            action = "backfill" if result.entry_id in entry_states.states else None
+        if action == "insert":
+            if verbose:
+                print("Adding " + result.file_path)
+            writer.add(result.entry_id, result.name, result.rows, file_state=file_state, journal_record=journal_record,
+                       file_path=result.file_path)
+            entry_states.record(result.entry_id, result.revision_date, result.rows)
+        elif action in ("update", "repair", "backfill"):
+            if verbose:
+                print({"update": "Updating ", "repair": "Data corrupted, fixing ",
+                       "backfill": "Backfilling "}[action] + result.file_path)
+            # Like update_file, the rows of the table whose extractor failed are deleted too
+            replaced_tables = []
+            for table_scheme in selected_tables(tables):
+                replaced_tables.append(table_scheme.name)
+                if table_scheme.name not in result.rows:
+                    break
+            writer.add(result.entry_id, result.name, result.rows, replaced_tables, file_state=file_state,
+                       journal_record=journal_record, file_path=result.file_path)
+            entry_states.record(result.entry_id, result.revision_date, result.rows, replaced_tables)
+        elif file_state is not None or journal_record is not None:
+            writer.add(result.entry_id, result.name, {}, file_state=file_state, journal_record=journal_record,
+                       file_path=result.file_path)
+        if result.error is not None:
+            raise Exception(result.error)
+
+    except Exception as error:
+        if result.name is not None:
+            print(result.name)
+        print(error)
+        if result.error is not None:
+            writer.add_failure(Failure(result.file_path, result.entry_id, result.stage or "extract",
+                                       result.error_type or "Exception", result.error, failures.now()))
+        else:
+            writer.add_failure(failures.from_error(result.file_path, result.entry_id, "write", error))
+
+def pack_tasks(file_paths: Iterable[str], task_bytes: int = task_bytes) -> Iterator[list[str]]:
+    """
+    Groups consecutive files into tasks of less than task_bytes and task_files files,
+    a file of task_bytes or more making a task of its own.
+    """
+    task = []
+    size = 0
+    for file_path in file_paths:
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError:
+            # The error is reported by the read stage
+            file_size = 0
+        if task and (size + file_size >= task_bytes or len(task) >= task_files):
+            yield task
+            task = []
+            size = 0
+        task.append(file_path)
+        size += file_size
+    if task:
+        yield task
+
+def read_task(file_paths: list[str], entry_states: EntryStates | None = None) -> list[EntryResult | bytes]:
+    return [read_file(file_path, entry_states) for file_path in file_paths]
+
+def extract_guarded(file_path: str, single_parse: bool, content: bytes | None, time_limit: float | None,
+                    tables: tuple[str, ...] | None = None, from_categories: bool = False,
+                    fused: bool = False) -> EntryResult:
+    """
+    Extracts a file from its content within time_limit seconds, and within the memory limit of the process.
+    If it runs out of either, the file is returned as quarantined. Runs in the worker processes.
+    """
+    try:
+        with guard.time_limit(time_limit):
+            return extract_file(file_path, single_parse, None, content, tables, from_categories, fused)
+    except guard.EntryTimeout as error:
+        return EntryResult(file_path, None, None, None, {}, str(error), quarantined=True, stage="guard",
+                           error_type="EntryTimeout")
+    except MemoryError:
+        return EntryResult(file_path, None, None, None, {}, "Ran out of memory", quarantined=True, stage="guard",
+                           error_type="MemoryError")
+
+def extract_task(file_paths: list[str], single_parse: bool, contents: list[EntryResult | bytes],
+                 time_limit: float | None = None, tables: tuple[str, ...] | None = None,
+                 from_categories: bool = False, fused: bool = False) -> list[EntryResult]:
+    """
+    Extracts the files of a task from the contents read by read_task. Runs in the worker processes.
+    """
+    return [content if isinstance(content, EntryResult)
+            else extract_guarded(file_path, single_parse, content, time_limit, tables, from_categories, fused)
+            for file_path, content in zip(file_paths, contents)]
+
+def retry_task(file_paths: list[str], single_parse: bool, contents: list[EntryResult | bytes | None],
+               time_limit: float | None = None, memory_limit: int | None = None,
+               tables: tuple[str, ...] | None = None, from_categories: bool = False,
+               fused: bool = False) -> list[EntryResult]:
+    """
+    Extracts the files of a task whose worker died, each in a process of its own, so that the file that
+    killed the worker is found and quarantined. Runs in the reader threads.
+    """
+    # The process is left to stop itself first, see guard.time_limit
+    timeout = time_limit + 2 * guard.kill_grace if time_limit is not None else None
+    results = []
+    for file_path, content in zip(file_paths, contents):
+        if isinstance(content, EntryResult):
+            results.append(content)
+            continue
+        result, reason = guard.run_in_process(extract_guarded,
+                                              (file_path, single_parse, content, time_limit, tables, from_categories,
+                                               fused),
+                                              memory_limit, timeout)
+        if result is None:
+            result = EntryResult(file_path, None, None, None, {}, reason, quarantined=True, stage="guard",
+                                 error_type="BrokenProcessPool")
+        results.append(result)
+    return results
+
+def extract_again(file_path: str, single_parse: bool, time_limit: float | None = None,
+                  memory_limit: int | None = None, from_categories: bool = False, fused: bool = False) -> EntryResult:
+    """
+    Extracts a file skipped as up to date whose entry changed since it was probed. Runs in the writer process.
+    With a time or memory limit, the file is extracted in a process of its own, like the files of a retried task,
+    so that it is quarantined if it runs out of either, instead of stalling or killing the writer.
+    """
+    if time_limit is None and memory_limit is None:
+        return extract_file(file_path, single_parse, from_categories=from_categories, fused=fused)
+    # The file is read again in the process, as its content was not kept when it was skipped
+    return retry_task([file_path], single_parse, [None], time_limit, memory_limit, None, from_categories, fused)[0]
+
+def copy_outcome(source: Future, target: Future):
+    error = source.exception()
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+def pipeline_files(file_paths: Iterable[str], workers: int, read_threads: int, in_flight: int,
+                   single_parse: bool = False, entry_states: EntryStates | None = None,
+                   task_bytes: int = task_bytes, time_limit: float | None = None,
+                   memory_limit: int | None = None, tables: tuple[str, ...] | None = None,
+                   from_categories: bool = False, fused: bool = False) -> Iterator[EntryResult]:
+    """
+    Extracts the given files through the read and extract stages (see above), in a pool of reader threads and
+    a pool of worker processes, packed into tasks by pack_tasks. Results are yielded in the same order as
+    file_paths, and the next task is only taken from file_paths once fewer than in_flight files are waiting
+    to be yielded.
+    When a worker dies, the tasks it took down with the pool are extracted again by retry_task,
+    and a new pool is started for the next tasks.
+    """
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(workers, initializer=guard.limit_memory, initargs=(memory_limit,))
+    pools = [new_pool()]
+    pool_lock = threading.Lock()
+
+    def submit_extract(task: list[str], contents: list[EntryResult | bytes]) -> Future:
+        with pool_lock:
+            try:
+                return pools[-1].submit(extract_task, task, single_parse, contents, time_limit, tables,
+                                          from_categories, fused)
+            except BrokenProcessPool:
+                pools.append(new_pool())
+                return pools[-1].submit(extract_task, task, single_parse, contents, time_limit, tables,
+                                          from_categories, fused)
+
+    try:
+        with ThreadPoolExecutor(read_threads) as readers:
+            def submit(task: list[str]) -> Future:
+                results = Future()
+                def extract(read: Future):
+                    # Runs in the reader thread once the files of the task are read
+                    try:
+                        contents = read.result()
+                        if all(isinstance(content, EntryResult) for content in contents):
+                            results.set_result(contents)
+                            return
+                        submit_extract(task, contents).add_done_callback(
+                            lambda extracted: retry(extracted, contents))
+                    except Exception as error:
+                        results.set_exception(error)
+                def retry(extracted: Future, contents: list[EntryResult | bytes]):
+                    try:
+                        if not isinstance(extracted.exception(), BrokenProcessPool):
+                            copy_outcome(extracted, results)
+                            return
+                        retried = readers.submit(retry_task, task, single_parse, contents, time_limit, memory_limit,
+                                                 tables, from_categories, fused)
+                        retried.add_done_callback(lambda retried: copy_outcome(retried, results))
+                    except Exception as error:
+                        results.set_exception(error)
+                readers.submit(read_task, task, entry_states).add_done_callback(extract)
+                return results
+
+            pending = collections.deque()
+            pending_files = 0
+            for task in pack_tasks(file_paths, task_bytes):
+                while pending_files >= in_flight:
+                    done_task, results = pending.popleft()
+                    pending_files -= len(done_task)
+                    yield from results.result()
+                pending.append((task, submit(task)))
+                pending_files += len(task)
+            while pending:
+                yield from pending.popleft()[1].result()
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+def extract_files(file_paths: Iterable[str], workers: int, single_parse: bool = False,
+                  entry_states: EntryStates | None = None, read_threads: int = read_threads,
+                  in_flight: int = in_flight, task_bytes: int = task_bytes, time_limit: float | None = None,
+                  memory_limit: int | None = None, tables: tuple[str, ...] | None = None,
+                  from_categories: bool = False, fused: bool = False) -> Iterator[EntryResult]:
+    """
+    Extracts the given files, through the pipeline of pipeline_files if there is more than one worker,
+    or if the files are given a time or memory limit, which are enforced in the worker processes.
+    Results are yielded in the same order as file_paths.
+    If entry_states is given, files whose entry is up to date in it are probed but not parsed.
+    If tables is given, only the extractors of those tables are run.
+    If from_categories is True, the tables are extracted without the coordinates (see categories.py).
+    If fused is True, the rows of every table are extracted at once (see fused_rows).
+    """
+    if workers <= 1 and time_limit is None and memory_limit is None:
+        yield from map(functools.partial(extract_file, single_parse=single_parse, entry_states=entry_states,
+                                         tables=tables, from_categories=from_categories, fused=fused), file_paths)
+        return
+    yield from pipeline_files(file_paths, max(workers, 1), read_threads, in_flight, single_parse, entry_states,
+                              task_bytes, time_limit, memory_limit, tables, from_categories, fused)
+
+def combine_summaries(summaries: Iterable[IngestSummary]) -> IngestSummary:
+    """
+    Adds up the summaries of several calls of ingest_files, such as those of the batches of a work queue.
+    """
+    file_count = 0
+    run_failures = []
+    row_changes = collections.Counter()
+    build_times = collections.Counter()
+    for summary in summaries:
+        file_count += summary.file_count
+        run_failures += summary.failures
+        row_changes.update(summary.row_changes)
+        build_times.update(summary.build_times)
+    return IngestSummary(file_count, run_failures, row_changes, build_times)
+
+def ingest_files(con: sqlite3.Connection, file_paths: Iterable[str], workers: int = 1,
+                 batch_entries: int = 500, batch_rows: int = 50000, verbose: bool = True,
+                 single_parse: bool = False, file_states: dict[str, FileState] | None = None,
+                 sort_rows: bool = False, use_journal: bool = False, read_threads: int = read_threads,
+                 in_flight: int = in_flight, task_bytes: int = task_bytes, time_limit: float | None = None,
+                 memory_limit: int | None = None, use_quarantine: bool = False,
+                 use_failures: bool = False, tables: tuple[str, ...] | None = None,
+                 from_categories: bool = False, fused: bool = False, claimed: bool = False) -> IngestSummary:
+    """
+    Extracts the given files and writes them to the database in batches.
+    Returns the number of files checked, the failures of the run, the numbers of rows it wrote and the time spent
+    building the inputs of the extractors.
+
+    Keyword arguments:
+    workers -- number of worker processes running gemmi and the extractors
+    batch_entries -- number of files gathered before their rows are written and committed
+    batch_rows -- number of rows gathered before they are written and committed
+    single_parse -- whether each file is tokenized once (see check_file)
+    file_states -- states of the files from manifest.changed_files, recorded in the manifest once written;
+                   each state is removed once its file is written, so it can be filled as file_paths is consumed
+    sort_rows -- whether the rows of each batch are inserted in primary key order (see BatchWriter)
+    use_journal -- whether the files are recorded in the journal, and the files recorded by an interrupted run
+                   are skipped
+    read_threads -- number of threads reading files ahead of the worker processes
+    in_flight -- number of files between discovery and the write stage at a time
+    task_bytes -- size of the consecutive small files packed into a task for a worker
+    time_limit -- seconds of wall-clock time each file gets in the workers, None for no limit
+    memory_limit -- bytes of address space of each worker process, None for no limit
+    use_quarantine -- whether the quarantined files that have not changed since are skipped
+    use_failures -- whether the failed files are recorded in the failures table, and removed from it once written
+    tables -- names of the only tables to extract, whose rows are replaced for the entries already in the database,
+              leaving the other tables and entries alone; every file is then parsed, as the probes cannot tell
+              whether its rows in these tables are up to date
+    from_categories -- whether the tables are extracted from the mmCIF categories alone, without parsing the
+                       coordinates (see categories.py)
+    fused -- whether the rows of every table are extracted at once, walking the structure only once, instead of
+             one table at a time (see fused_rows)
+    claimed -- whether the files are a batch claimed from a work queue, in which case only the states of their
+               entries and their quarantine records are loaded, instead of those of the whole database, which
+               would make each batch slower than the last as the worker's shard grows
+    """
+    writer = commands.BatchWriter(con, batch_entries, batch_rows, sort_rows, use_journal, use_failures)
+    claimed_paths = list(file_paths) if claimed else None
+    if claimed_paths is not None:
+        file_paths = claimed_paths
+    if use_journal:
+        completed = journal.load_journal(writer.cur)
+        if completed:
+            print(f"Resuming an interrupted run, skipping the {len(completed)} files it wrote")
+            file_paths = (file_path for file_path in file_paths if file_path not in completed)
+    if use_quarantine:
+        quarantined = quarantine.load_quarantine(writer.cur, claimed_paths)
+        if quarantined:
+            file_paths = quarantine.skip_quarantined(writer.cur, file_paths, quarantined)
+    if claimed_paths is not None:
+        # The files of the mirror are named after their entry ID
+        entry_states = EntryStates.load(writer.cur, map(shard.entry_id_of, claimed_paths))
+    else:
+        entry_states = EntryStates.load(writer.cur)
+    # The probes get a copy of the states as they were before any file is written
+    snapshot = EntryStates(dict(entry_states.states))
+    file_count = 0
+    build_times = collections.Counter()
+    for result in extract_files(file_paths, workers, single_parse, snapshot if tables is None else None,
+                                read_threads, in_flight, task_bytes, time_limit, memory_limit, tables,
+                                from_categories, fused):
+        # An earlier file of the same entry may have changed its state since, in which case the file is parsed after all
+        if result.up_to_date and entry_states.action(result.entry_id, result.revision_date) is not None:
+            result = extract_again(result.file_path, single_parse, time_limit, memory_limit, from_categories, fused)
+        file_state = file_states.pop(result.file_path, None) if file_states is not None else None
+        write_result(writer, entry_states, result, verbose=verbose, file_state=file_state, tables=tables)
+        file_count += 1
+        if result.build_times:
+            build_times.update(result.build_times)
+    writer.flush()
+    if use_journal:
+        journal.clear_journal(writer.cur)
+        con.commit()
+    return IngestSummary(file_count, writer.run_failures, writer.row_changes, build_times)
@@ -0,0 +1,49 @@
+"""
+This script contains the ingestion journal, which records every file written by the current run,
+in the same transaction as the file's rows. If a run is killed, the rows and journal records of the
+batch being written are rolled back together by SQLite, and the next run resumes with the first file
+the journal does not hold, without checking the files before it again.
+The journal is cleared once a run finishes, and at the start of a run that does not use it (with --no-journal or
+--tables): such a run may write the files the journal lists again, which a later run resuming the interrupted one
+would then skip even if they changed since.
+"""
+
+import sqlite3
+from typing import NamedTuple
+from table import Table
+from attributes import Attributes
+
+class JournalRecord(NamedTuple):
+    path: str
+    entry_id: str | None # None if the file could not be read
+    status: str # "done" if all the rows of the file were written, "failed" otherwise
+
+journal_table_attributes = Attributes[JournalRecord]\
+    ([("path", "VARCHAR NOT NULL"), ("entry_id", "VARCHAR(5)"), ("status", "VARCHAR(10) NOT NULL")],
+      primary_keys=["path"])
+journal_table = Table("journal", journal_table_attributes, None)
+
+def init_journal(cur: sqlite3.Cursor):
+    cur.execute(journal_table.create_table())
+
+def load_journal(cur: sqlite3.Cursor) -> set[str]:
+    """
+    Returns the paths of the files written by an interrupted run, empty if the last run finished.
+    """
+    return {row[0] for row in cur.execute(journal_table.retrieve(("path",)))}
+
+def record_files(cur: sqlite3.Cursor, records: list[JournalRecord]):
+    if records:
+        cur.executemany("INSERT OR REPLACE INTO " + journal_table.name + " VALUES(?, ?, ?)", records)
+
+def clear_journal(cur: sqlite3.Cursor):
+    cur.execute("DELETE FROM " + journal_table.name)
+
+def discard_journal(cur: sqlite3.Cursor) -> int:
+    """
+    Clears the journal of an interrupted run before a run that does not use it.
+    Returns the number of files the journal held.
+    """
+    file_count = cur.execute("SELECT COUNT(*) FROM " + journal_table.name).fetchone()[0]
+    clear_journal(cur)
+    return file_count
@@ -1,22 +1,222 @@
-import sqlite3
 import os
-import re
+import socket
+import sqlite3
+import argparse
 import commands
+import ingest
+import manifest
+import bulk_load
+import journal
+import quarantine
+import failures
+import upsert
+import shard
+import schedule
+import work_queue
+from database import table_schemas
 from tqdm import tqdm
 sql_database = "./Phase 2/records/pdb_database_records.db" # Location of output SQL database
 rootdir = "./mmCIF/mmCIF" # Root directory of all the pdb files
 verbose = False
+workers = 1 # Number of worker processes extracting files, 1 processes files one at a time
+read_threads = 4 # Number of threads reading files ahead of the worker processes
+in_flight = 64 # Number of files between discovery and the database at a time, which bounds memory use
+task_bytes = 1 << 20 # Size of the consecutive small files a worker extracts as a single task
+largest_first = False # Whether the largest files are extracted first, so no large file is left for the end of the run
+time_limit = None # Seconds of wall-clock time each file gets in the worker processes, None for no limit
+memory_limit = None # GiB of memory each worker process gets, None for no limit
+single_parse = False # Whether each file is tokenized once instead of twice (by gemmi and by cif.read)
+from_categories = False # Whether the tables are extracted from the mmCIF categories, without parsing the coordinates
+fused = False # Whether the rows of every table are extracted at once, walking the structure only once
+batch_entries = 500 # Number of files whose rows are written and committed together
+batch_rows = 50000 # Number of rows written and committed together, whichever limit is reached first
+use_manifest = True # Whether files unchanged since they were last ingested are skipped without parsing
+use_hash = False # Whether the manifest also compares content hashes of files whose size or mtime changed
+use_journal = True # Whether an interrupted run is resumed after the last file it wrote
+shard_spec = None # Shard of the files extracted by this run (see shard.py), None for all the files
+use_bulk_load = False # Whether the database is (re)built with the bulk-load settings instead of the safe incremental ones
+queue_path = None # Work queue shared between machines (see work_queue.py), None to extract the files in rootdir
+queue_batch = 100 # Number of files a worker claims from the queue at a time
+lease = 1800 # Seconds after which the files claimed by a worker are handed to another one, if not written by then
+retry_failed = False # Whether only the files recorded in the failures table are extracted, instead of those in rootdir
+tables = None # Names of the only tables (re)filled for the entries already in the database, None for a normal run
+
+def extract(con: sqlite3.Connection, file_paths, args: argparse.Namespace,
+            claimed: bool = False) -> ingest.IngestSummary:
+    """
+    Extracts the files into the database, skipping those unchanged since they were ingested if the manifest is used.
+    With --tables, every file is extracted again, only into the selected tables.
+    claimed -- whether the files are a batch claimed from the queue, which gets no progress bar of its own
+    """
+    file_states = None
+    if args.manifest and args.tables is None:
+        # Filled as the files are scanned and emptied as they are written, so it only holds the files in flight
+        file_states = {}
+        def scan(file_paths):
+            for file_state in manifest.changed_files(con.cursor(), file_paths, args.hash):
+                file_states[file_state.path] = file_state
+                yield file_state.path
+        file_paths = scan(file_paths)
+    if args.largest_first:
+        sized_paths = schedule.file_sizes(file_paths)
+        if args.workers > 1 and not claimed:
+            print(schedule.report(sized_paths, args.workers))
+        file_paths = schedule.largest_first(sized_paths)
+    if not claimed:
+        file_paths = tqdm(file_paths, desc="Extracting")
+    return ingest.ingest_files(con, file_paths, args.workers,
+                        batch_entries=args.batch_entries, batch_rows=args.batch_rows,
+                        verbose=verbose, single_parse=args.single_parse, file_states=file_states,
+                        sort_rows=args.bulk_load, use_journal=args.journal and args.tables is None,
+                        read_threads=args.read_threads, in_flight=args.in_flight, task_bytes=args.task_bytes,
+                        time_limit=args.time_limit,
+                        memory_limit=int(args.memory_limit * (1 << 30)) if args.memory_limit is not None else None,
+                        use_quarantine=True, use_failures=True,
+                        tables=tuple(args.tables) if args.tables is not None else None,
+                        from_categories=args.from_categories, fused=args.fused, claimed=claimed)
 
 if __name__ == "__main__":
-    con = sqlite3.connect(sql_database)
-    cur = con.cursor()
-    commands.init_database(cur)
+    parser = argparse.ArgumentParser(description="Extracts the mmCIF files in rootdir into the SQL database.")
+    parser.add_argument("--database", default=sql_database,
+                        help="location of the output SQL database (default: %(default)s)")
+    parser.add_argument("--shard", default=shard_spec,
+                        help="only extract the files of a shard, given as hash:K/N or dirs:FIRST-LAST or dirs:A,B,... "
+                             "(see shard.py); the shard databases are combined with merge.py")
+    parser.add_argument("--workers", type=int, default=workers,
+                        help="number of worker processes parsing and extracting files (default: %(default)s)")
+    parser.add_argument("--read-threads", type=int, default=read_threads,
+                        help="number of threads reading files ahead of the worker processes, "
+                             "with more than one worker (default: %(default)s)")
+    parser.add_argument("--in-flight", type=int, default=in_flight,
+                        help="number of files read, parsed or waiting to be written at a time, "
+                             "with more than one worker (default: %(default)s)")
+    parser.add_argument("--task-bytes", type=int, default=task_bytes,
+                        help="size of the consecutive small files sent to a worker together, "
+                             "with more than one worker (default: %(default)s)")
+    parser.add_argument("--largest-first", action=argparse.BooleanOptionalAction, default=largest_first,
+                        help="extract the files by decreasing size, and report the estimated tail of the run "
+                             "against discovery order; not with --bulk-load, which inserts the entries in order")
+    parser.add_argument("--single-parse", action=argparse.BooleanOptionalAction, default=single_parse,
+                        help="tokenize each file once and build the structure from the same parse")
+    parser.add_argument("--from-categories", action=argparse.BooleanOptionalAction, default=from_categories,
+                        help="extract every table from the mmCIF categories without parsing the atoms, which takes "
+                             "much less time and memory; the gaps in the annotated sequences are then placed where the "
+                             "sequence IDs of the observed residues are not consecutive, not where their atoms are too "
+                             "far apart, so they can differ from those of a run without it (see categories.py)")
+    parser.add_argument("--fused", action=argparse.BooleanOptionalAction, default=fused,
+                        help="extract the rows of every table at once, walking each structure only once, instead of "
+                             "running the extractor of each table in turn (see extract.insert_into_all_tables)")
+    parser.add_argument("--time-limit", type=float, default=time_limit,
+                        help="seconds each file gets to be extracted; files taking longer are quarantined and "
+                             "skipped by later runs until they change")
+    parser.add_argument("--memory-limit", type=float, default=memory_limit,
+                        help="GiB of memory each worker process gets; files needing more are quarantined and "
+                             "skipped by later runs until they change")
+    parser.add_argument("--batch-entries", type=int, default=batch_entries,
+                        help="number of files written and committed together (default: %(default)s)")
+    parser.add_argument("--batch-rows", type=int, default=batch_rows,
+                        help="number of rows written and committed together (default: %(default)s)")
+    parser.add_argument("--manifest", action=argparse.BooleanOptionalAction, default=use_manifest,
+                        help="skip files whose size and modification time are unchanged since they were ingested")
+    parser.add_argument("--hash", action=argparse.BooleanOptionalAction, default=use_hash,
+                        help="also record content hashes, so files that were touched but not changed are skipped")
+    parser.add_argument("--journal", action=argparse.BooleanOptionalAction, default=use_journal,
+                        help="record the files written by the run, so an interrupted run is resumed where it stopped; "
+                             "a run without it discards the journal of an interrupted run")
+    parser.add_argument("--bulk-load", action=argparse.BooleanOptionalAction, default=use_bulk_load,
+                        help="use fast but unsafe pragmas and build the secondary indexes at the end, for full rebuilds")
+    parser.add_argument("--retry-failed", action="store_true", default=retry_failed,
+                        help="only extract the files whose last extraction failed, as recorded in the failures table "
+                             "of the database, instead of the files in rootdir")
+    parser.add_argument("--tables", nargs="+", default=tables, choices=[table.name for table in table_schemas],
+                        metavar="TABLE",
+                        help="only run the extractors of these tables, and replace their rows for the entries already "
+                             "in the database, e.g. to fill a new table or one whose extractor changed; every file is "
+                             "extracted again, without the manifest or the journal")
+    parser.add_argument("--queue", default=queue_path,
+                        help="work queue on storage shared between machines (see work_queue.py): with --enqueue, "
+                             "add the files in rootdir to it, otherwise extract the files claimed from it into the "
+                             "database, which is this worker's shard; the shards are combined with merge.py --queue")
+    parser.add_argument("--enqueue", action="store_true", help="add the files in rootdir to the queue and exit")
+    parser.add_argument("--worker-id", default=socket.gethostname(),
+                        help="name of this worker in the queue, unique to each worker (default: %(default)s)")
+    parser.add_argument("--queue-batch", type=int, default=queue_batch,
+                        help="number of files claimed from the queue at a time (default: %(default)s)")
+    parser.add_argument("--lease", type=float, default=lease,
+                        help="seconds after which claimed files that are not written yet are handed to another worker "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+    if args.enqueue and args.queue is None:
+        parser.error("--enqueue needs a queue given with --queue")
+    if args.tables is not None and args.queue is not None:
+        parser.error("--tables fills the tables of an existing database, not the shards of a queue")
+    if args.retry_failed and args.queue is not None:
+        parser.error("--retry-failed retries the files of the database, not those of a queue")
+    if args.shard is not None:
+        try:
+            shard.parse_shard(args.shard)
+        except ValueError as error:
+            parser.error(str(error))
+    if args.largest_first and args.bulk_load:
+        parser.error("--largest-first reorders the files by size, undoing the primary key order of --bulk-load")
+    if args.queue is not None and not args.manifest:
+        parser.error("--queue needs the manifest, which merge.py uses to match the files of the queue with the entries")
 
-    for subdir, dirs, files in tqdm(os.walk(rootdir)):
-        for file in files:
-            path = os.path.join(subdir, file)
-            if re.search('./*.cif.*', path):
-                commands.check_file(cur, path, verbose=verbose)
+    if args.enqueue:
+        file_paths = ingest.find_files(rootdir)
+        if args.shard is not None:
+            file_paths = shard.shard_files(file_paths, args.shard)
+        queue_con = work_queue.connect(args.queue)
+        print(f"Added {work_queue.enqueue(queue_con, file_paths)} files to the queue")
+        queue_con.close()
+        parser.exit()
+
+    con = sqlite3.connect(args.database)
+    cur = con.cursor()
+    if args.bulk_load:
+        index_statements = bulk_load.begin_bulk_load(cur)
+    else:
+        bulk_load.apply_pragmas(cur, bulk_load.safe_pragmas)
+    commands.init_database(cur, create_indexes=not args.bulk_load)
+    manifest.init_manifest(cur)
+    journal.init_journal(cur)
+    if not args.journal or args.tables is not None:
+        discarded = journal.discard_journal(cur)
         con.commit()
+        if discarded:
+            print(f"Discarded the journal of an interrupted run, which will not be resumed ({discarded} files)")
+    quarantine.init_quarantine(cur)
+    failures.init_failures(cur)
+
+    if args.queue is not None:
+        queue_con = work_queue.connect(args.queue)
+        work_queue.register_worker(queue_con, args.worker_id, os.path.abspath(args.database))
+        summaries = []
+        def process(file_paths):
+            summaries.append(extract(con, file_paths, args, claimed=True))
+            # Only the files in the manifest were written, the others failed or were quarantined
+            return manifest.recorded_files(cur, file_paths)
+        work_queue.run_worker(queue_con, args.worker_id, args.queue_batch, args.lease, process)
+        queue_con.close()
+        summary = ingest.combine_summaries(summaries)
+    else:
+        if args.retry_failed:
+            file_paths = failures.load_failed_paths(cur)
+            # Files removed from the mirror since they failed are left in the table
+            file_paths = [file_path for file_path in file_paths if os.path.exists(file_path)]
+            print(f"Retrying {len(file_paths)} failed files")
+        else:
+            file_paths = ingest.find_files(rootdir)
+        if args.shard is not None:
+            file_paths = shard.shard_files(file_paths, args.shard)
+        if args.bulk_load:
+            # Files are named after their entry ID, so entries are inserted in primary key order across batches too
+            file_paths = sorted(file_paths, key=os.path.basename)
+        summary = extract(con, file_paths, args)
+    print(failures.summarize(summary.file_count, summary.failures))
+    print(upsert.describe(summary.row_changes))
+    print(ingest.describe_build_times(summary.build_times))
+    if args.bulk_load:
+        bulk_load.end_bulk_load(con, index_statements + commands.index_statements())
 
     con.close()
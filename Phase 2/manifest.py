@@ -0,0 +1,96 @@
+"""
+This script contains the file manifest, which records the size, modification time and (optionally)
+a content hash of every protein file that has been ingested.
+Before extraction, every discovered file is compared with the manifest using os.stat alone,
+so that only new or changed files are sent to the extractors.
+"""
+
+import os
+import sqlite3
+import hashlib
+from typing import NamedTuple, Iterable, Iterator
+from table import Table
+from attributes import Attributes
+
+class FileState(NamedTuple):
+    path: str
+    size: int | None # None if the file could not be checked, in which case it is never recorded
+    mtime: int | None # Modification time in nanoseconds
+    hash: str | None # Content hash, None if hashing is turned off
+
+manifest_table_attributes = Attributes[FileState]\
+    ([("path", "VARCHAR NOT NULL"), ("size", "INT"), ("mtime", "INT"), ("hash", "VARCHAR"),
+      ("entry_id", "VARCHAR(5)")],
+      primary_keys=["path"])
+manifest_table = Table("files", manifest_table_attributes, None)
+
+def init_manifest(cur: sqlite3.Cursor):
+    cur.execute(manifest_table.create_table())
+
+def hash_file(file_path: str) -> str:
+    """
+    Returns the content hash of a file, read in blocks so large files are never held in memory.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(cur: sqlite3.Cursor) -> dict[str, FileState]:
+    """
+    Loads the whole manifest into memory with a single query.
+    """
+    res = cur.execute(manifest_table.retrieve(("path", "size", "mtime", "hash")))
+    return {row[0]: FileState(*row) for row in res}
+
+def changed_files(cur: sqlite3.Cursor, file_paths: Iterable[str], use_hash: bool = False) -> Iterator[FileState]:
+    """
+    Yields the state of every file that is not in the manifest or has changed since it was recorded.
+    A file whose size and modification time match the manifest is unchanged.
+    With use_hash, a file whose size or modification time differs is only changed if its content hash
+    differs as well, in which case its new modification time is recorded in the manifest.
+    A file that cannot be checked, for instance because it was removed since it was found, is yielded without
+    a size or modification time, so that reading it fails and is recorded like that of any other file.
+    """
+    manifest = load_manifest(cur)
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            recorded = manifest.get(file_path)
+            if recorded is not None and recorded.size == stat.st_size and recorded.mtime == stat.st_mtime_ns:
+                continue
+            file_hash = hash_file(file_path) if use_hash else None
+        except OSError:
+            yield FileState(file_path, None, None, None)
+            continue
+        if recorded is not None and file_hash is not None and recorded.hash == file_hash:
+            cur.execute("UPDATE " + manifest_table.name + " SET mtime = ? WHERE path = ?", (stat.st_mtime_ns, file_path))
+            continue
+        yield FileState(file_path, stat.st_size, stat.st_mtime_ns, file_hash)
+
+def recorded_files(cur: sqlite3.Cursor, file_paths: Iterable[str]) -> list[str]:
+    """
+    Returns the files whose current size and modification time are recorded in the manifest,
+    which are the files written since they last changed. Files that can no longer be read are left out.
+    """
+    recorded = []
+    for file_path in file_paths:
+        row = cur.execute("SELECT size, mtime FROM " + manifest_table.name + " WHERE path = ?", (file_path,)).fetchone()
+        if row is None:
+            continue
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        if row == (stat.st_size, stat.st_mtime_ns):
+            recorded.append(file_path)
+    return recorded
+
+def record_files(cur: sqlite3.Cursor, files: list[tuple[FileState, str]]):
+    """
+    Records the state of ingested files in the manifest, along with the entry ID of each file.
+    """
+    if files:
+        cur.executemany("INSERT OR REPLACE INTO " + manifest_table.name + " VALUES(?, ?, ?, ?, ?)",
+                        [(*file_state, entry_id) for file_state, entry_id in files])
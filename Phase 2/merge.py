@@ -0,0 +1,254 @@
+"""
+This script merges the shard databases written by main.py --shard into a single database.
+Every shard is checked before anything is written: an entry found in more than one shard (or already in
+the output database) is an error, as is an entry with rows in a shard but none in its main table,
+or a shard whose run was interrupted.
+With --rootdir, every file found in the PDB mirror must also have its entry in one of the shards (or in the
+output database), or be recorded as failed or quarantined in one; otherwise an entry missing from every shard,
+for instance because the run of one shard was never started, goes unnoticed, and the merge says so.
+The tables of each shard are then copied with one INSERT ... SELECT per table, with the bulk-load settings,
+and the secondary indexes are built at the end. Each shard is copied in a transaction of its own, which also records
+it in the merged_shards table of the output database (SQLite cannot detach a shard within a transaction, so the
+shards cannot all be copied in one). A merge that failed or was interrupted is resumed by running it again:
+the shards it already merged are skipped, and the others are checked against them. The failures and quarantine tables are copied too, so that the
+files that failed in any shard can be found and retried from the merged database.
+
+The shards written by the workers of a work queue (see work_queue.py) are merged with --queue instead.
+A file whose lease expired may have been written by two workers; its entry is only taken from the shard of the
+worker that marked it as done in the queue. The journal check is skipped, as the files in the journal of a
+worker that crashed were claimed again by other workers. A file that failed on one worker but was then written by
+another is done in the queue, and its failure is left out.
+
+To merge shards, use the command "python merge.py OUTPUT SHARD [SHARD ...]" from the Phase 2 directory,
+or "python merge.py OUTPUT --queue QUEUE" for the shards of a work queue, adding "--rootdir ROOTDIR" to check
+that they cover every file of the mirror.
+"""
+
+import os
+import sqlite3
+import argparse
+from collections import Counter
+from typing import NamedTuple, Iterable
+
+import shard
+import ingest
+import commands
+import manifest
+import bulk_load
+import journal
+import failures
+import quarantine
+import work_queue
+from table import Table
+from attributes import Attributes
+from database import table_schemas
+from entry_states import EntryStates
+
+class MergedShard(NamedTuple):
+    path: str # Absolute path of a shard database merged into the output database
+
+merged_table_attributes = Attributes[MergedShard]([("path", "VARCHAR NOT NULL")], primary_keys=["path"])
+merged_table = Table("merged_shards", merged_table_attributes, None)
+
+def init_merged(cur: sqlite3.Cursor):
+    cur.execute(merged_table.create_table())
+
+def load_merged(cur: sqlite3.Cursor) -> set[str]:
+    return {row[0] for row in cur.execute(merged_table.retrieve(("path",)))}
+
+def load_shard(shard_path: str) -> tuple[EntryStates, int]:
+    """
+    Loads the states of all the entries of a shard, and the number of files in its journal
+    (nonzero if the run writing the shard was interrupted), without modifying it.
+    """
+    con = sqlite3.connect(f"file:{shard_path}?mode=ro", uri=True)
+    try:
+        cur = con.cursor()
+        journal_size = 0
+        if cur.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (journal.journal_table.name,)).fetchone():
+            journal_size = len(journal.load_journal(cur))
+        return EntryStates.load(cur), journal_size
+    finally:
+        con.close()
+
+def failed_entries(shard_path: str) -> set[str]:
+    """
+    Returns the entries of the files recorded as failed or quarantined in a shard, without modifying it.
+    """
+    con = sqlite3.connect(f"file:{shard_path}?mode=ro", uri=True)
+    try:
+        cur = con.cursor()
+        entry_ids = set()
+        for table_scheme in (failures.failure_table, quarantine.quarantine_table):
+            if cur.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table_scheme.name,)).fetchone():
+                entry_ids.update(shard.entry_id_of(file_path)
+                                 for file_path, in cur.execute(f"SELECT path FROM {table_scheme.name}"))
+        return entry_ids
+    finally:
+        con.close()
+
+def queue_shards(queue_path: str) -> dict[str, set[str]]:
+    """
+    Returns the shard database of every worker registered in the queue, along with the entries to leave out
+    of it: those of files marked as done by another worker.
+    """
+    file_owners, workers = work_queue.load_queue(queue_path)
+    shards = {}
+    for worker in workers:
+        con = sqlite3.connect(f"file:{worker.database}?mode=ro", uri=True)
+        try:
+            files = con.execute(manifest.manifest_table.retrieve(("path", "entry_id"))).fetchall()
+        finally:
+            con.close()
+        shards[worker.database] = {entry_id for file_path, entry_id in files
+                                   if file_owners.get(file_path, worker.worker_id) != worker.worker_id}
+    return shards
+
+def check_shards(cur: sqlite3.Cursor, shard_paths: list[str], excluded: dict[str, set[str]] | None = None,
+                 file_paths: Iterable[str] | None = None) -> int:
+    """
+    Checks that every entry appears in exactly one of the shards and not already in the output database,
+    and that no shard holds a partially written entry or comes from an interrupted run.
+    excluded -- entries to leave out of each shard, from queue_shards, in which case the journals are not checked
+    file_paths -- files that the shards should cover, each with its entry in a shard or the output database,
+                  or recorded as failed in a shard; None to leave the coverage unchecked
+    Returns the number of entries in the shards, or raises a ValueError listing the entries at fault.
+    """
+    counts = Counter(EntryStates.load(cur).states.keys())
+    partial = []
+    failed = set()
+    for shard_path in shard_paths:
+        entry_states, journal_size = load_shard(shard_path)
+        if journal_size and excluded is None:
+            raise ValueError(f"The run writing {shard_path} was interrupted after {journal_size} files, "
+                             "run it again to finish the shard")
+        shard_excluded = excluded.get(shard_path, set()) if excluded is not None else set()
+        states = {entry_id: state for entry_id, state in entry_states.states.items() if entry_id not in shard_excluded}
+        counts.update(states.keys())
+        partial += [entry_id for entry_id, state in states.items() if state.revision_date is None]
+        if file_paths is not None:
+            failed |= failed_entries(shard_path)
+    duplicates = sorted(entry_id for entry_id, count in counts.items() if count > 1)
+    if duplicates:
+        raise ValueError(f"{len(duplicates)} entries appear more than once: {', '.join(duplicates[:20])}")
+    if partial:
+        raise ValueError(f"{len(partial)} entries have no row in the main table: {', '.join(sorted(partial)[:20])}")
+    if file_paths is not None:
+        missing = sorted({shard.entry_id_of(file_path) for file_path in file_paths} - counts.keys() - failed)
+        if missing:
+            raise ValueError(f"{len(missing)} entries are missing from every shard: {', '.join(missing[:20])}")
+    return len(counts)
+
+def merge_shard(con: sqlite3.Connection, shard_path: str, excluded: set[str] = set(), done_paths: set[str] = set()):
+    """
+    Copies all the rows of a shard into the database, along with its manifest, failures and quarantine,
+    in a single transaction, leaving out the excluded entries and the failures of the files in done_paths.
+    The shard is recorded as merged in the same transaction.
+    """
+    cur = con.cursor()
+    cur.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+    try:
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS excluded_entries (entry_id VARCHAR PRIMARY KEY)")
+        cur.execute("DELETE FROM temp.excluded_entries")
+        cur.executemany("INSERT INTO temp.excluded_entries VALUES(?)", ((entry_id,) for entry_id in excluded))
+        # The entry ID is the first attribute of every table, and the last one of the manifest
+        shard_tables = {row[0] for row in cur.execute("SELECT name FROM shard.sqlite_master WHERE type = 'table'")}
+        for table_scheme in table_schemas + [manifest.manifest_table]:
+            if table_scheme.name not in shard_tables:
+                continue
+            # Rows are read in primary key order, following the shard's primary key index
+            order = f" ORDER BY {', '.join(table_scheme.attributes.primary_keys)}" \
+                if table_scheme.attributes.primary_keys else ""
+            entry_column = "entry_id" if table_scheme is manifest.manifest_table \
+                else table_scheme.attributes.attribute_names[0]
+            where = f" WHERE {entry_column} NOT IN (SELECT entry_id FROM temp.excluded_entries)" if excluded else ""
+            cur.execute(f"INSERT INTO {table_scheme.name} SELECT * FROM shard.{table_scheme.name}{where}{order}")
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS done_paths (path VARCHAR PRIMARY KEY)")
+        cur.execute("DELETE FROM temp.done_paths")
+        cur.executemany("INSERT INTO temp.done_paths VALUES(?)", ((path,) for path in done_paths))
+        # A file may have failed in several shards of a queue, the failure of the last shard merged is kept
+        for table_scheme in (failures.failure_table, quarantine.quarantine_table):
+            if table_scheme.name not in shard_tables:
+                continue
+            cur.execute(f"INSERT OR REPLACE INTO {table_scheme.name} SELECT * FROM shard.{table_scheme.name} "
+                        "WHERE path NOT IN (SELECT path FROM temp.done_paths)")
+        cur.execute("INSERT INTO " + merged_table.name + " VALUES(?)", (os.path.abspath(shard_path),))
+        con.commit()
+    except sqlite3.Error:
+        # The shard can only be detached outside of a transaction
+        con.rollback()
+        raise
+    finally:
+        cur.execute("DETACH DATABASE shard")
+
+def merge_shards(con: sqlite3.Connection, shard_paths: list[str], verbose: bool = True,
+                 excluded: dict[str, set[str]] | None = None, done_paths: set[str] = set(),
+                 file_paths: Iterable[str] | None = None):
+    """
+    Merges the shard databases into the database, whose tables must already exist.
+    excluded -- entries to leave out of each shard, from queue_shards
+    done_paths -- files done in the queue, whose failures in any shard are left out
+    file_paths -- files that the shards should cover, None to leave the coverage unchecked
+    Raises a ValueError before writing anything if the shards fail the checks of check_shards.
+    Shards recorded as merged by an earlier run are skipped, as their entries are already in the database.
+    """
+    cur = con.cursor()
+    init_merged(cur)
+    merged = load_merged(cur)
+    for shard_path in shard_paths:
+        if os.path.abspath(shard_path) in merged and verbose:
+            print(f"Skipping {shard_path}, merged by an earlier run")
+    shard_paths = [shard_path for shard_path in shard_paths if os.path.abspath(shard_path) not in merged]
+    entry_count = check_shards(cur, shard_paths, excluded, file_paths)
+    for shard_path in shard_paths:
+        if verbose:
+            print("Merging " + shard_path)
+        merge_shard(con, shard_path, excluded.get(shard_path, set()) if excluded is not None else set(), done_paths)
+    # Every entry was checked to be in a single shard, so this only fails if the copy itself went wrong
+    merged_count = len(EntryStates.load(cur).states)
+    if merged_count != entry_count:
+        raise ValueError(f"Expected {entry_count} entries after merging, found {merged_count}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merges shard databases written by main.py --shard or --queue.")
+    parser.add_argument("output", help="database to merge the shards into")
+    parser.add_argument("shards", nargs="*", help="shard databases")
+    parser.add_argument("--queue", help="merge the shards of the workers of this work queue instead")
+    parser.add_argument("--rootdir", help="root directory of the PDB mirror, to check that the shards cover every "
+                                          "file in it")
+    args = parser.parse_args()
+
+    excluded = None
+    done_paths = set()
+    if args.queue is not None:
+        if args.shards:
+            parser.error("Shards are taken from the queue with --queue")
+        excluded = queue_shards(args.queue)
+        args.shards = list(excluded)
+        done_paths = set(work_queue.load_queue(args.queue)[0])
+    if not args.shards:
+        parser.error("No shard databases to merge")
+    for shard_path in args.shards:
+        if not os.path.exists(shard_path):
+            parser.error("No shard database at " + shard_path)
+    file_paths = None
+    if args.rootdir is not None:
+        if not os.path.isdir(args.rootdir):
+            parser.error("No directory at " + args.rootdir)
+        file_paths = ingest.find_files(args.rootdir)
+    else:
+        print("Entries missing from every shard are not checked, give the mirror with --rootdir to check them")
+    con = sqlite3.connect(args.output)
+    cur = con.cursor()
+    index_statements = bulk_load.begin_bulk_load(cur)
+    commands.init_database(cur, create_indexes=False)
+    manifest.init_manifest(cur)
+    failures.init_failures(cur)
+    quarantine.init_quarantine(cur)
+    try:
+        merge_shards(con, args.shards, excluded=excluded, done_paths=done_paths, file_paths=file_paths)
+    except ValueError as error:
+        con.close()
+        parser.error(str(error))
+    bulk_load.end_bulk_load(con, index_statements + commands.index_statements())
+    con.close()
@@ -1,3 +1,5 @@
+import bisect
+import functools
 import gemmi
 from gemmi import cif
 from typing import NamedTuple
@@ -10,6 +12,34 @@ class Monomer(NamedTuple):
     expt_name: str # Same as name, but is labelled ? if experimentally unconfirmed
     hetero: str
 
+class SecondaryStructure(NamedTuple):
+    """
+    A helix or strand resolved to the chains and sequence IDs of the residues it starts and ends at.
+    """
+    chain: str
+    end_chain: str
+    start_id: int
+    end_id: int
+
+class ChainPolymer(NamedTuple):
+    """
+    The observed residues of the polymer of a chain, keeping only the first residue of a microheterogeneity
+    like gemmi.ResidueSpan.first_conformer, along with what the extractors read from them.
+    """
+    residues: list[gemmi.Residue]
+    annotated_sequence: str # One-letter sequence with gaps, like gemmi.ResidueSpan.make_one_letter_sequence
+    author_start_id: int | None
+    author_end_id: int | None
+
+empty_polymer = ChainPolymer([], "", None, None)
+
+def chain_polymer(chain: gemmi.Chain) -> ChainPolymer:
+    polymer = chain.get_polymer()
+    residues = list(polymer.first_conformer())
+    if len(residues) == 0:
+        return empty_polymer
+    return ChainPolymer(residues, polymer.make_one_letter_sequence(), residues[0].seqid.num, residues[-1].seqid.num)
+
 class PolymerSequence:
     def __init__(self, doc: cif.Document):
         # We first extract all the relevant sequence-related info from the .cif file
@@ -55,6 +85,11 @@ class PolymerSequence:
 
         monomer_sequence = [monomer.name for monomer in self.sequence]
         self.one_letter_code = sequence_3to1(monomer_sequence)
+        # Helices and strands of the last structure given, resolved once for all the extractors (see get_helices)
+        self.helices: tuple[gemmi.Structure, list[SecondaryStructure]] | None = None
+        self.strands: tuple[gemmi.Structure, list[list[SecondaryStructure]]] | None = None
+        # Polymers of the chains of the last structure given (see get_chain_polymers)
+        self.polymers: tuple[gemmi.Structure, dict[str, ChainPolymer]] | None = None
     
     def binary_search(self, left_index: int, right_index: int, target_label: int) -> int:
         """
@@ -130,8 +165,30 @@ class PolymerSequence:
 
         start_index = binary_search(span, 0, len(span) - 1, start_id)
         end_index = binary_search(span, 0, len(span) - 1, end_id)
+        return self.get_annotated_slice(chain_string, start_index, end_index)
+
+    def get_chain_annotated_ranges(self, span: list, chain_string: str, ranges: list[tuple[int, int]]) -> list[str]:
+        """
+        Returns the annotated one-letter sequence of every range of sequence ids of a chain, like
+        get_chain_annotated_subsequence. The ranges must be in increasing order, like coils, so that the residues
+        they start and end at can be guessed from the last one found (see find_residue).
+        """
+        if len(span) == 0:
+            return [""] * len(ranges)
+        last_index, last_label = 0, span[0].label_seq
+        result = []
+        for start_id, end_id in ranges:
+            start_index = find_residue(span, last_index + start_id - last_label, start_id)
+            end_index = find_residue(span, start_index + end_id - start_id, end_id)
+            last_index, last_label = end_index, end_id
+            result.append(self.get_annotated_slice(chain_string, start_index, end_index))
+        return result
 
-        span_index_to_string_index = [i for i in range(len(chain_string)) if chain_string[i] != '-']
+    def get_annotated_slice(self, chain_string: str, start_index: int, end_index: int) -> str:
+        """
+        Returns the annotated one-letter sequence between two observed residues of a chain, given their indices.
+        """
+        span_index_to_string_index = residue_string_indices(chain_string)
         string_start_index = span_index_to_string_index[start_index]
         string_end_index = span_index_to_string_index[end_index]
         if end_index >= start_index:
@@ -152,11 +209,42 @@ class PolymerSequence:
         start_index = self.binary_search(chain_start, chain_end, start_id)
         end_index = self.binary_search(chain_start, chain_end, end_id)
         
-        for index in self.bad_indices:
-            if start_index <= index <= end_index:
-                return 1
+        # The bad indices are in increasing order, so only the first one from start_index needs checking
+        position = bisect.bisect_left(self.bad_indices, start_index)
+        if position < len(self.bad_indices) and self.bad_indices[position] <= end_index:
+            return 1
         return 0
     
+    def index_of(self, chain_start: int, chain_end: int, seq_id: int) -> int:
+        """
+        Returns the index of the residue of a chain with a given sequence id, like binary_search.
+        The sequence ids of a chain are almost always consecutive, so the index is first looked up directly.
+        """
+        index = chain_start + seq_id - self.sequence[chain_start].seq_id
+        if chain_start <= index <= chain_end and self.sequence[index].seq_id == seq_id:
+            return index
+        return self.binary_search(chain_start, chain_end, seq_id)
+
+    def get_chain_ranges(self, chain: str, ranges: list[tuple[int, int]]) -> list[tuple[str, int]]:
+        """
+        Returns the (unannotated) one-letter sequence of every range of sequence ids of a chain, and whether it contains
+        an experimentally unconfirmed residue (see contains_unconfirmed_residues).
+        The ranges must not overlap and be in increasing order, like coils, so that the unconfirmed residues are
+        scanned through once for the whole chain.
+        """
+        chain_start = self.chain_start_indices[chain]
+        chain_end = self.chain_end_indices[chain]
+        position = bisect.bisect_left(self.bad_indices, chain_start)
+        result = []
+        for start_id, end_id in ranges:
+            start_index = self.index_of(chain_start, chain_end, start_id)
+            end_index = self.index_of(chain_start, chain_end, end_id)
+            while position < len(self.bad_indices) and self.bad_indices[position] < start_index:
+                position += 1
+            unconfirmed = 1 if position < len(self.bad_indices) and self.bad_indices[position] <= end_index else 0
+            result.append((self.one_letter_code[start_index:end_index + 1], unconfirmed))
+        return result
+    
     def get_chain_start_id(self, chain: str) -> int:
         """
         Returns the sequence id of the starting residue of a chain (not its index).
@@ -169,30 +257,83 @@ class PolymerSequence:
         """
         return self.sequence[self.chain_end_indices[chain]].seq_id
     
+    def locate(self, address: gemmi.AtomAddress, struct: gemmi.Structure) -> tuple[str, int]:
+        """
+        Returns the chain and sequence ID of the residue at an address, such as the start or end of a helix.
+        """
+        chain = struct[0].find_cra(address).chain
+        auth_label = str(address.res_id.seqid.num) + address.res_id.seqid.icode
+        return chain.name, chain[auth_label][0].label_seq
+
+    def resolve(self, start: gemmi.AtomAddress, end: gemmi.AtomAddress, struct: gemmi.Structure) -> SecondaryStructure:
+        chain, start_id = self.locate(start, struct)
+        end_chain, end_id = self.locate(end, struct)
+        return SecondaryStructure(chain, end_chain, start_id, end_id)
+
+    def get_helices(self, struct: gemmi.Structure) -> list[SecondaryStructure]:
+        """
+        Returns the resolved helices of a structure, in the order of struct.helices.
+        They are only resolved the first time, the extractors of one entry all being given the same structure.
+        """
+        if self.helices is None or self.helices[0] is not struct:
+            self.helices = (struct, [self.resolve(helix.start, helix.end, struct) for helix in struct.helices])
+        return self.helices[1]
+
+    def get_strands(self, struct: gemmi.Structure) -> list[list[SecondaryStructure]]:
+        """
+        Returns the resolved strands of every sheet of a structure, in the order of struct.sheets and sheet.strands.
+        They are only resolved the first time, like the helices.
+        """
+        if self.strands is None or self.strands[0] is not struct:
+            self.strands = (struct, [[self.resolve(strand.start, strand.end, struct) for strand in sheet.strands]
+                                     for sheet in struct.sheets])
+        return self.strands[1]
+
+    def get_chain_polymers(self, struct: gemmi.Structure) -> dict[str, ChainPolymer]:
+        """
+        Returns the observed polymer of every chain of the model of a structure, by chain name.
+        They are only computed the first time, like the helices, so that every extractor reuses the same residues.
+        """
+        if self.polymers is None or self.polymers[0] is not struct:
+            polymers = {}
+            for chain in struct[0]:
+                if chain.name not in polymers:
+                    polymers[chain.name] = chain_polymer(chain)
+            self.polymers = (struct, polymers)
+        return self.polymers[1]
+
+    def get_secondary_structure_sequence(self, secondary_structure: SecondaryStructure) -> tuple[str, int]:
+        """
+        Returns the one-letter sequence of a resolved helix or strand, and its signed length.
+        """
+        if secondary_structure.chain != secondary_structure.end_chain:
+            return ("MULTIPLE CHAINS ERROR", 0)
+        return self.get_chain_subsequence(secondary_structure.chain, secondary_structure.start_id,
+                                          secondary_structure.end_id)
+
     def get_helix_sequence(self, helix: gemmi.Helix, struct: gemmi.Structure) -> str:
-        chain = struct[0].find_cra(helix.start).chain
-        end_chain = struct[0].find_cra(helix.end).chain
-        start_auth_label = str(helix.start.res_id.seqid.num) + helix.start.res_id.seqid.icode
-        end_auth_label = str(helix.end.res_id.seqid.num) + helix.end.res_id.seqid.icode
-        start_pos = chain[start_auth_label][0].label_seq
-        end_pos = end_chain[end_auth_label][0].label_seq
-
-        if (chain != end_chain):
-            return "MULTIPLE CHAINS ERROR"
-        return self.get_chain_subsequence(chain.name, start_pos, end_pos)[0]
-    
+        return self.get_secondary_structure_sequence(self.resolve(helix.start, helix.end, struct))[0]
+
     def get_strand_sequence(self, strand: gemmi.Sheet.Strand, struct: gemmi.Structure) -> tuple[str, int]:
-        chain = struct[0].find_cra(strand.start).chain
-        end_chain = struct[0].find_cra(strand.end).chain
-        start_auth_label = str(strand.start.res_id.seqid.num) + strand.start.res_id.seqid.icode
-        end_auth_label = str(strand.end.res_id.seqid.num) + strand.end.res_id.seqid.icode
-        start_pos = chain[start_auth_label][0].label_seq
-        end_pos = end_chain[end_auth_label][0].label_seq
-
-        if (chain != end_chain):
-            return ("MULTIPLE CHAINS ERROR", 0)
-        return self.get_chain_subsequence(chain.name, start_pos, end_pos)
-    
+        return self.get_secondary_structure_sequence(self.resolve(strand.start, strand.end, struct))
+
+@functools.lru_cache(maxsize=8)
+def residue_string_indices(chain_string: str) -> list[int]:
+    """
+    Returns the index in an annotated one-letter sequence of every residue, skipping the gaps.
+    Kept for the last few chains, as it is needed for every coil of the chain.
+    """
+    return [i for i in range(len(chain_string)) if chain_string[i] != '-']
+
+def find_residue(span: list[gemmi.Residue], guess: int, target_label: int) -> int:
+    """
+    Returns the same index as binary_search over the whole span, checking a guessed index first.
+    The observed residues are almost always consecutive, so the index of a residue can be guessed from another one.
+    """
+    if 0 <= guess < len(span) and span[guess].label_seq == target_label:
+        return guess
+    return binary_search(span, 0, len(span) - 1, target_label)
+
 def binary_search(span: list[gemmi.Residue], left_index: int, right_index: int, target_label: int) -> int:
     """
     Helper method for finding the index of a desired residue in a residue span by means of binary search.
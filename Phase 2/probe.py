@@ -0,0 +1,103 @@
+"""
+This script contains a lightweight probe for the entry ID and latest revision date of an mmCIF file
+(plain or gzipped), used to decide whether a file is stale before it is parsed with gemmi.
+Only the bytes up to the end of the _pdbx_audit_revision_history category are read, and they are
+searched as raw bytes, so the _atom_site rows on the way are never split into lines or tokenized.
+If the revision history comes before _atom_site, the probe stops before reaching it.
+"""
+
+import re
+from typing import BinaryIO
+import cif_file
+
+chunk_size = 1 << 16
+overlap = 64 # Bytes kept from the previous chunk, so markers split between chunks are still found
+entry_id_pattern = re.compile(rb"^_entry\.id[ \t]+(\S+)", re.MULTILINE)
+revision_marker = b"\n_pdbx_audit_revision_history."
+revision_item = "_pdbx_audit_revision_history.revision_date"
+# A category ends at a "#" separator, or, in files without them, at the next loop, data block or tag of another category
+category_end = re.compile(rb"\n(?:#|loop_|data_|save_|_(?!pdbx_audit_revision_history\.))")
+# A CIF value is either quoted (the quote only ends when followed by whitespace) or a run of non-whitespace
+token_pattern = re.compile(r"""'(.*?)'(?=\s|$)|"(.*?)"(?=\s|$)|(\S+)""")
+
+def tokenize(line: str) -> list[str]:
+    return [next(group for group in match.groups() if group is not None) for match in token_pattern.finditer(line)]
+
+def read_category(file: BinaryIO, buffer: bytes) -> list[str]:
+    """
+    Reads the lines of the category starting at the beginning of buffer, up to the next category.
+    """
+    while True:
+        match = category_end.search(buffer)
+        # A tag too close to the end of the buffer may be a tag of the category cut short, so it is only
+        # trusted once more is read after it
+        if match is not None and (buffer[match.start() + 1:match.start() + 2] != b"_"
+                                  or len(buffer) - match.start() >= len(revision_marker)):
+            return buffer[:match.start()].decode().splitlines()
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return buffer[:match.start() if match is not None else len(buffer)].decode().splitlines()
+        buffer += chunk
+
+def parse_revision_date(lines: list[str], is_loop: bool) -> str | None:
+    """
+    Returns the latest revision date from the lines of the _pdbx_audit_revision_history category.
+    """
+    if not is_loop:
+        for line in lines:
+            tokens = tokenize(line)
+            if tokens and tokens[0] == revision_item:
+                return tokens[1] if len(tokens) > 1 else None
+        return None
+
+    headers = [line.strip() for line in lines if line.startswith("_")]
+    values = []
+    text_field = None
+    for line in lines[len(headers):]:
+        # Multi-line text fields start and end with a line starting with a semicolon
+        if text_field is not None:
+            if line.startswith(";"):
+                values.append(text_field)
+                text_field = None
+            else:
+                text_field += line
+        elif line.startswith(";"):
+            text_field = line[1:]
+        else:
+            values.extend(tokenize(line))
+    # Any other number of values means the category was not read as it is, so the date cannot be trusted
+    if revision_item not in headers or not values or len(values) % len(headers) != 0:
+        return None
+    index = headers.index(revision_item)
+    # Revisions are listed in order, so the last row is the latest revision
+    return values[len(values) // len(headers) * len(headers) - len(headers) + index]
+
+def probe_file(file_path: str) -> tuple[str, str] | None:
+    """
+    Returns the entry ID and latest revision date of a protein file,
+    or None if the file could not be probed (in which case it should be parsed in full).
+    """
+    try:
+        with cif_file.open_file(file_path) as file:
+            buffer = file.read(chunk_size)
+            match = entry_id_pattern.search(buffer)
+            if match is None:
+                return None
+            entry_id = match.group(1).decode().strip("'\"")
+
+            start = buffer.find(revision_marker)
+            while start == -1:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    return None
+                buffer = buffer[-overlap:] + chunk
+                start = buffer.find(revision_marker)
+            is_loop = buffer[:start].rstrip().endswith(b"loop_")
+            lines = read_category(file, buffer[start + 1:])
+    except (OSError, EOFError, cif_file.decompression_error, UnicodeDecodeError):
+        return None
+
+    revision_date = parse_revision_date(lines, is_loop)
+    if revision_date is None:
+        return None
+    return entry_id, revision_date
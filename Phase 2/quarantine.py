@@ -0,0 +1,72 @@
+"""
+This script contains the quarantine list, which records the files whose extraction ran out of time or memory,
+or killed its worker (see guard.py), along with the reason. A quarantined file is skipped by later runs
+until its size or modification time changes.
+"""
+
+import os
+import sqlite3
+from typing import NamedTuple, Iterable, Iterator
+from table import Table
+from attributes import Attributes
+
+class QuarantineRecord(NamedTuple):
+    path: str
+    size: int | None # None if the file could not be checked when it was quarantined
+    mtime: int | None # Modification time in nanoseconds
+    reason: str
+
+quarantine_table_attributes = Attributes[QuarantineRecord]\
+    ([("path", "VARCHAR NOT NULL"), ("size", "INT"), ("mtime", "INT"), ("reason", "VARCHAR")],
+      primary_keys=["path"])
+quarantine_table = Table("quarantine", quarantine_table_attributes, None)
+
+def init_quarantine(cur: sqlite3.Cursor):
+    cur.execute(quarantine_table.create_table())
+
+def load_quarantine(cur: sqlite3.Cursor, file_paths: Iterable[str] | None = None) -> dict[str, QuarantineRecord]:
+    """
+    Loads the records of the given files that are quarantined, or of every quarantined file if file_paths is None.
+    """
+    if file_paths is None:
+        return {row[0]: QuarantineRecord(*row) for row in cur.execute(quarantine_table.retrieve())}
+    query = quarantine_table.retrieve() + " WHERE path = ?"
+    quarantined = {}
+    for file_path in file_paths:
+        row = cur.execute(query, (file_path,)).fetchone()
+        if row is not None:
+            quarantined[file_path] = QuarantineRecord(*row)
+    return quarantined
+
+def quarantine_file(cur: sqlite3.Cursor, file_path: str, reason: str):
+    """
+    Records the file as quarantined. A file that cannot be checked, for instance because it was removed since it
+    was read, is recorded without a size or modification time, so that it is released the next time it is found.
+    """
+    try:
+        stat = os.stat(file_path)
+        size, mtime = stat.st_size, stat.st_mtime_ns
+    except OSError:
+        size = mtime = None
+    cur.execute("INSERT OR REPLACE INTO " + quarantine_table.name + " VALUES(?, ?, ?, ?)",
+                (file_path, size, mtime, reason))
+
+def skip_quarantined(cur: sqlite3.Cursor, file_paths: Iterable[str],
+                     quarantined: dict[str, QuarantineRecord]) -> Iterator[str]:
+    """
+    Yields the files that are not quarantined, or have changed since they were.
+    Changed files are released from the quarantine. A quarantined file that cannot be checked, for instance because
+    it was removed since it was found, is yielded as well, so that reading it fails and is recorded.
+    """
+    for file_path in file_paths:
+        record = quarantined.get(file_path)
+        if record is not None:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                yield file_path
+                continue
+            if record.size == stat.st_size and record.mtime == stat.st_mtime_ns:
+                continue
+            cur.execute("DELETE FROM " + quarantine_table.name + " WHERE path = ?", (file_path,))
+        yield file_path
@@ -0,0 +1,55 @@
+"""
+This script contains the selection of the protein files of a shard, so that a full rebuild can be split
+between several machines, each writing its own self-contained database (see merge.py).
+Files are assigned to shards from their name alone, which is the entry ID of the protein.
+
+A shard is given by one of:
+hash:K/N -- the K-th of N shards (counting from 0), by a hash of the entry ID that is the same on every machine
+dirs:FIRST-LAST -- the PDB directories from FIRST to LAST (e.g. "dirs:00-4z"), named after the two middle
+                   characters of the entry ID
+dirs:A,B,... -- the listed PDB directories (e.g. "dirs:a0,a1")
+"""
+
+import os
+import zlib
+from typing import Callable, Iterable, Iterator
+
+def entry_id_of(file_path: str) -> str:
+    return os.path.basename(file_path).split(".")[0].upper()
+
+def directory_of(entry_id: str) -> str:
+    """
+    Returns the directory of an entry in the PDB mirror, i.e. the two middle characters of its ID.
+    """
+    return entry_id[1:3].lower()
+
+def hash_shard(entry_id: str, count: int) -> int:
+    # crc32 rather than hash(), which is salted differently in every process
+    return zlib.crc32(entry_id.encode()) % count
+
+def parse_shard(spec: str) -> Callable[[str], bool]:
+    """
+    Returns whether an entry ID belongs to the shard given by spec (see the formats above).
+    """
+    kind, _, value = spec.partition(":")
+    if kind == "hash":
+        index, _, count = value.partition("/")
+        if not index.isdigit() or not count.isdigit() or not 0 <= int(index) < int(count):
+            raise ValueError("Hash shards need to be given as hash:K/N with 0 <= K < N, not " + spec)
+        return lambda entry_id: hash_shard(entry_id, int(count)) == int(index)
+    if kind == "dirs" and value:
+        if "-" in value:
+            first, _, last = value.lower().partition("-")
+            return lambda entry_id: first <= directory_of(entry_id) <= last
+        directories = set(value.lower().split(","))
+        return lambda entry_id: directory_of(entry_id) in directories
+    raise ValueError("Shards need to be given as hash:K/N or dirs:FIRST-LAST or dirs:A,B,..., not " + spec)
+
+def shard_files(file_paths: Iterable[str], spec: str) -> Iterator[str]:
+    """
+    Yields the paths of the protein files that belong to the shard given by spec.
+    """
+    in_shard = parse_shard(spec)
+    for file_path in file_paths:
+        if in_shard(entry_id_of(file_path)):
+            yield file_path
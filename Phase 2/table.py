@@ -6,12 +6,35 @@ from polymer_sequence import PolymerSequence
 
 AttributeTypes = TypeVarTuple('AttributeTypes')
 
+# Inputs an extractor can depend on, of which only those needed by the extracted tables are built (see ingest.parse_file)
+document = "document" # cif Document of the file, which every other input is built from
+sequence = "sequence" # PolymerSequence of the document
+model = "model" # gemmi Structure without coordinates (header, cell, entities, helices and sheets), built from the
+                # document after removing its _atom_site category
+coordinates = "coordinates" # gemmi Structure with its models, chains, residues and atoms
+all_inputs = frozenset((document, sequence, model, coordinates))
+# categories.CategorySequence, given in place of the PolymerSequence, which also indexes the chains and observed
+# residues from the document, for the extractors of categories.py that stand in for the coordinates
+residues = "residues"
+# Categories of the document read for every entry (its ID and revision date) and for the PolymerSequence, when only
+# the categories the extractors read are parsed (see Table.categories)
+entry_categories = frozenset(("_entry", "_pdbx_audit_revision_history"))
+sequence_categories = frozenset(("_pdbx_poly_seq_scheme",))
+
 class Table(Generic[*AttributeTypes]):
     def __init__(self, name: str, attributes: Attributes[*AttributeTypes],
-                 extractor: Callable[[gemmi.Structure, cif.Document, PolymerSequence], list[tuple[*AttributeTypes]]]):
+                 extractor: Callable[[gemmi.Structure, cif.Document, PolymerSequence], list[tuple[*AttributeTypes]]],
+                 inputs: frozenset[str] = all_inputs, categories: frozenset[str] | None = None):
         self.name = name
         self.attributes = attributes
         self.extractor = extractor
+        # Inputs the extractor reads, the others being given as None, except for the structure: without model or
+        # coordinates, it is replaced by one with only the name and entry ID (see cif_file.header_structure)
+        self.inputs = inputs
+        # Categories of the document the extractor reads, if it reads neither the model nor the coordinates, so that
+        # only those are parsed when no other extracted table needs more (see cif_file.select_categories).
+        # None if it reads others or the whole document
+        self.categories = categories
 
     def attributes_string(self) -> str:
         return f"({', '.join(self.attributes.attribute_names)})"
@@ -19,6 +42,13 @@ class Table(Generic[*AttributeTypes]):
     def create_table(self) -> str:
         return f"CREATE TABLE IF NOT EXISTS {self.name} {str(self.attributes)}"
     
+    def create_indexes(self) -> list[str]:
+        return [f"CREATE INDEX IF NOT EXISTS {self.index_name(index)} ON {self.name} ({', '.join(index)})"
+                for index in self.attributes.indexes]
+
+    def index_name(self, index: list[str]) -> str:
+        return f"{self.name}_{'_'.join(index)}"
+    
     def retrieve(self, columns=("*",)) -> str:
         return f"SELECT {', '.join(columns)} FROM {self.name}"
     
@@ -29,6 +59,10 @@ class Table(Generic[*AttributeTypes]):
         args = ', '.join(['?' for i in range(len(data))])
         return f"INSERT INTO {self.name} VALUES({args})"
     
+    def delete_entry(self) -> str:
+        # The first attribute of every table is its entry ID
+        return f"DELETE FROM {self.name} WHERE {self.attributes.attribute_names[0]} = ?"
+    
     def update_row(self, data: dict, primary_key_values):
         return f"UPDATE {self.name} SET {self.attributes.match_columns(data,', ')}\
             WHERE {self.attributes.match_primary_keys(primary_key_values)}"
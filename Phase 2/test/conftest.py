@@ -276,6 +276,7 @@ def mock_table():
     mock_table.name = "main"
     mock_table.extract_data.return_value = [test_data]
     mock_table.insert_row.return_value = test_statement 
+    mock_table.delete_entry.return_value = "DELETE FROM main WHERE entry_id = ?"
 
     return mock_table
 
@@ -290,6 +291,7 @@ def mock_coil_table():
     mock_table.name = "coils"
     mock_table.extract_data.return_value = [test_data_1, test_data_2]
     mock_table.insert_row.return_value = test_statement 
+    mock_table.delete_entry.return_value = "DELETE FROM coils WHERE entry_id = ?"
 
     return mock_table
 
@@ -0,0 +1,43 @@
+"""
+This script contains integration tests for validating data extracted at once by extract.insert_into_all_tables
+against data extracted by the extract method of every table.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/integration/test_something.py"
+To run all tests in the test directory, use the command "pytest test/"
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+
+import pytest
+import os
+import functools
+import glob
+
+import ingest
+
+entry_ids = [
+    '146D','178D','1A0A','1A0C','1A0F','1A0Q','1A1C','1A3I','1JKD','1LZH','1MM4','1PP3',
+    '1TGU','1XDF','2G9P','2HUM','3DSE','3IRL','3U7T','3UF8','4F5S','4W2P','5QB9','5SON',
+    '5U5C','5YII','6C6W','6FFL','6I06','6J4B','7A16','7H4H','7QTR','8E17','8FP7','8UHO','9B7F'
+]
+
+table_names = ["main", "experimental", "entities", "chains", "subchains", "helices", "sheets", "strands", "coils",
+               "secondary_structures"]
+
+@pytest.fixture(scope="module")
+def rootdir() -> str:
+    return "./database"  # Location of .cif files
+
+@functools.cache
+def extract_entry(rootdir: str, entry_id: str) -> tuple[ingest.EntryResult, ingest.EntryResult]:
+    """Extract the rows of a given entry id one table at a time and all at once, once per entry."""
+    path = os.path.join(rootdir, f'*{entry_id.lower()}*')
+    file_path = glob.glob(path)[0]
+    return ingest.extract_file(file_path), ingest.extract_file(file_path, fused=True)
+
+@pytest.mark.parametrize("table_name", table_names)
+@pytest.mark.parametrize("entry_id", entry_ids)  # run test for each entry_id
+def test_same_rows(entry_id: str, table_name: str, rootdir: str):
+    per_table, fused = extract_entry(rootdir, entry_id)
+    assert fused.error == per_table.error
+    assert fused.rows.get(table_name, []) == per_table.rows.get(table_name, [])
@@ -6,6 +6,7 @@ from sqlite3 import Cursor
 
 from polymer_sequence import PolymerSequence, Monomer
 from extract import ComplexType
+import table
 from table import Table
 from attributes import Attributes
 
@@ -274,8 +275,11 @@ def mock_table():
 
     mock_table = MagicMock(spec=Table)
     mock_table.name = "main"
+    mock_table.inputs = table.all_inputs
+    mock_table.categories = None
     mock_table.extract_data.return_value = [test_data]
     mock_table.insert_row.return_value = test_statement 
+    mock_table.delete_entry.return_value = "DELETE FROM main WHERE entry_id = ?"
 
     return mock_table
 
@@ -288,8 +292,11 @@ def mock_coil_table():
 
     mock_table = MagicMock(spec=Table)
     mock_table.name = "coils"
+    mock_table.inputs = table.all_inputs
+    mock_table.categories = None
     mock_table.extract_data.return_value = [test_data_1, test_data_2]
     mock_table.insert_row.return_value = test_statement 
+    mock_table.delete_entry.return_value = "DELETE FROM coils WHERE entry_id = ?"
 
     return mock_table
 
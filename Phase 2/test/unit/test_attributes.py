@@ -76,6 +76,25 @@ def test_attributes_initialisation_invalid_foreign_keys():
     with pytest.raises(ValueError, match="Primary keys and foreign keys need to be a subset of attributes"):
         Attributes(test_attributes_pairs, test_primary_keys, test_foreign_keys)
 
+def test_attributes_initialisation_indexes():
+    test_attributes_pairs = [("id", "VARCHAR"), ("a", "FLOAT"), ("b", "INT")]
+    test_indexes = [["a"], ["id", "b"]]
+
+    test_attributes = Attributes(test_attributes_pairs, ["id"], indexes=test_indexes)
+    assert test_attributes.indexes == test_indexes
+    assert Attributes(test_attributes_pairs).indexes == []
+
+@pytest.mark.parametrize("test_indexes", [[["invalid_key"]], [["id", "invalid_key"]], [[]]])
+def test_attributes_initialisation_invalid_indexes(test_indexes):
+    """
+    Test that a ValueError is raised when an index is empty
+    or its columns are not a subset of attributes.
+    """
+    test_attributes_pairs = [("id", "VARCHAR"), ("a", "FLOAT")]
+
+    with pytest.raises(ValueError, match="Indexed columns need to be a non-empty subset of attributes"):
+        Attributes(test_attributes_pairs, ["id"], indexes=test_indexes)
+
 
 def test_attributes_string(test_attributes):
     expected = "(id VARCHAR, a FLOAT, PRIMARY KEY (id, a), FOREIGN KEY (id) REFERENCES\
@@ -0,0 +1,84 @@
+"""
+This script contains unit tests for testing methods in bulk_load.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+from unittest.mock import MagicMock
+import sqlite3
+
+import bulk_load
+from table import Table
+from attributes import Attributes
+
+TEST_INDEX = "CREATE INDEX coils_chain ON coils (chain_id)"
+
+
+@pytest.fixture
+def test_database(tmp_path):
+    con = sqlite3.connect(tmp_path / "test.db")
+    yield con
+    con.close()
+
+
+def pragma(con: sqlite3.Connection, name: str):
+    return con.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_begin_bulk_load_new_database(test_database):
+    index_statements = bulk_load.begin_bulk_load(test_database.cursor())
+
+    assert index_statements == []
+    assert pragma(test_database, "page_size") == bulk_load.page_size
+    assert pragma(test_database, "journal_mode") == "wal"
+    assert pragma(test_database, "synchronous") == 0
+    assert pragma(test_database, "cache_size") == bulk_load.bulk_pragmas["cache_size"]
+
+
+def test_begin_bulk_load_drops_indexes(test_database):
+    test_database.execute("CREATE TABLE coils (entry_id VARCHAR, chain_id VARCHAR, PRIMARY KEY (entry_id, chain_id))")
+    test_database.execute(TEST_INDEX)
+    default_page_size = pragma(test_database, "page_size")
+
+    index_statements = bulk_load.begin_bulk_load(test_database.cursor())
+
+    assert index_statements == [TEST_INDEX]
+    # the page size of an existing database is left as it is
+    assert pragma(test_database, "page_size") == default_page_size
+    # the index of the primary key is kept
+    assert bulk_load.secondary_indexes(test_database.cursor()) == []
+    assert test_database.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone() == (1,)
+
+
+def test_end_bulk_load(test_database):
+    test_database.execute("CREATE TABLE coils (entry_id VARCHAR, chain_id VARCHAR, PRIMARY KEY (entry_id, chain_id))")
+    bulk_load.begin_bulk_load(test_database.cursor())
+    test_database.execute("INSERT INTO coils VALUES('1A00', 'A')")
+
+    bulk_load.end_bulk_load(test_database, [TEST_INDEX])
+
+    assert bulk_load.secondary_indexes(test_database.cursor()) == [("coils_chain", TEST_INDEX)]
+    assert test_database.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+    assert pragma(test_database, "journal_mode") == "delete"
+    assert pragma(test_database, "synchronous") == 2
+    assert test_database.in_transaction is False
+
+
+def test_sort_rows():
+    attributes = Attributes([("entry_id", "VARCHAR"), ("title", "VARCHAR"), ("helix_id", "INT")],
+                            primary_keys=["entry_id", "helix_id"])
+    test_table = Table("helices", attributes, MagicMock())
+    rows = [("1A01", "a", 1), ("1A00", "b", 2), ("1A00", "c", None), ("1A00", "d", 1)]
+
+    assert bulk_load.sort_rows(test_table, rows) == [("1A00", "c", None), ("1A00", "d", 1), ("1A00", "b", 2), ("1A01", "a", 1)]
+
+
+def test_sort_rows_incomparable_values():
+    attributes = Attributes([("entry_id", "VARCHAR"), ("helix_id", "INT")], primary_keys=["entry_id", "helix_id"])
+    test_table = Table("helices", attributes, MagicMock())
+    rows = [("1A00", "2"), ("1A00", 1)]
+
+    assert bulk_load.sort_rows(test_table, rows) == rows
@@ -0,0 +1,198 @@
+"""
+This script contains unit tests for testing methods in categories.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import gemmi
+from gemmi import cif
+
+import categories
+import cif_file
+import extract
+import ingest
+from categories import CategorySequence, Residue
+from polymer_sequence import PolymerSequence
+
+# Chain A has five residues, of which the first and fourth were not observed, and the third has an insertion code
+TEST_CONTENT = ("data_1A00\n"
+                "_entry.id 1A00\n"
+                "_struct.title 'Test entry'\n"
+                "_pdbx_audit_revision_history.revision_date 2000-12-31\n"
+                "loop_\n"
+                "_entity.id\n"
+                "_entity.type\n"
+                "_entity.pdbx_description\n"
+                "1 polymer 'Test protein'\n"
+                "2 water water\n"
+                "_entity_poly.entity_id 1\n"
+                "_entity_poly.type 'polypeptide(L)'\n"
+                "loop_\n"
+                "_struct_asym.id\n"
+                "_struct_asym.entity_id\n"
+                "A 1\n"
+                "B 2\n"
+                "loop_\n"
+                "_pdbx_poly_seq_scheme.asym_id\n"
+                "_pdbx_poly_seq_scheme.entity_id\n"
+                "_pdbx_poly_seq_scheme.seq_id\n"
+                "_pdbx_poly_seq_scheme.mon_id\n"
+                "_pdbx_poly_seq_scheme.pdb_seq_num\n"
+                "_pdbx_poly_seq_scheme.pdb_mon_id\n"
+                "_pdbx_poly_seq_scheme.pdb_strand_id\n"
+                "_pdbx_poly_seq_scheme.pdb_ins_code\n"
+                "_pdbx_poly_seq_scheme.hetero\n"
+                "A 1 1 MET 10 ? A . n\n"
+                "A 1 2 ALA 11 ALA A . n\n"
+                "A 1 3 MSE 12 MSE A A n\n"
+                "A 1 4 GLY 13 ? A . n\n"
+                "A 1 5 LYS 14 LYS A . n\n"
+                "_pdbx_nonpoly_scheme.asym_id B\n"
+                "_pdbx_nonpoly_scheme.entity_id 2\n"
+                "_pdbx_nonpoly_scheme.mon_id HOH\n"
+                "_pdbx_nonpoly_scheme.pdb_seq_num 101\n"
+                "_pdbx_nonpoly_scheme.pdb_strand_id A\n"
+                "_struct_sheet.id S1\n"
+                "_struct_sheet.number_strands 1\n"
+                "_struct_sheet_range.sheet_id S1\n"
+                "_struct_sheet_range.id 1\n"
+                "_struct_sheet_range.beg_label_comp_id ALA\n"
+                "_struct_sheet_range.beg_label_asym_id A\n"
+                "_struct_sheet_range.beg_label_seq_id 2\n"
+                "_struct_sheet_range.pdbx_beg_PDB_ins_code ?\n"
+                "_struct_sheet_range.end_label_comp_id MSE\n"
+                "_struct_sheet_range.end_label_asym_id A\n"
+                "_struct_sheet_range.end_label_seq_id 3\n"
+                "_struct_sheet_range.pdbx_end_PDB_ins_code A\n"
+                "_struct_sheet_range.beg_auth_comp_id ALA\n"
+                "_struct_sheet_range.beg_auth_asym_id A\n"
+                "_struct_sheet_range.beg_auth_seq_id 11\n"
+                "_struct_sheet_range.end_auth_comp_id MSE\n"
+                "_struct_sheet_range.end_auth_asym_id A\n"
+                "_struct_sheet_range.end_auth_seq_id 12\n"
+                "loop_\n"
+                "_atom_site.group_PDB\n"
+                "_atom_site.id\n"
+                "_atom_site.type_symbol\n"
+                "_atom_site.label_atom_id\n"
+                "_atom_site.label_alt_id\n"
+                "_atom_site.label_comp_id\n"
+                "_atom_site.label_asym_id\n"
+                "_atom_site.label_entity_id\n"
+                "_atom_site.label_seq_id\n"
+                "_atom_site.pdbx_PDB_ins_code\n"
+                "_atom_site.Cartn_x\n"
+                "_atom_site.Cartn_y\n"
+                "_atom_site.Cartn_z\n"
+                "_atom_site.occupancy\n"
+                "_atom_site.B_iso_or_equiv\n"
+                "_atom_site.auth_seq_id\n"
+                "_atom_site.auth_asym_id\n"
+                "_atom_site.pdbx_PDB_model_num\n"
+                "ATOM 1 N N . ALA A 1 2 ? 6.4 0.0 0.0 1.0 20.0 11 A 1\n"
+                "ATOM 2 C CA . ALA A 1 2 ? 7.6 0.0 0.0 1.0 20.0 11 A 1\n"
+                "ATOM 3 C C . ALA A 1 2 ? 8.8 0.0 0.0 1.0 20.0 11 A 1\n"
+                "HETATM 4 N N . MSE A 1 3 A 10.2 0.0 0.0 1.0 20.0 12 A 1\n"
+                "HETATM 5 C CA . MSE A 1 3 A 11.4 0.0 0.0 1.0 20.0 12 A 1\n"
+                "HETATM 6 C C . MSE A 1 3 A 12.6 0.0 0.0 1.0 20.0 12 A 1\n"
+                "ATOM 7 N N . LYS A 1 5 ? 17.8 0.0 0.0 1.0 20.0 14 A 1\n"
+                "ATOM 8 C CA . LYS A 1 5 ? 19.0 0.0 0.0 1.0 20.0 14 A 1\n"
+                "ATOM 9 C C . LYS A 1 5 ? 20.2 0.0 0.0 1.0 20.0 14 A 1\n"
+                "HETATM 10 O O . HOH B 2 . ? 30.0 0.0 0.0 1.0 20.0 101 A 1\n"
+                "#\n")
+
+
+@pytest.fixture
+def test_doc():
+    return cif_file.parse_document(TEST_CONTENT.encode())
+
+
+def test_category_sequence(test_doc):
+    sequence = CategorySequence(test_doc)
+
+    assert sequence.chains == {"A": ["A", "B"]}
+    assert sequence.parent_chains == {"A": "A", "B": "A"}
+    assert sequence.get_polymer("A") == [Residue(2, "ALA", 11, " "), Residue(3, "MSE", 12, "A"),
+                                         Residue(5, "LYS", 14, " ")]
+    assert sequence.get_subchain("B") == []
+    assert sequence.get_polymer("Z") == []
+    # The sequence itself is the same as that of PolymerSequence
+    assert sequence.get_chain_sequence("A") == PolymerSequence(test_doc).get_chain_sequence("A")
+
+
+def test_category_sequence_microheterogeneity(test_doc):
+    """
+    Test that only the first residue of a microheterogeneity is kept, like gemmi.ResidueSpan.first_conformer.
+    """
+    doc = cif_file.parse_document(TEST_CONTENT.replace("A 1 5 LYS 14 LYS A . n\n",
+                                                       "A 1 5 LYS 14 LYS A . y\nA 1 5 ARG 14 ARG A . y\n").encode())
+
+    assert CategorySequence(doc).get_polymer("A")[-1] == Residue(5, "LYS", 14, " ")
+
+
+def test_locate(test_doc):
+    sequence = CategorySequence(test_doc)
+
+    assert sequence.locate(gemmi.AtomAddress("A", gemmi.SeqId(12, "A"), "MSE", "CA")) == ("A", 3)
+    with pytest.raises(KeyError):
+        sequence.locate(gemmi.AtomAddress("A", gemmi.SeqId(10, " "), "MET", "CA"))
+
+
+def test_make_one_letter_sequence():
+    residues = [Residue(2, "ALA", 11, " "), Residue(3, "MSE", 12, "A"), Residue(5, "LYS", 14, " "),
+                Residue(6, "UNL", 15, " ")]
+
+    assert categories.make_one_letter_sequence(residues) == "Am-KX"
+    assert categories.make_one_letter_sequence([]) == ""
+
+
+@pytest.mark.parametrize("extractor", ["insert_into_main_table", "insert_into_chain_table",
+                                       "insert_into_subchain_table"])
+def test_same_rows_as_extract(test_doc, extractor):
+    """
+    Test that the rows extracted from the categories are the same as those extracted from the coordinates.
+    """
+    struct = cif_file.parse_structure(TEST_CONTENT.encode())
+    expected = getattr(extract, extractor)(struct, test_doc, PolymerSequence(test_doc))
+
+    doc = cif_file.parse_document(cif_file.without_atoms(TEST_CONTENT.encode()))
+    result = getattr(categories, extractor)(cif_file.model_structure(doc), doc, CategorySequence(doc))
+
+    assert result == expected
+
+
+# The water of chain A is only listed in _struct_asym, as in files without _pdbx_nonpoly_scheme
+NO_NONPOLY_CONTENT = TEST_CONTENT.replace("_pdbx_nonpoly_scheme.asym_id B\n"
+                                          "_pdbx_nonpoly_scheme.entity_id 2\n"
+                                          "_pdbx_nonpoly_scheme.mon_id HOH\n"
+                                          "_pdbx_nonpoly_scheme.pdb_seq_num 101\n"
+                                          "_pdbx_nonpoly_scheme.pdb_strand_id A\n", "")
+
+
+def test_category_sequence_missing_scheme():
+    """
+    Test that a subchain missing from the scheme categories raises an error, instead of being left out of its chain.
+    """
+    doc = cif_file.parse_document(NO_NONPOLY_CONTENT.encode())
+
+    with pytest.raises(categories.MissingSchemeError, match="1 subchains are not in the scheme categories: B"):
+        CategorySequence(doc)
+
+
+def test_extract_file_missing_scheme(tmp_path):
+    """
+    Test that a file whose scheme categories miss a subchain is extracted from the coordinates, giving the same rows.
+    """
+    path = tmp_path / "1a00.cif"
+    path.write_text(NO_NONPOLY_CONTENT)
+    tables = ("main", "chains", "subchains")
+
+    from_categories = ingest.extract_file(str(path), tables=tables, from_categories=True)
+    from_coordinates = ingest.extract_file(str(path), tables=tables)
+
+    assert from_categories.error is None
+    assert from_categories.rows == from_coordinates.rows
+    assert from_categories.rows["chains"][0][2] == "A B"
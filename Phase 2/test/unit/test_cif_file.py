@@ -0,0 +1,207 @@
+"""
+This script contains unit tests for testing methods in cif_file.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import gzip
+import pytest
+from unittest.mock import patch
+
+import cif_file
+from gemmi import cif
+
+TEST_CONTENT = ("data_1A00\n"
+                "_entry.id 1A00\n"
+                "loop_\n"
+                "_atom_site.group_PDB\n"
+                "_atom_site.id\n"
+                "_atom_site.type_symbol\n"
+                "_atom_site.label_atom_id\n"
+                "_atom_site.label_comp_id\n"
+                "_atom_site.label_asym_id\n"
+                "_atom_site.label_entity_id\n"
+                "_atom_site.label_seq_id\n"
+                "_atom_site.Cartn_x\n"
+                "_atom_site.Cartn_y\n"
+                "_atom_site.Cartn_z\n"
+                "_atom_site.auth_seq_id\n"
+                "_atom_site.auth_asym_id\n"
+                "_atom_site.pdbx_PDB_model_num\n"
+                "ATOM 1 N N GLY A 1 1 1.0 2.0 3.0 1 A 1\n"
+                "ATOM 2 C CA GLY A 1 1 2.0 2.0 3.0 1 A 1\n")
+
+
+@pytest.fixture
+def test_files(tmp_path):
+    plain_path = tmp_path / "1a00.cif"
+    plain_path.write_text(TEST_CONTENT)
+    compressed_path = tmp_path / "1a00.cif.gz"
+    with gzip.open(compressed_path, "wt") as file:
+        file.write(TEST_CONTENT)
+    return str(plain_path), str(compressed_path)
+
+
+def test_read_bytes(test_files):
+    for file_path in test_files:
+        assert cif_file.read_bytes(file_path) == TEST_CONTENT.encode()
+
+
+def test_open_file(test_files):
+    for file_path in test_files:
+        with cif_file.open_file(file_path) as file:
+            assert file.read() == TEST_CONTENT.encode()
+
+
+def test_read_structure_compressed(test_files):
+    """
+    Test that a gzipped file is read into the same Structure as the plain file.
+    """
+    plain_struct = cif_file.read_structure(test_files[0])
+    struct = cif_file.read_structure(test_files[1])
+
+    assert struct.name == plain_struct.name == "1A00"
+    assert struct.info["_entry.id"] == "1A00"
+    assert struct.make_mmcif_document().as_string() == plain_struct.make_mmcif_document().as_string()
+
+
+@patch("gemmi.read_structure")
+def test_read_structure_compressed_save_doc(mock_gemmi_read, test_files):
+    """
+    Test that a gzipped file is decompressed in memory and fills save_doc from the same parse.
+    """
+    doc = cif.Document()
+    struct = cif_file.read_structure(test_files[1], save_doc=doc)
+
+    mock_gemmi_read.assert_not_called()
+    assert struct.name == "1A00"
+    assert doc.as_string() == cif_file.read_document(test_files[0]).as_string()
+
+
+def test_read_document_compressed(test_files):
+    assert cif_file.read_document(test_files[1]).as_string() == cif_file.read_document(test_files[0]).as_string()
+
+
+def test_read_structure_corrupt(tmp_path):
+    file_path = tmp_path / "1a00.cif.gz"
+    file_path.write_bytes(gzip.compress(TEST_CONTENT.encode())[:-20])
+
+    with pytest.raises(Exception):
+        cif_file.read_structure(str(file_path))
+
+
+def test_decompress(test_files):
+    for file_path in test_files:
+        with open(file_path, "rb") as file:
+            assert cif_file.decompress(file_path, file.read()) == TEST_CONTENT.encode()
+
+
+def test_parse_structure(test_files):
+    """
+    Test that parsing the content of a file gives the same Structure and Document as reading the file.
+    """
+    doc = cif.Document()
+    struct = cif_file.parse_structure(TEST_CONTENT.encode(), save_doc=doc)
+    plain_struct = cif_file.read_structure(test_files[0])
+
+    assert struct.name == plain_struct.name
+    assert struct.make_mmcif_document().as_string() == plain_struct.make_mmcif_document().as_string()
+    assert doc.as_string() == cif_file.parse_document(TEST_CONTENT.encode()).as_string()
+
+
+def test_header_structure():
+    doc = cif_file.parse_document(TEST_CONTENT.encode())
+    struct = cif_file.header_structure(doc)
+    plain_struct = cif_file.parse_structure(TEST_CONTENT.encode())
+
+    assert struct.name == plain_struct.name
+    assert struct.info["_entry.id"] == plain_struct.info["_entry.id"]
+    assert len(struct) == 0
+
+
+def test_model_structure():
+    doc = cif_file.parse_document(TEST_CONTENT.encode())
+    struct = cif_file.model_structure(doc)
+    plain_struct = cif_file.parse_structure(TEST_CONTENT.encode())
+
+    assert struct.name == plain_struct.name
+    assert struct.info["_entry.id"] == plain_struct.info["_entry.id"]
+    assert len(struct) == 0
+    assert doc.sole_block().find_value("_atom_site.id") is None
+
+
+def test_without_atoms():
+    content = TEST_CONTENT + "#\n_struct.title 'After the atoms'\n"
+    doc = cif_file.parse_document(cif_file.without_atoms(content.encode()))
+    expected = cif_file.parse_document(content.encode())
+    expected.sole_block().find_mmcif_category("_atom_site.").erase()
+
+    assert doc.as_string() == expected.as_string()
+    assert doc.sole_block().find_value("_struct.title") == "'After the atoms'"
+
+
+def test_without_atoms_single_atom():
+    """
+    Test that the atoms are also cut out when there is a single one, written as tag-value pairs.
+    """
+    content = ("data_1A00\n_entry.id 1A00\n#\n_atom_site.group_PDB ATOM\n_atom_site.id 1\n#\n"
+               "_struct.title 'After the atoms'\n")
+
+    assert cif_file.without_atoms(content.encode()) == \
+        b"data_1A00\n_entry.id 1A00\n#\n#\n_struct.title 'After the atoms'\n"
+    assert cif_file.without_atoms(b"data_1A00\n_entry.id 1A00\n") == b"data_1A00\n_entry.id 1A00\n"
+
+
+SELECT_CONTENT = ("data_1A00\n"
+                  "#\n"
+                  "_entry.id 1A00\n"
+                  "#\n"
+                  "loop_\n"
+                  "_entity.id\n"
+                  "_entity.pdbx_description\n"
+                  "1 'Test protein'\n"
+                  "2\n"
+                  ";_not a tag\n"
+                  "loop_\n"
+                  ";\n"
+                  "#\n"
+                  "_struct.title\n"
+                  ";Text field\n"
+                  "_with a line like a tag\n"
+                  ";\n"
+                  "#\n"
+                  "_exptl_crystal_grow.method 'VAPOR DIFFUSION'\n"
+                  "_exptl_crystal_grow.pH 7.5\n") + TEST_CONTENT[len("data_1A00\n_entry.id 1A00\n"):] + \
+                 ("#\n"
+                  "_struct_keywords.text\n"
+                  "'After the atoms'\n")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64, 1 << 20])
+@pytest.mark.parametrize("categories", [["_entity", "_struct_keywords"], ["_struct.", "_exptl_crystal_grow"],
+                                        ["_entry", "_atom_site"], []])
+def test_select_categories(categories, chunk_size):
+    """
+    Test that only the given categories are parsed, with the same values as when parsing the whole content,
+    wherever the content is split into chunks.
+    """
+    content = SELECT_CONTENT.encode()
+    chunks = [content[start:start + chunk_size] for start in range(0, len(content), chunk_size)]
+    block = cif_file.parse_document(cif_file.select_categories(chunks, categories)).sole_block()
+    full_block = cif_file.parse_document(content).sole_block()
+    names = [category.rstrip(".") + "." for category in categories]
+
+    assert block.name == "1A00"
+    assert sorted(block.get_mmcif_category_names()) == sorted(names)
+    for name in names:
+        assert block.get_mmcif_category(name) == full_block.get_mmcif_category(name)
+
+
+def test_read_categories(test_files):
+    for file_path in test_files:
+        block = cif_file.read_categories(file_path, ["_entry"]).sole_block()
+
+        assert block.get_mmcif_category_names() == ["_entry."]
+        assert block.find_value("_entry.id") == "1A00"
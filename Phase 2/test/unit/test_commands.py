@@ -8,10 +8,18 @@ Output verbosity can be adjusted by using the relevant flags in the command (e.g
 """
 import pytest
 from unittest.mock import patch, call, MagicMock
+import sqlite3
 import gemmi
 
 import table
 import commands 
+from attributes import Attributes
+import manifest
+from manifest import FileState
+import journal
+from journal import JournalRecord
+import failures
+from failures import Failure
 
 TEST_FILE_PATH = "test_path/file.cif"
 TEST_DATA = ('1A00', 'data1', 'data2')
@@ -40,6 +48,21 @@ def test_init_database(mock_cursor):
         assert mock_cursor.execute.call_count == 2
 
 
+def test_init_database_indexes():
+    """
+    Test that the secondary indexes of every table are created, unless create_indexes is False.
+    """
+    expected = sorted(statement.split()[5] for statement in commands.index_statements())
+    for create_indexes in (True, False):
+        con = sqlite3.connect(":memory:")
+        commands.init_database(con.cursor(), create_indexes)
+        indexes = con.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+        con.close()
+
+        assert sorted(name for name, in indexes) == (expected if create_indexes else [])
+    assert "coils_entry_id_chain_id" in expected
+
+
 def test_init_database_empty_table_schemas(mock_cursor):
     """
     Test that the execute method is not called when table_schemas
@@ -65,9 +88,10 @@ def test_init_database_missing_create_table_method(mock_cursor, mock_table):
 
 
 @patch("commands.insert_file")
+@patch("commands.entry_action")
 @patch("gemmi.cif.read")
 @patch("commands.PolymerSequence")
-def test_check_file_entry_not_in_main_table(mock_polymer_seq, mock_cif_read, mock_insert_file, mock_structure, mock_cursor, capsys):
+def test_check_file_entry_not_in_main_table(mock_polymer_seq, mock_cif_read, mock_entry_action, mock_insert_file, mock_structure, mock_cursor, capsys):
     """
     Test that data is inserted into the table when the entry is not found in the main table. 
     """
@@ -78,7 +102,7 @@ def test_check_file_entry_not_in_main_table(mock_polymer_seq, mock_cif_read, moc
         mock_polymer_seq.return_value = mock_sequence
 
         # no row in the main table with the entry ID 
-        mock_cursor.execute.return_value.fetchone.return_value = None
+        mock_entry_action.return_value = "insert"
 
         commands.check_file(mock_cursor, TEST_FILE_PATH)
         captured = capsys.readouterr().out 
@@ -87,16 +111,28 @@ def test_check_file_entry_not_in_main_table(mock_polymer_seq, mock_cif_read, moc
         assert "Checking " + TEST_FILE_PATH in captured 
         assert "Adding " + TEST_FILE_PATH in captured
         
-        # check that cursor methods were called 
-        expected_calls = [call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
-                            call.execute().fetchone()]
-                            #call.execute(TEST_STATEMENT, TEST_DATA)]
-        mock_cursor.assert_has_calls(expected_calls)  
+        # check that the entry was looked up in the database
+        mock_entry_action.assert_called_once_with(mock_cursor, '1A00', mock_doc.sole_block().find_value(),
+                                                  entry_states=None)
         
         # check that insert_file was called 
         mock_insert_file.assert_called_once_with(mock_cursor, mock_structure, mock_doc, mock_sequence)
         
 
+@patch("commands.check_file")
+@patch("commands.EntryStates")
+def test_check_files(mock_entry_states, mock_check_file, mock_cursor):
+    """
+    Test that the states of the entries are loaded once for all the files, and given to check_file.
+    """
+    commands.check_files(mock_cursor, ["1a00.cif", "1a01.cif"], verbose=False)
+
+    mock_entry_states.load.assert_called_once_with(mock_cursor)
+    entry_states = mock_entry_states.load.return_value
+    assert mock_check_file.call_args_list == [call(mock_cursor, "1a00.cif", False, False, entry_states),
+                                              call(mock_cursor, "1a01.cif", False, False, entry_states)]
+
+
 #@pytest.mark.xfail(reason="unable to access struct variable")
 @patch("gemmi.read_structure")
 def test_check_file_gemmi_read_failure(mock_gemmi_read, mock_cursor, capsys):
@@ -113,6 +149,27 @@ def test_check_file_gemmi_read_failure(mock_gemmi_read, mock_cursor, capsys):
     assert "Error reading structure" in captured.out
 
 
+@patch("commands.insert_file")
+@patch("commands.get_revision_date")
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+def test_check_file_single_parse(mock_polymer_seq, mock_cif_read, mock_revision_date, mock_insert_file, mock_structure, mock_cursor):
+    """
+    Test that the file is only read once by gemmi, which fills the cif Document
+    used for the polymer sequence.
+    """
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure) as mock_read_structure, \
+         patch('commands.entry_action', return_value="insert"):
+        commands.check_file(mock_cursor, TEST_FILE_PATH, verbose=False, single_parse=True)
+
+        mock_cif_read.assert_not_called()
+        mock_read_structure.assert_called_once()
+        doc = mock_read_structure.call_args.kwargs["save_doc"]
+        assert isinstance(doc, gemmi.cif.Document)
+        mock_polymer_seq.assert_called_once_with(doc)
+        mock_insert_file.assert_called_once_with(mock_cursor, mock_structure, doc, mock_polymer_seq.return_value)
+
+
 @patch("gemmi.cif.read")
 @patch("commands.PolymerSequence")
 def test_check_file_cif_read_failure(mock_polymer_seq, mock_cif_read, mock_structure, mock_cursor, capsys):
@@ -133,9 +190,10 @@ def test_check_file_cif_read_failure(mock_polymer_seq, mock_cif_read, mock_struc
 
 
 @patch("commands.update_file")
+@patch("commands.entry_action")
 @patch("gemmi.cif.read")
 @patch("commands.PolymerSequence")
-def test_check_file_entry_exists_needs_revision(mock_polymer_seq, mock_cif_read, mock_update_file, mock_structure, mock_table_schemas, mock_cursor, capsys):
+def test_check_file_entry_exists_needs_revision(mock_polymer_seq, mock_cif_read, mock_entry_action, mock_update_file, mock_structure, mock_table_schemas, mock_cursor, capsys):
     """
     Test that data is not inserted into the table when the entry 
     already exists in the main table and is revised when it is not up to date.
@@ -149,20 +207,11 @@ def test_check_file_entry_exists_needs_revision(mock_polymer_seq, mock_cif_read,
         mock_polymer_seq.return_value = mock_sequence
 
         # row in the main table with such entry ID exists, and is not up to date 
-        mock_cursor.execute.return_value.fetchone.side_effect = [
-            ('1A00', ),
-            ("2000-12-01", )
-        ]
+        mock_entry_action.return_value = "update"
 
         with patch('commands.table_schemas', mock_table_schemas):
             commands.check_file(mock_cursor, TEST_FILE_PATH)
-            expected_calls = [
-                call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
-                call.execute().fetchone(),
-                call.execute("SELECT revision_date FROM main WHERE entry_id = '1A00'"),
-                call.execute().fetchone()
-            ]
-            mock_cursor.assert_has_calls(expected_calls)
+            mock_entry_action.assert_called_once_with(mock_cursor, '1A00', "2000-12-31", entry_states=None)
             captured = capsys.readouterr()
         
             # check that file name was printed
@@ -172,9 +221,12 @@ def test_check_file_entry_exists_needs_revision(mock_polymer_seq, mock_cif_read,
             mock_update_file.assert_called_once_with(mock_cursor, mock_structure, mock_doc, mock_sequence)
 
 
+@patch("commands.update_file")
+@patch("commands.insert_file")
+@patch("commands.entry_action")
 @patch("gemmi.cif.read")
 @patch("commands.PolymerSequence")
-def test_check_file_entry_exists_not_corrupted(mock_polymer_seq, mock_cif_read, mock_structure, mock_table_schemas, mock_cursor, capsys):
+def test_check_file_entry_exists_not_corrupted(mock_polymer_seq, mock_cif_read, mock_entry_action, mock_insert_file, mock_update_file, mock_structure, mock_table_schemas, mock_cursor, capsys):
     """
     Test that data is not updated when the entry already exists in the main table, 
     is up to date and not corrupted. 
@@ -189,33 +241,24 @@ def test_check_file_entry_exists_not_corrupted(mock_polymer_seq, mock_cif_read,
 
         # row in the main table with such entry ID exists, is up to date
         # and a row in the coils table with such entry ID exists 
-        mock_cursor.execute.return_value.fetchone.side_effect = [
-            ('1A00', ),
-            ("2000-12-31", ),
-            ('1A00', )
-        ]
+        mock_entry_action.return_value = None
 
         with patch('commands.table_schemas', mock_table_schemas):
             commands.check_file(mock_cursor, TEST_FILE_PATH)
-            expected_calls = [
-                call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
-                call.execute().fetchone(),
-                call.execute("SELECT revision_date FROM main WHERE entry_id = '1A00'"),
-                call.execute().fetchone(), 
-                call.execute("SELECT entry_id FROM coils WHERE entry_id = '1A00'"),
-                call.execute().fetchone()
-            ]
-            mock_cursor.assert_has_calls(expected_calls)
+            mock_entry_action.assert_called_once_with(mock_cursor, '1A00', "2000-12-31", entry_states=None)
             captured = capsys.readouterr()
         
             # check that file name was printed
             assert "Checking " + TEST_FILE_PATH in captured.out
+            mock_insert_file.assert_not_called()
+            mock_update_file.assert_not_called()
 
 
 @patch("commands.update_file")
+@patch("commands.entry_action")
 @patch("gemmi.cif.read")
 @patch("commands.PolymerSequence")
-def test_check_file_entry_exists_is_corrupted(mock_polymer_seq, mock_cif_read, mock_update_file, mock_structure, mock_table_schemas, mock_cursor, capsys):
+def test_check_file_entry_exists_is_corrupted(mock_polymer_seq, mock_cif_read, mock_entry_action, mock_update_file, mock_structure, mock_table_schemas, mock_cursor, capsys):
     """
     Test that data is updated when the entry already exists in the main table, 
     is up to date and corrupted. 
@@ -230,23 +273,11 @@ def test_check_file_entry_exists_is_corrupted(mock_polymer_seq, mock_cif_read, m
 
         # row in the main table with such entry ID exists, is up to date
         # but no row in the coils table with such entry ID exists 
-        mock_cursor.execute.return_value.fetchone.side_effect = [
-            ('1A00', ),
-            ("2000-12-31", ),
-            None
-        ]
+        mock_entry_action.return_value = "repair"
 
         with patch('commands.table_schemas', mock_table_schemas):
             commands.check_file(mock_cursor, TEST_FILE_PATH)
-            expected_calls = [
-                call.execute("SELECT entry_id FROM main WHERE entry_id = '1A00'"), 
-                call.execute().fetchone(),
-                call.execute("SELECT revision_date FROM main WHERE entry_id = '1A00'"),
-                call.execute().fetchone(), 
-                call.execute("SELECT entry_id FROM coils WHERE entry_id = '1A00'"),
-                call.execute().fetchone()
-            ]
-            mock_cursor.assert_has_calls(expected_calls)
+            mock_entry_action.assert_called_once_with(mock_cursor, '1A00', "2000-12-31", entry_states=None)
             captured = capsys.readouterr()
         
             # check that file name was printed
@@ -256,13 +287,46 @@ def test_check_file_entry_exists_is_corrupted(mock_polymer_seq, mock_cif_read, m
             mock_update_file.assert_called_once_with(mock_cursor, mock_structure, mock_doc, mock_sequence)
 
 
+@patch("commands.insert_file")
+@patch("commands.entry_action", return_value=None)
+@patch("commands.probe.probe_file", return_value=("1A00", "2000-12-31"))
+@patch("gemmi.read_structure")
+def test_check_file_probed_up_to_date(mock_gemmi_read, mock_probe_file, mock_entry_action, mock_insert_file, mock_cursor):
+    """
+    Test that an up to date file is not parsed once its entry ID and revision date are probed.
+    """
+    commands.check_file(mock_cursor, TEST_FILE_PATH, verbose=False)
+
+    mock_probe_file.assert_called_once_with(TEST_FILE_PATH)
+    mock_entry_action.assert_called_once_with(mock_cursor, "1A00", "2000-12-31", entry_states=None)
+    mock_gemmi_read.assert_not_called()
+    mock_insert_file.assert_not_called()
+
+
+@patch("commands.insert_file")
+@patch("commands.entry_action", return_value="insert")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+@patch("gemmi.cif.read")
+@patch("commands.PolymerSequence")
+@patch("commands.probe.probe_file", return_value=None)
+def test_check_file_probe_failure(mock_probe_file, mock_polymer_seq, mock_cif_read, mock_revision_date, mock_entry_action,
+                                  mock_insert_file, mock_structure, mock_cursor):
+    """
+    Test that a file that could not be probed is parsed in full.
+    """
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure):
+        commands.check_file(mock_cursor, TEST_FILE_PATH, verbose=False)
+
+    mock_entry_action.assert_called_once_with(mock_cursor, "1A00", "2000-12-31", entry_states=None)
+    mock_insert_file.assert_called_once()
+
+
 def test_insert_file(mock_table_schemas, mock_cursor):
     with patch('commands.table_schemas', mock_table_schemas):
         commands.insert_file(mock_cursor, MagicMock(), MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data3', 'data4'))
+            call.executemany("INSERT INTO main VALUES(?, ?, ?)", [('1A00', 'data1', 'data2')]),
+            call.executemany("INSERT INTO coils VALUES(?, ?, ?)", [('1A00', 'data1', 'data2'), ('1A00', 'data3', 'data4')])
         ]
         
         mock_cursor.assert_has_calls(expected_calls)
@@ -278,21 +342,20 @@ def test_insert_file_no_data_to_extract(mock_table_schemas, mock_cursor):
 
         commands.insert_file(mock_cursor, MagicMock(), MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2'))
+            call.executemany("INSERT INTO main VALUES(?, ?, ?)", [('1A00', 'data1', 'data2')])
         ]
         
-        mock_cursor.assert_has_calls(expected_calls)
+        assert mock_cursor.mock_calls == expected_calls
 
 
 def test_update_file(mock_table_schemas, mock_cursor, mock_structure):
     with patch('commands.table_schemas', mock_table_schemas):
         commands.update_file(mock_cursor, mock_structure, MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("DELETE FROM main WHERE entry_id = '1A00'"),
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("DELETE FROM coils WHERE entry_id = '1A00'"),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("INSERT INTO coils VALUES(?, ?, ?)", ('1A00', 'data3', 'data4'))
+            call.execute("DELETE FROM main WHERE entry_id = ?", ('1A00',)),
+            call.executemany("INSERT INTO main VALUES(?, ?, ?)", [('1A00', 'data1', 'data2')]),
+            call.execute("DELETE FROM coils WHERE entry_id = ?", ('1A00',)),
+            call.executemany("INSERT INTO coils VALUES(?, ?, ?)", [('1A00', 'data1', 'data2'), ('1A00', 'data3', 'data4')])
         ]
         
         mock_cursor.assert_has_calls(expected_calls)
@@ -308,11 +371,185 @@ def test_update_file_no_data_to_extract(mock_table_schemas, mock_cursor, mock_st
 
         commands.update_file(mock_cursor, mock_structure, MagicMock(), MagicMock())
         expected_calls = [
-            call.execute("DELETE FROM main WHERE entry_id = '1A00'"),
-            call.execute("INSERT INTO main VALUES(?, ?, ?)", ('1A00', 'data1', 'data2')),
-            call.execute("DELETE FROM coils WHERE entry_id = '1A00'")
+            call.execute("DELETE FROM main WHERE entry_id = ?", ('1A00',)),
+            call.executemany("INSERT INTO main VALUES(?, ?, ?)", [('1A00', 'data1', 'data2')]),
+            call.execute("DELETE FROM coils WHERE entry_id = ?", ('1A00',))
         ]
         
-        mock_cursor.assert_has_calls(expected_calls)
-    
+        assert mock_cursor.mock_calls == expected_calls
+
 
+@pytest.fixture
+def test_database():
+    """
+    In-memory database with a main and coils table, and the matching table schemas.
+    """
+    main_attributes = Attributes([("entry_id", "VARCHAR"), ("title", "VARCHAR")], primary_keys=["entry_id"])
+    coil_attributes = Attributes([("entry_id", "VARCHAR"), ("coil_id", "INT")], primary_keys=["entry_id", "coil_id"])
+    test_table_schemas = [table.Table("main", main_attributes, MagicMock()),
+                          table.Table("coils", coil_attributes, MagicMock())]
+    con = sqlite3.connect(":memory:")
+    for test_table in test_table_schemas:
+        con.execute(test_table.create_table())
+    with patch('commands.table_schemas', test_table_schemas):
+        yield con
+    con.close()
+
+
+def test_batch_writer_gathers_entries(test_database):
+    writer = commands.BatchWriter(test_database, batch_entries=2)
+    with patch.object(writer, 'cur', wraps=writer.cur) as spy_cursor:
+        writer.add("1A00", "1A00", {"main": [("1A00", "a")], "coils": [("1A00", 1), ("1A00", 2)]})
+        assert test_database.execute("SELECT * FROM main").fetchall() == []
+        assert writer.pending_ids == {"1A00"}
+
+        # reaching batch_entries writes both entries with one statement per table
+        writer.add("1A01", "1A01", {"main": [("1A01", "b")], "coils": [("1A01", 1)]})
+        assert spy_cursor.executemany.call_args_list == [
+            call("INSERT INTO main VALUES(?, ?)", [("1A00", "a"), ("1A01", "b")]),
+            call("INSERT INTO coils VALUES(?, ?)", [("1A00", 1), ("1A00", 2), ("1A01", 1)])
+        ]
+    assert writer.pending == [] and writer.pending_ids == set()
+    assert test_database.in_transaction is False
+    assert test_database.execute("SELECT * FROM coils").fetchall() == [("1A00", 1), ("1A00", 2), ("1A01", 1)]
+
+
+def test_batch_writer_flush_on_row_count(test_database):
+    writer = commands.BatchWriter(test_database, batch_entries=100, batch_rows=3)
+    writer.add("1A00", "1A00", {"main": [("1A00", "a")], "coils": [("1A00", 1), ("1A00", 2)]})
+
+    assert writer.pending == []
+    assert test_database.execute("SELECT COUNT(*) FROM coils").fetchone() == (2,)
+
+
+def test_batch_writer_sort_rows(test_database):
+    writer = commands.BatchWriter(test_database, sort_rows=True)
+    writer.add("1A01", "1A01", {"main": [("1A01", "b")], "coils": [("1A01", 2), ("1A01", 1)]})
+    writer.add("1A00", "1A00", {"main": [("1A00", "a")], "coils": [("1A00", 1)]})
+    writer.flush()
+
+    # rows are inserted in primary key order, so their row IDs follow it
+    assert test_database.execute("SELECT entry_id FROM main ORDER BY rowid").fetchall() == [("1A00",), ("1A01",)]
+    assert test_database.execute("SELECT * FROM coils ORDER BY rowid").fetchall() == [("1A00", 1), ("1A01", 1), ("1A01", 2)]
+
+
+def test_batch_writer_replaced_tables(test_database):
+    test_database.execute("INSERT INTO main VALUES('1A00', 'old')")
+    test_database.execute("INSERT INTO coils VALUES('1A00', 1)")
+    test_database.execute("INSERT INTO coils VALUES('1A00', 2)")
+    writer = commands.BatchWriter(test_database)
+
+    writer.add("1A00", "1A00", {"main": [("1A00", "new")], "coils": [("1A00", 1)]}, ("main", "coils"))
+    writer.flush()
+
+    assert test_database.execute("SELECT * FROM main").fetchall() == [("1A00", "new")]
+    assert test_database.execute("SELECT * FROM coils").fetchall() == [("1A00", 1)]
+
+
+def test_batch_writer_failed_batch_written_per_entry(test_database, capsys):
+    """
+    Test that an entry breaking a primary key only affects that entry, and not the rest of the batch.
+    """
+    writer = commands.BatchWriter(test_database)
+    writer.add("1A00", "1A00", {"main": [("1A00", "a")], "coils": [("1A00", 1)]})
+    writer.add("1A01", "bad_name", {"main": [("1A01", "b")], "coils": [("1A01", 1), ("1A01", 1)]})
+    writer.add("1A02", "1A02", {"main": [("1A02", "c")], "coils": [("1A02", 1)]})
+    writer.flush()
+    captured = capsys.readouterr()
+
+    assert "bad_name" in captured.out
+    assert "UNIQUE constraint failed" in captured.out
+    # the rows of the failed entry written before the failing row are rolled back with it
+    assert test_database.execute("SELECT * FROM main").fetchall() == [("1A00", "a"), ("1A02", "c")]
+    assert test_database.execute("SELECT * FROM coils").fetchall() == [("1A00", 1), ("1A02", 1)]
+    assert test_database.in_transaction is False
+
+
+def test_batch_writer_records_file_states(test_database, capsys):
+    """
+    Test that files are recorded in the manifest with their rows, except those whose rows could not be written.
+    """
+    manifest.init_manifest(test_database.cursor())
+    writer = commands.BatchWriter(test_database)
+    writer.add("1A00", "1A00", {"main": [("1A00", "a")]}, file_state=FileState("1a00.cif", 10, 1000, None))
+    writer.add("1A01", "1A01", {"main": [("1A01", "b")], "coils": [("1A01", 1), ("1A01", 1)]},
+               file_state=FileState("1a01.cif", 10, 1000, None))
+    writer.flush()
+
+    assert test_database.execute("SELECT path, entry_id FROM files").fetchall() == [("1a00.cif", "1A00")]
+
+
+def test_batch_writer_records_journal(test_database, capsys):
+    """
+    Test that files are recorded in the journal with their rows, and those whose rows could not be written as failed.
+    """
+    journal.init_journal(test_database.cursor())
+    writer = commands.BatchWriter(test_database, use_journal=True)
+    writer.add("1A00", "1A00", {"main": [("1A00", "a")]}, journal_record=JournalRecord("1a00.cif", "1A00", "done"))
+    writer.add("1A01", "1A01", {"main": [("1A01", "b")], "coils": [("1A01", 1), ("1A01", 1)]},
+               journal_record=JournalRecord("1a01.cif", "1A01", "done"))
+    writer.flush()
+
+    assert test_database.execute("SELECT * FROM journal").fetchall() == [("1a00.cif", "1A00", "done"),
+                                                                         ("1a01.cif", "1A01", "failed")]
+
+
+def test_batch_writer_records_failures(test_database, capsys):
+    """
+    Test that failures are recorded with the batch, and that the failures of files written since are cleared.
+    """
+    failures.init_failures(test_database.cursor())
+    failures.record_failures(test_database.cursor(), [Failure("1a00.cif", "1A00", "parse", "RuntimeError", "x", "t")])
+    writer = commands.BatchWriter(test_database, use_failures=True)
+    writer.add("1A00", "1A00", {"main": [("1A00", "a")]}, file_path="1a00.cif")
+    writer.add("1A01", "1A01", {"main": [("1A01", "b")], "coils": [("1A01", 1), ("1A01", 1)]}, file_path="1a01.cif")
+    writer.add_failure(Failure("1a02.cif", None, "parse", "RuntimeError", "bad", "t"))
+    writer.flush()
+
+    assert failures.load_failed_paths(test_database.cursor()) == ["1a01.cif", "1a02.cif"]
+    assert test_database.execute("SELECT stage, error_type FROM failures WHERE path = '1a01.cif'").fetchone() == \
+        ("write", "IntegrityError")
+    assert [failure.path for failure in writer.run_failures] == ["1a02.cif", "1a01.cif"]
+
+
+def test_batch_writer_run_failures_without_table(test_database, capsys):
+    writer = commands.BatchWriter(test_database)
+    writer.add_failure(Failure("1a02.cif", None, "parse", "RuntimeError", "bad", "t"))
+    writer.flush()
+
+    assert [failure.path for failure in writer.run_failures] == ["1a02.cif"]
+
+
+def test_batch_writer_counts_row_changes(test_database):
+    """
+    Test that only the rows of a replaced table that changed are written, and that the rows written are counted.
+    """
+    test_database.execute("INSERT INTO main VALUES('1A00', 'old')")
+    test_database.execute("INSERT INTO coils VALUES('1A00', 1)")
+    test_database.execute("INSERT INTO coils VALUES('1A00', 2)")
+    writer = commands.BatchWriter(test_database)
+
+    writer.add("1A00", "1A00", {"main": [("1A00", "new")], "coils": [("1A00", 1), ("1A00", 3)]}, ("main", "coils"))
+    writer.add("1A01", "1A01", {"main": [("1A01", "b")]})
+    writer.flush()
+
+    assert test_database.execute("SELECT * FROM coils").fetchall() == [("1A00", 1), ("1A00", 3)]
+    assert writer.row_changes == {"inserted": 2, "updated": 1, "deleted": 1, "unchanged": 1}
+
+
+def test_batch_writer_failed_replaced_entry_rolled_back(test_database, capsys):
+    """
+    Test that the rows of a replaced entry that fails partway are left as they were, and not counted as written.
+    """
+    test_database.execute("INSERT INTO main VALUES('1A00', 'old')")
+    test_database.execute("INSERT INTO coils VALUES('1A00', 1)")
+    test_database.commit()
+    writer = commands.BatchWriter(test_database)
+
+    writer.add("1A00", "1A00", {"main": [("1A00", "new")], "coils": [("1A00", 2), ("1A00", 2)]}, ("main", "coils"))
+    writer.add("1A01", "1A01", {"main": [("1A01", "b")]})
+    writer.flush()
+
+    assert test_database.execute("SELECT * FROM main").fetchall() == [("1A00", "old"), ("1A01", "b")]
+    assert test_database.execute("SELECT * FROM coils").fetchall() == [("1A00", 1)]
+    assert writer.row_changes == {"inserted": 1}
@@ -12,6 +12,7 @@ from unittest.mock import patch, call, MagicMock, PropertyMock
 from sqlite3 import OperationalError
 
 import database
+import extract
 
 TEST_TABLE_NAME = "main"
 TEST_ENTRY_ID = "1A00"
@@ -54,3 +55,8 @@ def test_retrieve_from_table_entry_not_found(mock_cursor):
     mock_cursor.execute.assert_called_once_with(expected_query)
 
 
+def test_entry_data_fields_are_tables():
+    """
+    Test that the rows extracted at once by extract.insert_into_all_tables are named after the tables, in their order.
+    """
+    assert extract.EntryData._fields == tuple(table.name for table in database.table_schemas)
@@ -0,0 +1,125 @@
+"""
+This script contains unit tests for testing methods in entry_states.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import sqlite3
+from unittest.mock import patch, MagicMock
+
+import commands
+import entry_states
+from entry_states import EntryStates, EntryState
+from database import table_schemas
+
+MAIN_BIT = entry_states.table_bit("main")
+COIL_BIT = entry_states.table_bit("coils")
+
+@pytest.fixture
+def database_cursor():
+    """
+    In-memory database with all the tables, holding a complete entry (1A00), an entry without coils (1A01)
+    and an entry with coils but no row in the main table (1A02).
+    """
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    commands.init_database(cur)
+    for entry_id in ("1A00", "1A01"):
+        cur.execute("INSERT INTO main (entry_id, complex_type, revision_date) VALUES(?, 'Other', '2000-12-31')",
+                    (entry_id,))
+    for entry_id in ("1A00", "1A02"):
+        cur.execute("INSERT INTO coils (entry_id, coil_id, chain_id) VALUES(?, 1, 'A')", (entry_id,))
+        cur.execute("INSERT INTO coils (entry_id, coil_id, chain_id) VALUES(?, 2, 'A')", (entry_id,))
+    cur.execute("INSERT INTO secondary_structures (entry_id_dssp, helix_id_dssp, chain_id_dssp) VALUES('1A00', 1, 'A')")
+    yield cur
+    con.close()
+
+
+def test_table_bit():
+    assert entry_states.table_bit(table_schemas[0].name) == 1
+    assert entry_states.table_bit(table_schemas[-1].name) == 1 << (len(table_schemas) - 1)
+    with pytest.raises(ValueError):
+        entry_states.table_bit("no_table")
+
+
+def test_load_all_entries(database_cursor):
+    result = EntryStates.load(database_cursor).states
+    expected = {
+        "1A00": EntryState("2000-12-31", MAIN_BIT | COIL_BIT | entry_states.table_bit("secondary_structures")),
+        "1A01": EntryState("2000-12-31", MAIN_BIT),
+        "1A02": EntryState(None, COIL_BIT)
+    }
+
+    assert result == expected
+
+
+def test_load_given_entries(database_cursor):
+    result = EntryStates.load(database_cursor, ["1A01", "1A02", "1A01", "9Z99"]).states
+
+    assert result == {"1A01": EntryState("2000-12-31", MAIN_BIT), "1A02": EntryState(None, COIL_BIT)}
+
+
+def test_load_given_entries_in_several_queries(database_cursor):
+    with patch("entry_states.max_query_entries", 2):
+        result = EntryStates.load(database_cursor, ["1A00", "1A01", "1A02"]).states
+
+    assert set(result) == {"1A00", "1A01", "1A02"}
+
+
+@pytest.mark.parametrize("entry_id, revision_date, expected", [
+    ("9Z99", "2000-12-31", "insert"),  # not in the database
+    ("1A00", "2001-01-01", "update"),  # newer revision
+    ("1A00", "2000-12-31", None),      # up to date
+    ("1A01", "2000-12-31", "repair"),  # no rows in the coils table
+    ("1A02", "2000-12-31", "repair"),  # no row in the main table
+])
+def test_action(database_cursor, entry_id, revision_date, expected):
+    states = EntryStates.load(database_cursor)
+
+    assert states.action(entry_id, revision_date) == expected
+    # the action is the same when only the given entry is loaded
+    assert commands.entry_action(database_cursor, entry_id, revision_date) == expected
+
+
+def test_entry_action_given_states():
+    """
+    Test that no query is run when the states are already loaded.
+    """
+    cursor = MagicMock()
+    states = EntryStates({"1A00": EntryState("2000-12-31", MAIN_BIT | COIL_BIT)})
+
+    assert commands.entry_action(cursor, "1A00", "2000-12-31", entry_states=states) is None
+    assert commands.entry_action(cursor, "9Z99", "2000-12-31", entry_states=states) == "insert"
+    cursor.execute.assert_not_called()
+
+
+def test_actions(database_cursor):
+    states = EntryStates.load(database_cursor)
+    result = states.actions([("1A00", "2000-12-31"), ("9Z99", "2000-12-31"), ("1A00", "2001-01-01")])
+
+    assert result == [None, "insert", "update"]
+
+
+def test_record_insert():
+    states = EntryStates()
+    states.record("1A00", "2000-12-31", {"main": [("1A00",)], "helices": [], "coils": [("1A00", 1)]})
+
+    assert states.states["1A00"] == EntryState("2000-12-31", MAIN_BIT | COIL_BIT)
+    assert states.action("1A00", "2000-12-31") is None
+
+
+def test_record_partial_update():
+    """
+    Test that replaced tables without new rows are cleared, and tables that were not replaced are kept.
+    """
+    states = EntryStates({"1A00": EntryState("2000-12-31", MAIN_BIT | COIL_BIT)})
+    states.record("1A00", "2001-01-01", {"main": [("1A00",)]}, ["main", "coils"])
+
+    assert states.states["1A00"] == EntryState("2001-01-01", MAIN_BIT)
+    assert states.action("1A00", "2001-01-01") == "repair"
+
+    states.record("1A00", "2001-01-01", {}, ["main"])
+    assert states.states["1A00"] == EntryState(None, 0)
@@ -8,12 +8,28 @@ Output verbosity can be adjusted by using the relevant flags in the command (e.g
 """
 
 import pytest
+import functools
 from unittest.mock import patch, MagicMock, call
 import gemmi
 from gemmi import cif
 
 import extract 
 import polymer_sequence
+import cif_file
+import database
+from test.unit import test_categories
+
+
+def resolving(mock_sequence: MagicMock) -> MagicMock:
+    """
+    Makes a mocked sequence resolve the helices, strands and chain polymers of the (mocked) structure
+    like a PolymerSequence.
+    """
+    mock_sequence.helices = mock_sequence.strands = mock_sequence.polymers = None
+    for name in ("locate", "resolve", "get_helices", "get_strands", "get_chain_polymers"):
+        getattr(mock_sequence, name).side_effect = functools.partial(getattr(polymer_sequence.PolymerSequence, name),
+                                                                     mock_sequence)
+    return mock_sequence
 
 def test_sense_sequence(mock_sheet):
     mock_strand_1 = MagicMock(spec=gemmi.Sheet.Strand, sense = 1)
@@ -333,8 +349,10 @@ def test_insert_into_subchain_table_subchain_length_is_zero(mock_structure, mock
 def test_insert_into_chain_table(mock_structure, mock_doc, mock_chain):
     # assign chain to mock_structure
     mock_structure.__getitem__.return_value = [mock_chain]
+    mock_chain.get_polymer.return_value.first_conformer.return_value = \
+        [MagicMock(seqid=gemmi.SeqId(num, ' ')) for num in range(1, 12)]
 
-    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_polymer_sequence = resolving(MagicMock(spec=polymer_sequence.PolymerSequence))
     mock_polymer_sequence.get_chain_start_id.return_value = 1
     mock_polymer_sequence.get_chain_end_id.return_value = 11
 
@@ -344,7 +362,7 @@ def test_insert_into_chain_table(mock_structure, mock_doc, mock_chain):
 
     result = extract.insert_into_chain_table(mock_structure, mock_doc, mock_polymer_sequence)
     expected = [
-        ('1A00', 'A', 'A A', 0, 'ARNDCQEGHIX', 'ARNDCQEGHIX', 1, 11, 11)
+        ('1A00', 'A', 'A A', 0, 'ARNDCQEGHIX', 'ARNDCQEGHIX', 1, 11, 11, 1, 11)
     ]
 
     assert result == expected
@@ -358,27 +376,41 @@ def test_insert_into_chain_table_empty_polymer(mock_structure, mock_doc, mock_em
     # assign chain to mock_structure
     mock_structure.__getitem__.return_value = [mock_empty_chain]
     
-    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_empty_chain.get_polymer.return_value.first_conformer.return_value = []
+    mock_polymer_sequence = resolving(MagicMock(spec=polymer_sequence.PolymerSequence))
     
     # mock empty unannotated sequence
     mock_polymer_sequence.get_chain_sequence.return_value = ''
 
     result = extract.insert_into_chain_table(mock_structure, mock_doc, mock_polymer_sequence)
     expected = [
-        ('1A00', 'A', 'A', None, '', '', None, None, 0)
+        ('1A00', 'A', 'A', None, '', '', None, None, 0, None, None)
     ]
 
     assert result == expected
 
 
+@pytest.mark.parametrize("secondary_structures, expected", [
+    ([], [(1, 10)]),
+    ([(3, 5)], [(1, 2), (6, 10)]),
+    ([(1, 5), (8, 10)], [(6, 7)]),
+    ([(2, 4), (5, 6)], [(1, 1), (7, 10)]),
+    # Overlapping and nested helices and strands are merged
+    ([(2, 8), (3, 4), (6, 9)], [(1, 1), (10, 10)]),
+    ([(1, 10)], [])
+])
+def test_coil_ranges(secondary_structures, expected):
+    assert extract.coil_ranges(1, 10, secondary_structures) == expected
+
+
 def test_insert_into_helix_table_different_start_and_end_chain(mock_structure, mock_doc, mock_helix):    
     """
     Test that chain names are concatenated when the start and end chain are different. 
     """
-    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_polymer_sequence = resolving(MagicMock(spec=polymer_sequence.PolymerSequence))
 
     # mock helix sequence 
-    mock_polymer_sequence.get_helix_sequence.return_value = 'ARNDCQEGHIX'
+    mock_polymer_sequence.get_secondary_structure_sequence.return_value = ('ARNDCQEGHIX', 11)
     mock_structure.helices = [mock_helix]
 
     # different chain and end_chain
@@ -409,10 +441,10 @@ def test_insert_into_helix_table_different_start_and_end_chain(mock_structure, m
 
 
 def test_insert_into_helix_table_same_start_and_end_chain(mock_structure, mock_doc, mock_helix):    
-    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_polymer_sequence = resolving(MagicMock(spec=polymer_sequence.PolymerSequence))
 
     # mock helix sequence 
-    mock_polymer_sequence.get_helix_sequence.return_value = 'ARNDCQEGHIX'
+    mock_polymer_sequence.get_secondary_structure_sequence.return_value = ('ARNDCQEGHIX', 11)
     mock_structure.helices = [mock_helix]
 
     # same chain and end_chain
@@ -455,12 +487,12 @@ def test_insert_into_sheet_table(mock_sense_sequence, mock_structure, mock_doc,
 
 
 def test_insert_into_strand_table(mock_structure, mock_doc, mock_sheet, mock_strand):
-    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_polymer_sequence = resolving(MagicMock(spec=polymer_sequence.PolymerSequence))
     mock_structure.sheets = [mock_sheet]
     mock_sheet.strands = [mock_strand]
 
     # mock strand sequence and length 
-    mock_polymer_sequence.get_strand_sequence.return_value = ['ARNDCQEGHIX', 11]
+    mock_polymer_sequence.get_secondary_structure_sequence.return_value = ('ARNDCQEGHIX', 11)
     
     # chain and end_chain
     mock_start_chain = MagicMock(spec=gemmi.Chain)
@@ -551,11 +583,11 @@ class TestCoilExtractor:
         polymer_sequence.get_chain_start_id.side_effect = lambda chain: 1 if chain == "A" else 1
         polymer_sequence.get_chain_end_id.side_effect = lambda chain: 10 if chain == "A" else 8
 
-        polymer_sequence.get_chain_subsequence.return_value = ["SUBSEQ", 6]
-        polymer_sequence.get_chain_annotated_subsequence.return_value = "SUBSEQ"
-        polymer_sequence.contains_unconfirmed_residues.return_value = 0
+        polymer_sequence.get_chain_ranges.side_effect = lambda chain, ranges: [("SUBSEQ", 0)] * len(ranges)
+        polymer_sequence.get_chain_annotated_ranges.side_effect = \
+            lambda span, chain_string, ranges: ["SUBSEQ"] * len(ranges)
 
-        return polymer_sequence
+        return resolving(polymer_sequence)
 
     def test_insert_into_coil_table(self, mock_structure, mock_polymer_sequence, mock_chain_a, mock_chain_b):
         """
@@ -680,9 +712,9 @@ class TestCoilExtractor:
         ]
 
         # annotated subsequence is empty
-        mock_polymer_sequence.get_chain_annotated_subsequence.return_value = ""
+        mock_polymer_sequence.get_chain_annotated_ranges.side_effect = lambda span, chain_string, ranges: [""] * len(ranges)
         # sequence contains unconfirmed residues 
-        mock_polymer_sequence.contains_unconfirmed_residues.return_value = 1
+        mock_polymer_sequence.get_chain_ranges.side_effect = lambda chain, ranges: [("SUBSEQ", 1)] * len(ranges)
 
         result = extract.insert_into_coil_table(mock_structure, MagicMock(), mock_polymer_sequence)
         expected = [
@@ -789,4 +821,85 @@ class TestCoilExtractor:
         assert result == expected
 
 
+@patch("extract.coil_rows", return_value=["coil"])
+@patch("extract.insert_into_entity_table", return_value=["entity"])
+@patch("extract.insert_into_experimental_table", return_value=["experimental"])
+@patch("extract.main_table_rows", return_value=["main"])
+def test_insert_into_all_tables(mock_main_rows, mock_experimental, mock_entities, mock_coils, mock_structure,
+                                mock_doc, mock_entity, mock_subchain, mock_chain):
+    """
+    Test that the chain and subchain rows come from a single walk of the chains of the model, without looking up
+    any subchain or parent chain in it.
+    """
+    mock_model = MagicMock(spec=gemmi.Model)
+    mock_model.__iter__.side_effect = lambda: iter([mock_chain])
+    mock_structure.__getitem__.return_value = mock_model
+    mock_structure.entities = [mock_entity(gemmi.EntityType.Polymer, gemmi.PolymerType.PeptideD, ['A']),
+                               mock_entity(gemmi.EntityType.Polymer, gemmi.PolymerType.SaccharideD, ['B'])]
+    mock_structure.helices = []
+    mock_structure.sheets = []
+    mock_subchain.__getitem__.side_effect = lambda index: MagicMock(label_seq=1 if index == 0 else 11)
+
+    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_polymer_sequence.get_chain_polymers.return_value = {
+        'A': polymer_sequence.ChainPolymer([MagicMock()] * 11, 'ARNDCQEGHIX', 1, 11)
+    }
+    mock_polymer_sequence.get_chain_start_id.return_value = 1
+    mock_polymer_sequence.get_chain_end_id.return_value = 11
+    mock_polymer_sequence.get_chain_sequence.return_value = 'ARNDCQEGHIX'
+    mock_polymer_sequence.get_chain_subsequence.return_value = ['ARNDCQEGHIX', 11]
+    mock_polymer_sequence.contains_unconfirmed_residues.return_value = 0
+    mock_polymer_sequence.get_helices.return_value = []
+    mock_polymer_sequence.get_strands.return_value = []
+
+    result = extract.insert_into_all_tables(mock_structure, mock_doc, mock_polymer_sequence)
+    expected = extract.EntryData(
+        ["main"], ["experimental"], ["entity"],
+        [('1A00', 'A', 'A A', 0, 'ARNDCQEGHIX', 'ARNDCQEGHIX', 1, 11, 11, 1, 11)],
+        [('1A00', '1', 'A', 'A', 'ARNDCQEGHIX', 'ARNDCQEGHIX', 1, 11, 11)],
+        [], [], [], ["coil"], []
+    )
+
+    assert result == expected
+    mock_main_rows.assert_called_once_with(mock_structure, mock_doc, ['A'])
+    mock_model.get_subchain.assert_not_called()
+    mock_model.get_parent_of.assert_not_called()
+
+
+def test_insert_into_all_tables_same_rows():
+    """
+    Test that the rows of every table are the same as those of the extractor of each table, with the strand rows
+    and the coil ranges taken from a single pass over the sheets.
+    """
+    struct = cif_file.parse_structure(test_categories.TEST_CONTENT.encode())
+    doc = cif_file.parse_document(test_categories.TEST_CONTENT.encode())
+
+    result = extract.insert_into_all_tables(struct, doc, polymer_sequence.PolymerSequence(doc))
+    expected = [table_scheme.extract_data(struct, doc, polymer_sequence.PolymerSequence(doc))
+                for table_scheme in database.table_schemas]
+
+    assert list(result) == expected
+    assert len(result.strands) == 1 and len(result.coils) == 2
+
+
+@patch("extract.helix_row", return_value="helix")
+def test_insert_into_all_tables_ill_defined_helix(mock_helix_row, mock_structure, mock_doc, mock_helix, capsys):
+    """
+    Test that a helix spanning two chains leaves no coils, as with the coil extractor, and is reported once.
+    """
+    mock_structure.__getitem__.return_value = []
+    mock_structure.entities = []
+    mock_structure.helices = [mock_helix]
+    mock_structure.sheets = []
+    mock_polymer_sequence = MagicMock(spec=polymer_sequence.PolymerSequence)
+    mock_polymer_sequence.get_chain_polymers.return_value = {}
+    mock_polymer_sequence.get_helices.return_value = [polymer_sequence.SecondaryStructure('A', 'B', 1, 11)]
+    mock_polymer_sequence.get_strands.return_value = []
+
+    with patch("extract.main_table_rows"), patch("extract.insert_into_experimental_table"), \
+         patch("extract.insert_into_entity_table"):
+        result = extract.insert_into_all_tables(mock_structure, mock_doc, mock_polymer_sequence)
 
+    assert result.helices == ["helix"]
+    assert result.coils == []
+    assert capsys.readouterr().out == "Helix 0 in protein 1A00 is ill-defined. Unable to extract random coils.\n"
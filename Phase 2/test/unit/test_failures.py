@@ -0,0 +1,65 @@
+"""
+This script contains unit tests for testing methods in failures.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import sqlite3
+
+import failures
+from failures import Failure
+
+
+@pytest.fixture
+def test_cursor():
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    failures.init_failures(cur)
+    yield cur
+    con.close()
+
+
+def test_from_error():
+    failure = failures.from_error("1a00.cif", "1A00", "extract coils", IndexError("list index out of range"))
+
+    assert failure[:5] == ("1a00.cif", "1A00", "extract coils", "IndexError", "list index out of range")
+    assert failure.time.endswith("+00:00")
+
+
+def test_record_failures(test_cursor):
+    failures.record_failures(test_cursor, [Failure("b.cif", None, "parse", "RuntimeError", "bad", "t1"),
+                                           Failure("a.cif", "1A00", "write", "IntegrityError", "unique", "t1")])
+
+    assert failures.load_failed_paths(test_cursor) == ["a.cif", "b.cif"]
+
+
+def test_record_failures_replaces_last_failure(test_cursor):
+    failures.record_failures(test_cursor, [Failure("a.cif", None, "parse", "RuntimeError", "bad", "t1")])
+    failures.record_failures(test_cursor, [Failure("a.cif", "1A00", "extract main", "KeyError", "x", "t2")])
+
+    assert test_cursor.execute("SELECT * FROM failures").fetchall() == \
+        [("a.cif", "1A00", "extract main", "KeyError", "x", "t2")]
+
+
+def test_clear_failures(test_cursor):
+    failures.record_failures(test_cursor, [Failure("a.cif", None, "parse", "RuntimeError", "bad", "t1"),
+                                           Failure("b.cif", None, "parse", "RuntimeError", "bad", "t1")])
+    failures.clear_failures(test_cursor, ["a.cif", "c.cif"])
+
+    assert failures.load_failed_paths(test_cursor) == ["b.cif"]
+
+
+def test_summarize():
+    run_failures = [Failure("a.cif", None, "parse", "RuntimeError", "bad", "t1"),
+                    Failure("b.cif", "1A01", "extract coils", "IndexError", "x", "t1"),
+                    Failure("c.cif", None, "parse", "RuntimeError", "bad", "t1")]
+
+    assert failures.summarize(200, run_failures) == \
+        "200 files checked, 3 failed (1.50%)\n  extract coils: IndexError x1\n  parse: RuntimeError x2"
+
+
+def test_summarize_no_files():
+    assert failures.summarize(0, []) == "0 files checked, 0 failed (0.00%)"
@@ -0,0 +1,89 @@
+"""
+This script contains unit tests for testing methods in guard.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import os
+import time
+import signal
+import pytest
+
+import guard
+
+
+def allocate(size: int) -> int:
+    try:
+        return len(bytearray(size))
+    except MemoryError:
+        return -1
+
+
+def exit_abruptly():
+    os._exit(3)
+
+
+def kill_self():
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def ignore_timeout():
+    """
+    Stands for an extractor stuck in gemmi, which never gets to handle the EntryTimeout.
+    """
+    with guard.time_limit(0.05):
+        while True:
+            try:
+                time.sleep(1)
+            except guard.EntryTimeout:
+                pass
+
+
+def test_time_limit():
+    with pytest.raises(guard.EntryTimeout, match="Ran out of time after 0.05 seconds"):
+        with guard.time_limit(0.05):
+            time.sleep(1)
+
+
+def test_time_limit_not_reached():
+    with guard.time_limit(1):
+        pass
+    # the timer and the watchdog are cancelled when the block ends
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+    time.sleep(0.01)
+
+
+def test_time_limit_not_caught_as_exception():
+    with pytest.raises(guard.EntryTimeout):
+        with guard.time_limit(0.05):
+            try:
+                time.sleep(1)
+            except Exception:
+                pass
+
+
+def test_run_in_process():
+    assert guard.run_in_process(allocate, (100,), None, 10) == (100, None)
+
+
+def test_run_in_process_memory_limit():
+    assert guard.run_in_process(allocate, (1 << 33,), 1 << 32, 10) == (-1, None)
+
+
+def test_run_in_process_timeout():
+    assert guard.run_in_process(time.sleep, (10,), None, 0.2) == (None, "Ran out of time after 0.2 seconds")
+
+
+def test_run_in_process_exit():
+    assert guard.run_in_process(exit_abruptly, (), None, 10) == (None, "Exited with code 3")
+
+
+def test_run_in_process_killed():
+    assert guard.run_in_process(kill_self, (), None, 10) == (None, "Killed by SIGTERM")
+
+
+def test_time_limit_exits_stuck_process(monkeypatch):
+    monkeypatch.setattr(guard, "kill_grace", 0.2)
+    assert guard.run_in_process(ignore_timeout, (), None, 10) == (None, "Exited with code 1")
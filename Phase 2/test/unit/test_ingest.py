@@ -0,0 +1,919 @@
+"""
+This script contains unit tests for testing methods in ingest.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+from unittest.mock import patch, call, MagicMock
+import sqlite3
+import gemmi
+
+import os
+import ingest
+import commands
+import guard
+import quarantine
+import table
+from attributes import Attributes
+from manifest import FileState
+from entry_states import EntryStates
+from journal import JournalRecord
+import journal
+
+TEST_FILE_PATH = "test_path/file.cif"
+TEST_FILE_STATE = FileState(TEST_FILE_PATH, 100, 1000, None)
+TEST_ROWS = {"main": [('1A00', 'data1', 'data2')],
+             "coils": [('1A00', 'data1', 'data2'), ('1A00', 'data3', 'data4')]}
+
+
+def test_find_files(tmp_path):
+    (tmp_path / "a0").mkdir()
+    (tmp_path / "a0" / "1a00.cif").write_text("")
+    (tmp_path / "a0" / "1a01.cif.gz").write_text("")
+    (tmp_path / "a0" / "notes.txt").write_text("")
+    (tmp_path / "a0" / "1a02.cif.bak").write_text("")
+
+    result = sorted(ingest.find_files(str(tmp_path)))
+    expected = [str(tmp_path / "a0" / "1a00.cif"), str(tmp_path / "a0" / "1a01.cif.gz")]
+
+    assert result == expected
+
+
+@pytest.fixture
+def mock_entry_states():
+    return MagicMock(spec=EntryStates)
+
+
+@patch("gemmi.cif.read")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+def test_extract_file(mock_revision_date, mock_polymer_seq, mock_cif_read, mock_structure, mock_table_schemas):
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure), \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH)
+
+    assert result._replace(build_times=None) == \
+        ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    assert result.build_times.keys() == {table.document, table.sequence, table.coordinates}
+
+
+@patch("gemmi.cif.read")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+def test_extract_file_extractor_failure(mock_revision_date, mock_polymer_seq, mock_cif_read, mock_structure, mock_table_schemas):
+    """
+    Test that the rows of the tables extracted before the failing extractor are kept.
+    """
+    mock_table_schemas[-1].extract_data.side_effect = Exception("Error extracting coils")
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure), \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH)
+
+    assert result.rows == {"main": TEST_ROWS["main"]}
+    assert result.error == "Error extracting coils"
+    assert (result.stage, result.error_type) == ("extract coils", "Exception")
+
+
+@patch("gemmi.cif.read")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+@patch("extract.insert_into_all_tables")
+def test_extract_file_fused(mock_all_tables, mock_revision_date, mock_polymer_seq, mock_cif_read, mock_structure,
+                            mock_table_schemas):
+    """
+    Test that the rows of every table are extracted at once, without running the extractor of each table.
+    """
+    mock_all_tables.return_value._asdict.return_value = TEST_ROWS
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure), \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, fused=True)
+
+    assert result.rows == TEST_ROWS
+    assert result.error is None
+    mock_all_tables.assert_called_once_with(mock_structure, mock_cif_read.return_value, mock_polymer_seq.return_value)
+    for table_scheme in mock_table_schemas:
+        table_scheme.extract_data.assert_not_called()
+
+
+@patch("gemmi.cif.read")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+@patch("extract.insert_into_all_tables", side_effect=Exception("Error extracting"))
+def test_extract_file_fused_failure(mock_all_tables, mock_revision_date, mock_polymer_seq, mock_cif_read,
+                                    mock_structure, mock_table_schemas):
+    """
+    Test that if extracting the rows at once fails, the tables are extracted one at a time, so that the failing
+    table and the rows of the tables before it are the same as without fusing them.
+    """
+    mock_table_schemas[-1].extract_data.side_effect = Exception("Error extracting coils")
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure), \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, fused=True)
+
+    assert result.rows == {"main": TEST_ROWS["main"]}
+    assert result.error == "Error extracting coils"
+    assert (result.stage, result.error_type) == ("extract coils", "Exception")
+
+
+@patch("gemmi.cif.read")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+def test_extract_file_single_parse(mock_revision_date, mock_polymer_seq, mock_cif_read, mock_structure, mock_table_schemas):
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure) as mock_read_structure, \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, single_parse=True)
+
+    mock_cif_read.assert_not_called()
+    mock_polymer_seq.assert_called_once_with(mock_read_structure.call_args.kwargs["save_doc"])
+    assert result.rows == TEST_ROWS
+
+
+@patch("gemmi.read_structure")
+@patch("ingest.probe.probe_file", return_value=("1A00", "2000-12-31"))
+def test_extract_file_probed_up_to_date(mock_probe_file, mock_gemmi_read, mock_entry_states):
+    mock_entry_states.action.return_value = None
+    result = ingest.extract_file(TEST_FILE_PATH, entry_states=mock_entry_states)
+
+    assert result == ingest.EntryResult(TEST_FILE_PATH, None, "1A00", "2000-12-31", {}, None, up_to_date=True)
+    mock_entry_states.action.assert_called_once_with("1A00", "2000-12-31")
+    mock_gemmi_read.assert_not_called()
+
+
+@patch("gemmi.cif.read")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+@patch("ingest.probe.probe_file", return_value=("1A00", "1999-12-31"))
+def test_extract_file_probed_stale(mock_probe_file, mock_revision_date, mock_polymer_seq, mock_cif_read, mock_structure,
+                                   mock_table_schemas, mock_entry_states):
+    mock_entry_states.action.return_value = "update"
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure), \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, entry_states=mock_entry_states)
+
+    assert result._replace(build_times=None) == \
+        ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+
+
+@patch("gemmi.read_structure")
+def test_extract_file_gemmi_read_failure(mock_gemmi_read):
+    mock_gemmi_read.side_effect = Exception("Error reading structure")
+    result = ingest.extract_file(TEST_FILE_PATH)
+
+    assert result == ingest.EntryResult(TEST_FILE_PATH, None, None, None, {}, "Error reading structure",
+                                        stage="parse", error_type="Exception", build_times={})
+
+
+@pytest.fixture
+def test_database_path(tmp_path):
+    """
+    Database file with a main and coils table, and the matching table schemas.
+    """
+    main_attributes = Attributes([("entry_id", "VARCHAR"), ("revision_date", "VARCHAR")], primary_keys=["entry_id"])
+    coil_attributes = Attributes([("entry_id", "VARCHAR"), ("coil_id", "INT")], primary_keys=["entry_id", "coil_id"])
+    test_table_schemas = [table.Table("main", main_attributes, MagicMock()),
+                          table.Table("coils", coil_attributes, MagicMock())]
+    path = tmp_path / "test.db"
+    con = sqlite3.connect(path)
+    for test_table in test_table_schemas:
+        con.execute(test_table.create_table())
+    journal.init_journal(con.cursor())
+    con.close()
+    with patch('ingest.table_schemas', test_table_schemas), patch('commands.table_schemas', test_table_schemas), \
+         patch('entry_states.table_schemas', test_table_schemas), \
+         patch('entry_states.main_table', test_table_schemas[0]), patch('entry_states.coil_table', test_table_schemas[1]):
+        yield path
+
+
+@pytest.fixture
+def mock_writer(mock_cursor):
+    mock_writer = MagicMock(spec=commands.BatchWriter)
+    mock_writer.cur = mock_cursor
+    mock_writer.pending_ids = set()
+    mock_writer.use_journal = False
+    return mock_writer
+
+
+def test_write_result_insert(mock_table_schemas, mock_writer, capsys, mock_entry_states):
+    mock_entry_states.action.return_value = "insert"
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result)
+    captured = capsys.readouterr()
+
+    assert "Adding " + TEST_FILE_PATH in captured.out
+    mock_entry_states.action.assert_called_once_with("1A00", "2000-12-31")
+    mock_entry_states.record.assert_called_once_with("1A00", "2000-12-31", TEST_ROWS)
+    mock_writer.add.assert_called_once_with("1A00", "mock_name", TEST_ROWS, file_state=None, journal_record=None,
+                                            file_path=TEST_FILE_PATH)
+    mock_writer.flush.assert_not_called()
+
+
+def test_write_result_update(mock_table_schemas, mock_writer, capsys, mock_entry_states):
+    mock_entry_states.action.return_value = "update"
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result)
+    captured = capsys.readouterr()
+
+    assert "Updating " + TEST_FILE_PATH in captured.out
+    mock_writer.add.assert_called_once_with("1A00", "mock_name", TEST_ROWS, ["main", "coils"], file_state=None,
+                                            journal_record=None, file_path=TEST_FILE_PATH)
+
+
+def test_write_result_update_partial_rows(mock_table_schemas, mock_writer, capsys, mock_entry_states):
+    """
+    Test that the rows of the table whose extractor failed are also replaced,
+    the same way update_file deletes them.
+    """
+    mock_entry_states.action.return_value = "update"
+    mock_table_schemas.append(MagicMock(spec=table.Table))
+    mock_table_schemas[-1].name = "sheets"
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31",
+                                {"main": TEST_ROWS["main"]}, "Error extracting coils")
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result, file_state=TEST_FILE_STATE)
+    captured = capsys.readouterr()
+
+    # the file is not recorded in the manifest, so it is extracted again on the next run
+    mock_writer.add.assert_called_once_with("1A00", "mock_name", {"main": TEST_ROWS["main"]}, ["main", "coils"],
+                                            file_state=None, journal_record=None, file_path=TEST_FILE_PATH)
+    assert "mock_name\nError extracting coils" in captured.out
+
+
+def test_write_result_records_file_state(mock_table_schemas, mock_writer, mock_entry_states):
+    mock_entry_states.action.return_value = "insert"
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result, verbose=False, file_state=TEST_FILE_STATE)
+
+    mock_writer.add.assert_called_once_with("1A00", "mock_name", TEST_ROWS, file_state=TEST_FILE_STATE,
+                                            journal_record=None, file_path=TEST_FILE_PATH)
+
+
+def test_write_result_up_to_date_records_file_state(mock_writer, mock_entry_states):
+    """
+    Test that an up to date file is recorded in the manifest without writing any rows.
+    """
+    mock_entry_states.action.return_value = None
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    ingest.write_result(mock_writer, mock_entry_states, result, verbose=False, file_state=TEST_FILE_STATE)
+
+    mock_writer.add.assert_called_once_with("1A00", "mock_name", {}, file_state=TEST_FILE_STATE, journal_record=None,
+                                            file_path=TEST_FILE_PATH)
+
+
+def test_write_result_backfill(mock_table_schemas, mock_writer, capsys, mock_entry_states):
+    """
+    Test that only the selected tables are replaced for an entry in the database, whatever its revision date.
+    """
+    mock_entry_states.action.return_value = None
+    mock_entry_states.states = {"1A00": MagicMock()}
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", {"coils": TEST_ROWS["coils"]}, None)
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result, tables=("coils",))
+    captured = capsys.readouterr()
+
+    assert "Backfilling " + TEST_FILE_PATH in captured.out
+    mock_writer.add.assert_called_once_with("1A00", "mock_name", {"coils": TEST_ROWS["coils"]}, ["coils"],
+                                            file_state=None, journal_record=None, file_path=TEST_FILE_PATH)
+
+
+def test_write_result_backfill_new_entry(mock_table_schemas, mock_writer, mock_entry_states):
+    """
+    Test that an entry not in the database is left alone, as only the selected tables would be filled.
+    """
+    mock_entry_states.action.return_value = "insert"
+    mock_entry_states.states = {}
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", {"coils": TEST_ROWS["coils"]}, None)
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result, verbose=False, tables=("coils",))
+
+    mock_writer.add.assert_not_called()
+
+
+def test_write_result_entry_pending(mock_writer, mock_entry_states):
+    """
+    Test that queued rows are written before checking an entry that is already queued.
+    """
+    mock_entry_states.action.return_value = None
+    mock_writer.pending_ids = {"1A00"}
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    ingest.write_result(mock_writer, mock_entry_states, result)
+
+    mock_writer.flush.assert_called_once()
+    mock_writer.add.assert_not_called()
+
+
+def test_write_result_unreadable_file(mock_writer, capsys, mock_entry_states):
+    mock_entry_states.action.return_value = None
+    result = ingest.EntryResult(TEST_FILE_PATH, None, None, None, {}, "Error reading structure")
+    ingest.write_result(mock_writer, mock_entry_states, result)
+    captured = capsys.readouterr()
+
+    assert "Error reading structure" in captured.out
+    mock_entry_states.action.assert_not_called()
+    mock_writer.add.assert_not_called()
+    failure = mock_writer.add_failure.call_args.args[0]
+    assert failure[:5] == (TEST_FILE_PATH, None, "extract", "Exception", "Error reading structure")
+
+
+def test_write_result_records_failure(mock_table_schemas, mock_writer, capsys, mock_entry_states):
+    """
+    Test that a file whose extractor failed is written up to that table, and its failure queued with its stage.
+    """
+    mock_entry_states.action.return_value = "insert"
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", {"main": TEST_ROWS["main"]},
+                                "list index out of range", stage="extract coils", error_type="IndexError")
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result, verbose=False)
+
+    mock_writer.add.assert_called_once()
+    failure = mock_writer.add_failure.call_args.args[0]
+    assert failure[:5] == (TEST_FILE_PATH, "1A00", "extract coils", "IndexError", "list index out of range")
+
+
+def test_write_result_no_failure(mock_table_schemas, mock_writer, mock_entry_states):
+    mock_entry_states.action.return_value = "insert"
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result, verbose=False)
+
+    mock_writer.add_failure.assert_not_called()
+
+
+def test_write_result_journal(mock_table_schemas, mock_writer, mock_entry_states):
+    mock_writer.use_journal = True
+    mock_entry_states.action.return_value = "insert"
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    with patch('ingest.table_schemas', mock_table_schemas):
+        ingest.write_result(mock_writer, mock_entry_states, result, verbose=False)
+
+    mock_writer.add.assert_called_once_with("1A00", "mock_name", TEST_ROWS, file_state=None,
+                                            journal_record=JournalRecord(TEST_FILE_PATH, "1A00", "done"),
+                                            file_path=TEST_FILE_PATH)
+
+
+def test_write_result_journal_up_to_date(mock_writer, mock_entry_states):
+    """
+    Test that an up to date file is recorded in the journal, so it is not checked again when resuming.
+    """
+    mock_writer.use_journal = True
+    mock_entry_states.action.return_value = None
+    result = ingest.EntryResult(TEST_FILE_PATH, None, "1A00", "2000-12-31", {}, None, up_to_date=True)
+    ingest.write_result(mock_writer, mock_entry_states, result, verbose=False)
+
+    mock_writer.add.assert_called_once_with("1A00", None, {}, file_state=None,
+                                            journal_record=JournalRecord(TEST_FILE_PATH, "1A00", "done"),
+                                            file_path=TEST_FILE_PATH)
+
+
+def test_write_result_journal_unreadable_file(mock_writer, capsys, mock_entry_states):
+    mock_writer.use_journal = True
+    result = ingest.EntryResult(TEST_FILE_PATH, None, None, None, {}, "Error reading structure")
+    ingest.write_result(mock_writer, mock_entry_states, result)
+    captured = capsys.readouterr()
+
+    assert "Error reading structure" in captured.out
+    mock_writer.add.assert_called_once_with(None, None, {}, journal_record=JournalRecord(TEST_FILE_PATH, None, "failed"))
+
+
+def test_pack_tasks(tmp_path):
+    file_paths = []
+    for i, size in enumerate([30, 30, 30, 200, 10, 10]):
+        file_paths.append(str(tmp_path / f"{i}.cif"))
+        (tmp_path / f"{i}.cif").write_bytes(b"x" * size)
+
+    result = list(ingest.pack_tasks(file_paths, 100))
+
+    assert result == [file_paths[0:3], file_paths[3:4], file_paths[4:6]]
+
+
+def test_pack_tasks_file_count(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "task_files", 2)
+    file_paths = [str(tmp_path / f"{i}.cif") for i in range(5)]
+
+    # files that cannot be read are packed as empty files
+    assert list(ingest.pack_tasks(file_paths, 100)) == [file_paths[0:2], file_paths[2:4], file_paths[4:]]
+
+
+def test_read_file(tmp_path):
+    file_path = tmp_path / "1a00.cif.gz"
+    file_path.write_bytes(b"compressed content")
+
+    assert ingest.read_file(str(file_path)) == b"compressed content"
+
+
+def test_read_file_missing(tmp_path):
+    result = ingest.read_file(str(tmp_path / "1a00.cif"))
+
+    assert result.entry_id is None
+    assert "No such file" in result.error
+    assert (result.stage, result.error_type) == ("read", "FileNotFoundError")
+
+
+@patch("ingest.probe.probe_file", return_value=("1A00", "2000-12-31"))
+def test_read_file_probed_up_to_date(mock_probe_file, mock_entry_states):
+    mock_entry_states.action.return_value = None
+    result = ingest.read_file(TEST_FILE_PATH, mock_entry_states)
+
+    assert result == ingest.EntryResult(TEST_FILE_PATH, None, "1A00", "2000-12-31", {}, None, up_to_date=True)
+
+
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+@patch("cif_file.parse_document")
+@patch("cif_file.parse_structure")
+def test_extract_file_content(mock_parse_structure, mock_parse_document, mock_revision_date, mock_polymer_seq,
+                              mock_structure, mock_table_schemas):
+    """
+    Test that the bytes read ahead of the worker are parsed instead of the file.
+    """
+    mock_parse_structure.return_value = mock_structure
+    with patch.object(gemmi, 'read_structure') as mock_read_structure, \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, content=b"content")
+
+    mock_read_structure.assert_not_called()
+    mock_parse_structure.assert_called_once_with(b"content")
+    mock_parse_document.assert_called_once_with(b"content")
+    assert result._replace(build_times=None) == \
+        ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+
+
+@patch("gemmi.cif.read")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+def test_extract_file_tables(mock_revision_date, mock_polymer_seq, mock_cif_read, mock_structure, mock_table_schemas):
+    with patch.object(gemmi, 'read_structure', return_value=mock_structure), \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, tables=("coils",))
+
+    assert result.rows == {"coils": TEST_ROWS["coils"]}
+    mock_table_schemas[0].extract_data.assert_not_called()
+
+
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+@patch("cif_file.header_structure")
+@patch("cif_file.parse_document")
+def test_extract_file_tables_without_structure(mock_parse_document, mock_header_structure, mock_revision_date,
+                                               mock_polymer_seq, mock_structure, mock_table_schemas):
+    """
+    Test that the structure is not built when none of the selected extractors needs it.
+    """
+    mock_table_schemas[-1].inputs = frozenset((table.document,))
+    mock_header_structure.return_value = mock_structure
+    with patch("cif_file.parse_structure") as mock_parse_structure, \
+         patch('ingest.table_schemas', mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, content=b"content", tables=("coils",))
+
+    mock_parse_structure.assert_not_called()
+    mock_header_structure.assert_called_once_with(mock_parse_document.return_value)
+    mock_polymer_seq.assert_not_called()
+    assert result.build_times.keys() == {table.document}
+    assert result._replace(build_times=None) == ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31",
+                                        {"coils": TEST_ROWS["coils"]}, None)
+
+
+@patch("ingest.CategorySequence")
+@patch("ingest.PolymerSequence")
+@patch("commands.get_revision_date", return_value="2000-12-31")
+@patch("cif_file.model_structure")
+@patch("cif_file.parse_document")
+def test_extract_file_from_categories(mock_parse_document, mock_model_structure, mock_revision_date,
+                                      mock_polymer_seq, mock_category_seq, mock_structure, mock_table_schemas):
+    """
+    Test that the tables are extracted from the categories without parsing the coordinates.
+    """
+    mock_model_structure.return_value = mock_structure
+    for mock_table in mock_table_schemas:
+        mock_table.inputs = frozenset((table.document, table.model, table.residues))
+    with patch("cif_file.parse_structure") as mock_parse_structure, \
+         patch("ingest.category_table_schemas", mock_table_schemas):
+        result = ingest.extract_file(TEST_FILE_PATH, content=b"content", from_categories=True)
+
+    mock_parse_structure.assert_not_called()
+    mock_polymer_seq.assert_not_called()
+    mock_table_schemas[0].extract_data.assert_called_once_with(mock_structure, mock_parse_document.return_value,
+                                                               mock_category_seq.return_value)
+    assert result.rows == TEST_ROWS
+    assert result.build_times.keys() == {table.document, table.model, table.residues}
+
+
+@patch("cif_file.model_structure")
+@patch("cif_file.parse_document")
+def test_parse_file_model(mock_parse_document, mock_model_structure):
+    """
+    Test that the structure is built from the document without coordinates when only the model is needed.
+    """
+    build_times = {}
+    with patch("cif_file.parse_structure") as mock_parse_structure:
+        struct, doc = ingest.parse_file(TEST_FILE_PATH, content=b"content",
+                                        inputs=frozenset((table.document, table.model)), build_times=build_times)
+
+    mock_parse_structure.assert_not_called()
+    mock_model_structure.assert_called_once_with(mock_parse_document.return_value)
+    assert (struct, doc) == (mock_model_structure.return_value, mock_parse_document.return_value)
+    assert build_times.keys() == {table.document, table.model}
+
+
+@patch("cif_file.header_structure")
+@patch("cif_file.parse_document")
+def test_parse_file_categories(mock_parse_document, mock_header_structure):
+    """
+    Test that only the given categories are parsed when only the document and sequence are needed.
+    """
+    with patch("cif_file.without_atoms") as mock_without_atoms, \
+         patch("cif_file.select_categories", return_value=b"selected") as mock_select_categories:
+        struct, doc = ingest.parse_file(TEST_FILE_PATH, content=b"content", inputs=frozenset((table.document,)),
+                                        categories=frozenset(("_entry",)))
+
+    mock_without_atoms.assert_not_called()
+    mock_select_categories.assert_called_once_with([b"content"], frozenset(("_entry",)))
+    mock_parse_document.assert_called_once_with(b"selected")
+    assert (struct, doc) == (mock_header_structure.return_value, mock_parse_document.return_value)
+
+
+def test_required_categories(mock_table, mock_coil_table):
+    mock_table.categories = frozenset(("_exptl_crystal",))
+    document_inputs = frozenset((table.document, table.sequence))
+
+    assert ingest.required_categories([mock_table], document_inputs) == \
+        table.entry_categories | table.sequence_categories | {"_exptl_crystal"}
+    assert ingest.required_categories([mock_table], frozenset((table.document,))) == \
+        table.entry_categories | {"_exptl_crystal"}
+    assert ingest.required_categories([mock_table, mock_coil_table], document_inputs) is None
+    assert ingest.required_categories([mock_table], frozenset((table.document, table.model))) is None
+
+
+def test_describe_build_times():
+    assert ingest.describe_build_times({"document": 1.0, "coordinates": 3.0}) == \
+        "Time spent building the inputs of the extractors: coordinates 3.0s (75%), document 1.0s (25%)"
+    assert ingest.describe_build_times({}) == "Time spent building the inputs of the extractors: none"
+
+
+@patch("ingest.pipeline_files")
+@patch("ingest.extract_file")
+def test_extract_files_single_worker(mock_extract_file, mock_pipeline_files):
+    mock_extract_file.side_effect = lambda file_path, single_parse, entry_states, tables, from_categories, fused: file_path.upper()
+    result = list(ingest.extract_files(["a.cif", "b.cif"], 1))
+
+    assert result == ["A.CIF", "B.CIF"]
+    mock_pipeline_files.assert_not_called()
+
+
+@pytest.fixture
+def thread_extractors():
+    """
+    Runs the extract stage of the pipeline in threads, so the patched functions are seen by the workers.
+    """
+    with patch("ingest.ProcessPoolExecutor", ingest.ThreadPoolExecutor):
+        yield
+
+
+@patch("ingest.extract_file")
+@patch("ingest.read_file")
+def test_pipeline_files(mock_read_file, mock_extract_file, thread_extractors):
+    mock_read_file.side_effect = lambda file_path, entry_states: file_path.encode()
+    mock_extract_file.side_effect = lambda file_path, single_parse, entry_states, content, tables, from_categories, fused: content.upper()
+    file_paths = [f"{i}.cif" for i in range(10)]
+    result = list(ingest.extract_files(file_paths, 4, True, None, read_threads=2, in_flight=3))
+
+    assert result == [file_path.upper().encode() for file_path in file_paths]
+    mock_extract_file.assert_any_call("0.cif", True, None, b"0.cif", None, False, False)
+
+
+@patch("ingest.extract_file")
+@patch("ingest.read_file")
+def test_pipeline_files_bounded(mock_read_file, mock_extract_file, thread_extractors):
+    """
+    Test that no more than in_flight files are taken from file_paths ahead of the results yielded.
+    """
+    mock_read_file.side_effect = lambda file_path, entry_states: file_path.encode()
+    mock_extract_file.side_effect = lambda file_path, single_parse, entry_states, content, tables, from_categories, fused: file_path
+    taken = []
+    def file_paths():
+        for i in range(20):
+            taken.append(i)
+            yield f"{i}.cif"
+
+    for count, result in enumerate(ingest.pipeline_files(file_paths(), 2, 2, 4, task_bytes=0)):
+        # The next task, and the file pack_tasks looks at to end it, are taken before the first result is yielded
+        assert len(taken) <= count + 4 + 2
+    assert len(taken) == 20
+
+
+@patch("ingest.extract_file")
+@patch("ingest.read_file")
+def test_pipeline_files_packed_tasks(mock_read_file, mock_extract_file, thread_extractors, tmp_path):
+    """
+    Test that the files of a task are extracted by the same worker, and their results yielded in order.
+    """
+    file_paths = []
+    for i, size in enumerate([10, 10, 100, 10]):
+        file_paths.append(str(tmp_path / f"{i}.cif"))
+        (tmp_path / f"{i}.cif").write_bytes(b"x" * size)
+    mock_read_file.side_effect = lambda file_path, entry_states: file_path.encode()
+    mock_extract_file.side_effect = lambda file_path, single_parse, entry_states, content, tables, from_categories, fused: file_path
+    with patch("ingest.extract_task", wraps=ingest.extract_task) as mock_extract_task:
+        result = list(ingest.pipeline_files(file_paths, 2, 2, 4, task_bytes=50))
+
+    assert result == file_paths
+    assert [task_call.args[0] for task_call in mock_extract_task.call_args_list] == \
+        [file_paths[:2], file_paths[2:3], file_paths[3:]]
+
+
+@patch("ingest.extract_file")
+@patch("ingest.read_file")
+def test_pipeline_files_skipped_by_reader(mock_read_file, mock_extract_file, mock_entry_states, thread_extractors):
+    skipped = ingest.EntryResult(TEST_FILE_PATH, None, "1A00", "2000-12-31", {}, None, up_to_date=True)
+    mock_read_file.return_value = skipped
+    result = list(ingest.pipeline_files([TEST_FILE_PATH], 2, 2, 4, entry_states=mock_entry_states))
+
+    assert result == [skipped]
+    mock_read_file.assert_called_once_with(TEST_FILE_PATH, mock_entry_states)
+    mock_extract_file.assert_not_called()
+
+
+@patch("ingest.extract_file", side_effect=RuntimeError("Worker crashed"))
+@patch("ingest.read_file", return_value=b"content")
+def test_pipeline_files_worker_error(mock_read_file, mock_extract_file, thread_extractors):
+    with pytest.raises(RuntimeError, match="Worker crashed"):
+        list(ingest.pipeline_files([TEST_FILE_PATH], 2, 2, 4))
+
+
+def exit_on_bad_file(file_path, single_parse, entry_states, content, tables, from_categories, fused):
+    """
+    Stands for a file that kills its worker, e.g. by crashing gemmi.
+    """
+    if file_path == "bad.cif":
+        os._exit(1)
+    return ingest.EntryResult(file_path, None, None, None, {}, content.decode())
+
+
+def test_pipeline_files_worker_dies(monkeypatch):
+    """
+    Test that the files of the tasks taken down by a dying worker are extracted again,
+    and the file that killed it is quarantined.
+    """
+    monkeypatch.setattr(ingest, "read_file", lambda file_path, entry_states: file_path.encode())
+    monkeypatch.setattr(ingest, "extract_file", exit_on_bad_file)
+    file_paths = ["a.cif", "bad.cif", "c.cif", "d.cif"]
+    result = list(ingest.pipeline_files(file_paths, 2, 2, 4))
+
+    assert [entry.file_path for entry in result] == file_paths
+    assert [entry.error for entry in result] == ["a.cif", "Exited with code 1", "c.cif", "d.cif"]
+    assert [entry.quarantined for entry in result] == [False, True, False, False]
+
+
+@patch("ingest.extract_file", side_effect=guard.EntryTimeout("Ran out of time after 1 seconds"))
+def test_extract_guarded_timeout(mock_extract_file):
+    result = ingest.extract_guarded(TEST_FILE_PATH, False, b"content", 1)
+
+    assert result == ingest.EntryResult(TEST_FILE_PATH, None, None, None, {}, "Ran out of time after 1 seconds",
+                                        quarantined=True, stage="guard", error_type="EntryTimeout")
+
+
+@patch("ingest.extract_file", side_effect=MemoryError)
+def test_extract_guarded_memory(mock_extract_file):
+    result = ingest.extract_guarded(TEST_FILE_PATH, False, b"content", None)
+
+    assert result == ingest.EntryResult(TEST_FILE_PATH, None, None, None, {}, "Ran out of memory", quarantined=True,
+                                        stage="guard", error_type="MemoryError")
+
+
+@patch("gemmi.read_structure", side_effect=MemoryError)
+def test_extract_file_memory_error(mock_read_structure):
+    """
+    Test that running out of memory is left to extract_guarded, rather than reported as an extraction error.
+    """
+    with pytest.raises(MemoryError):
+        ingest.extract_file(TEST_FILE_PATH)
+
+
+@patch("guard.run_in_process")
+def test_retry_task(mock_run_in_process):
+    extracted = ingest.EntryResult("a.cif", "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    skipped = ingest.EntryResult("b.cif", None, "1A01", "2000-12-31", {}, None, up_to_date=True)
+    mock_run_in_process.side_effect = [(extracted, None), (None, "Killed by SIGSEGV")]
+    result = ingest.retry_task(["a.cif", "b.cif", "c.cif"], False, [b"a", skipped, b"c"], time_limit=10,
+                               memory_limit=1 << 30)
+
+    assert result == [extracted, skipped,
+                      ingest.EntryResult("c.cif", None, None, None, {}, "Killed by SIGSEGV", quarantined=True,
+                                         stage="guard", error_type="BrokenProcessPool")]
+    mock_run_in_process.assert_called_with(ingest.extract_guarded, ("c.cif", False, b"c", 10, None, False, False), 1 << 30,
+                                           10 + 2 * guard.kill_grace)
+
+
+@patch("ingest.pipeline_files")
+def test_extract_files_guarded_single_worker(mock_pipeline_files):
+    """
+    Test that limits are enforced in a worker process even with a single worker.
+    """
+    list(ingest.extract_files(["a.cif"], 1, time_limit=10))
+
+    assert mock_pipeline_files.call_args.args[:2] == (["a.cif"], 1)
+
+
+@patch("quarantine.quarantine_file")
+def test_write_result_quarantined(mock_quarantine_file, mock_writer, capsys, mock_entry_states):
+    mock_writer.use_journal = True
+    result = ingest.EntryResult(TEST_FILE_PATH, None, None, None, {}, "Ran out of memory", quarantined=True)
+    ingest.write_result(mock_writer, mock_entry_states, result)
+    captured = capsys.readouterr()
+
+    mock_quarantine_file.assert_called_once_with(mock_writer.cur, TEST_FILE_PATH, "Ran out of memory")
+    assert "Quarantining " + TEST_FILE_PATH in captured.out
+    mock_writer.add.assert_called_once_with(None, None, {}, journal_record=JournalRecord(TEST_FILE_PATH, None, "failed"))
+
+
+@patch("ingest.write_result")
+@patch("ingest.extract_files")
+@patch("ingest.EntryStates")
+@patch("commands.BatchWriter")
+def test_ingest_files(mock_batch_writer, mock_entry_states, mock_extract_files, mock_write_result):
+    results = [MagicMock(up_to_date=False), MagicMock(up_to_date=False), MagicMock(up_to_date=False)]
+    mock_extract_files.return_value = iter(results)
+    mock_con = MagicMock()
+
+    ingest.ingest_files(mock_con, ["a.cif", "b.cif", "c.cif"], 4, batch_entries=2, batch_rows=10, verbose=False)
+
+    mock_batch_writer.assert_called_once_with(mock_con, 2, 10, False, False, False)
+    writer = mock_batch_writer.return_value
+    # the states of all entries are loaded once
+    mock_entry_states.load.assert_called_once_with(writer.cur)
+    entry_states = mock_entry_states.load.return_value
+    assert mock_write_result.call_args_list == [call(writer, entry_states, result, verbose=False, file_state=None,
+                                                     tables=None)
+                                                for result in results]
+    # rows still queued at the end are written
+    writer.flush.assert_called_once()
+
+
+@patch("ingest.write_result")
+@patch("ingest.extract_files")
+@patch("ingest.EntryStates")
+@patch("commands.BatchWriter")
+def test_ingest_files_summary(mock_batch_writer, mock_entry_states, mock_extract_files, mock_write_result):
+    mock_extract_files.return_value = iter([MagicMock(up_to_date=False, build_times={"document": 1.0, "sequence": 0.5}),
+                                            MagicMock(up_to_date=False, build_times={"document": 2.0})])
+    mock_batch_writer.return_value.run_failures = ["failure"]
+    mock_batch_writer.return_value.row_changes = {"inserted": 3}
+
+    summary = ingest.ingest_files(MagicMock(), ["a.cif", "b.cif"], verbose=False, use_failures=True)
+
+    assert summary == ingest.IngestSummary(2, ["failure"], {"inserted": 3}, {"document": 3.0, "sequence": 0.5})
+    assert mock_batch_writer.call_args.args[-1] is True
+
+
+@patch("ingest.write_result")
+@patch("ingest.extract_files")
+@patch("ingest.EntryStates")
+@patch("commands.BatchWriter")
+def test_ingest_files_file_states(mock_batch_writer, mock_entry_states, mock_extract_files, mock_write_result):
+    result = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    mock_extract_files.return_value = iter([result])
+
+    ingest.ingest_files(MagicMock(), [TEST_FILE_PATH], verbose=False, file_states={TEST_FILE_PATH: TEST_FILE_STATE})
+
+    mock_write_result.assert_called_once_with(mock_batch_writer.return_value, mock_entry_states.load.return_value, result,
+                                              verbose=False, file_state=TEST_FILE_STATE, tables=None)
+
+
+@patch("ingest.write_result")
+@patch("ingest.extract_file")
+@patch("ingest.extract_files")
+@patch("ingest.EntryStates")
+@patch("commands.BatchWriter")
+def test_ingest_files_up_to_date_rechecked(mock_batch_writer, mock_entry_states, mock_extract_files, mock_extract_file,
+                                           mock_write_result):
+    """
+    Test that a file skipped by a worker is parsed after all if an earlier file changed the state of its entry.
+    """
+    skipped = ingest.EntryResult(TEST_FILE_PATH, None, "1A00", "2000-12-31", {}, None, up_to_date=True)
+    mock_extract_files.return_value = iter([skipped])
+    entry_states = mock_entry_states.load.return_value
+    entry_states.action.return_value = "repair"
+
+    ingest.ingest_files(MagicMock(), [TEST_FILE_PATH], verbose=False, single_parse=True)
+
+    entry_states.action.assert_called_once_with("1A00", "2000-12-31")
+    mock_extract_file.assert_called_once_with(TEST_FILE_PATH, True, from_categories=False, fused=False)
+    assert mock_write_result.call_args.args[2] == mock_extract_file.return_value
+
+
+@patch("ingest.write_result")
+@patch("guard.run_in_process")
+@patch("ingest.extract_file")
+@patch("ingest.extract_files")
+@patch("ingest.EntryStates")
+@patch("commands.BatchWriter")
+def test_ingest_files_up_to_date_rechecked_with_limits(mock_batch_writer, mock_entry_states, mock_extract_files,
+                                                       mock_extract_file, mock_run_in_process, mock_write_result):
+    """
+    Test that with a time or memory limit, a file parsed after all is extracted in a process of its own,
+    within the limits, rather than in the writer process.
+    """
+    skipped = ingest.EntryResult(TEST_FILE_PATH, None, "1A00", "2000-12-31", {}, None, up_to_date=True)
+    mock_extract_files.return_value = iter([skipped])
+    mock_entry_states.load.return_value.action.return_value = "repair"
+    extracted = ingest.EntryResult(TEST_FILE_PATH, "mock_name", "1A00", "2000-12-31", TEST_ROWS, None)
+    mock_run_in_process.return_value = (extracted, None)
+
+    ingest.ingest_files(MagicMock(), [TEST_FILE_PATH], verbose=False, time_limit=10, memory_limit=1 << 30)
+
+    mock_extract_file.assert_not_called()
+    mock_run_in_process.assert_called_once_with(ingest.extract_guarded,
+                                                (TEST_FILE_PATH, False, None, 10, None, False, False), 1 << 30,
+                                                10 + 2 * guard.kill_grace)
+    assert mock_write_result.call_args.args[2] == extracted
+
+
+def test_ingest_files_resumes_interrupted_run(test_database_path):
+    """
+    Test that a run killed halfway is resumed after the last batch it committed, and that the journal
+    is cleared once the run finishes.
+    """
+    file_paths = [f"{index}.cif" for index in range(5)]
+    extracted = []
+    interrupt = True
+
+    def extract_file(file_path, single_parse=False, entry_states=None, tables=None, from_categories=False,
+                     fused=False):
+        # the run is killed while extracting the fourth file, with the second batch still queued
+        if file_path == "3.cif" and interrupt:
+            raise KeyboardInterrupt
+        extracted.append(file_path)
+        entry_id = "1A0" + file_path[0]
+        return ingest.EntryResult(file_path, entry_id, entry_id, "2000-12-31",
+                                  {"main": [(entry_id, "2000-12-31")], "coils": [(entry_id, 1)]}, None)
+
+    with patch("ingest.extract_file", extract_file):
+        con = sqlite3.connect(test_database_path)
+        with pytest.raises(KeyboardInterrupt):
+            ingest.ingest_files(con, file_paths, batch_entries=2, verbose=False, use_journal=True)
+        con.close()
+
+        con = sqlite3.connect(test_database_path)
+        assert journal.load_journal(con.cursor()) == {"0.cif", "1.cif"}
+        assert con.execute("SELECT entry_id FROM main").fetchall() == [("1A00",), ("1A01",)]
+        extracted.clear()
+        interrupt = False
+        ingest.ingest_files(con, file_paths, batch_entries=2, verbose=False, use_journal=True)
+
+    assert extracted == ["2.cif", "3.cif", "4.cif"]
+    assert con.execute("SELECT COUNT(*) FROM main").fetchone() == (5,)
+    assert journal.load_journal(con.cursor()) == set()
+    con.close()
+
+
+def test_ingest_files_skips_quarantined(test_database_path, tmp_path):
+    file_paths = []
+    for name in ("1a00.cif", "1a01.cif"):
+        (tmp_path / name).write_text("")
+        file_paths.append(str(tmp_path / name))
+    con = sqlite3.connect(test_database_path)
+    quarantine.init_quarantine(con.cursor())
+    quarantine.quarantine_file(con.cursor(), file_paths[0], "Ran out of memory")
+
+    with patch("ingest.extract_files", return_value=iter([])) as mock_extract_files:
+        ingest.ingest_files(con, file_paths, verbose=False, use_quarantine=True)
+
+    assert list(mock_extract_files.call_args.args[0]) == [file_paths[1]]
+    con.close()
+
+
+def test_ingest_files_claimed(test_database_path, tmp_path):
+    """
+    Test that a batch claimed from a queue only loads the states and quarantine records of its own files.
+    """
+    file_paths = []
+    for name in ("1a00.cif", "1a01.cif", "1a02.cif", "1a06.cif"):
+        (tmp_path / name).write_text("")
+        file_paths.append(str(tmp_path / name))
+    claimed_paths = file_paths[:3]
+    con = sqlite3.connect(test_database_path)
+    con.executemany("INSERT INTO main VALUES(?, '2000-12-31')", [("1A00",), ("1A05",)])
+    quarantine.init_quarantine(con.cursor())
+    quarantine.quarantine_file(con.cursor(), file_paths[1], "Ran out of memory")
+    quarantine.quarantine_file(con.cursor(), file_paths[3], "Ran out of memory")
+
+    with patch("ingest.extract_files", return_value=iter([])) as mock_extract_files, \
+         patch("quarantine.load_quarantine", wraps=quarantine.load_quarantine) as mock_load_quarantine:
+        ingest.ingest_files(con, iter(claimed_paths), verbose=False, use_quarantine=True, claimed=True)
+
+    assert list(mock_extract_files.call_args.args[0]) == [file_paths[0], file_paths[2]]
+    assert list(mock_extract_files.call_args.args[3].states) == ["1A00"]
+    assert list(mock_load_quarantine.call_args.args[1]) == claimed_paths
+    con.close()
+
+
+def test_combine_summaries():
+    summaries = [ingest.IngestSummary(2, ["failure"], {"inserted": 3}, {"document": 1.0}),
+                 ingest.IngestSummary(1, [], {"inserted": 1, "updated": 2}, {"document": 0.5, "sequence": 0.5})]
+    assert ingest.combine_summaries(summaries) == \
+        ingest.IngestSummary(3, ["failure"], {"inserted": 4, "updated": 2}, {"document": 1.5, "sequence": 0.5})
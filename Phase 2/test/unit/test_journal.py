@@ -0,0 +1,59 @@
+"""
+This script contains unit tests for testing methods in journal.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import sqlite3
+
+import journal
+from journal import JournalRecord
+
+
+@pytest.fixture
+def test_cursor():
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    journal.init_journal(cur)
+    yield cur
+    con.close()
+
+
+def test_load_journal_empty(test_cursor):
+    assert journal.load_journal(test_cursor) == set()
+
+
+def test_record_files(test_cursor):
+    journal.record_files(test_cursor, [JournalRecord("1a00.cif", "1A00", "done"),
+                                       JournalRecord("1a01.cif", None, "failed")])
+    # a file recorded again replaces its previous record
+    journal.record_files(test_cursor, [JournalRecord("1a00.cif", "1A00", "failed")])
+
+    assert journal.load_journal(test_cursor) == {"1a00.cif", "1a01.cif"}
+    assert test_cursor.execute("SELECT * FROM journal ORDER BY path").fetchall() == [("1a00.cif", "1A00", "failed"),
+                                                                                   ("1a01.cif", None, "failed")]
+
+
+def test_record_files_empty(test_cursor):
+    journal.record_files(test_cursor, [])
+
+    assert journal.load_journal(test_cursor) == set()
+
+
+def test_clear_journal(test_cursor):
+    journal.record_files(test_cursor, [JournalRecord("1a00.cif", "1A00", "done")])
+    journal.clear_journal(test_cursor)
+
+    assert journal.load_journal(test_cursor) == set()
+
+
+def test_discard_journal(test_cursor):
+    journal.record_files(test_cursor, [JournalRecord("1a00.cif", "1A00", "done"),
+                                       JournalRecord("1a01.cif", None, "failed")])
+
+    assert journal.discard_journal(test_cursor) == 2
+    assert journal.load_journal(test_cursor) == set()
+    assert journal.discard_journal(test_cursor) == 0
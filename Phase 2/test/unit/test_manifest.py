@@ -0,0 +1,127 @@
+"""
+This script contains unit tests for testing methods in manifest.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import os
+import pytest
+import sqlite3
+
+import manifest
+from manifest import FileState
+
+@pytest.fixture
+def manifest_cursor():
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    manifest.init_manifest(cur)
+    yield cur
+    con.close()
+
+
+@pytest.fixture
+def test_files(tmp_path):
+    paths = []
+    for name, content in (("1a00.cif", "data_1A00\n"), ("1a01.cif", "data_1A01\n")):
+        path = tmp_path / name
+        path.write_text(content)
+        paths.append(str(path))
+    return paths
+
+
+def record(cur, file_path, use_hash=False):
+    stat = os.stat(file_path)
+    file_hash = manifest.hash_file(file_path) if use_hash else None
+    manifest.record_files(cur, [(FileState(file_path, stat.st_size, stat.st_mtime_ns, file_hash), "1A00")])
+
+
+def test_hash_file(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_text("data_1A00\n")
+    other_path = tmp_path / "1a01.cif"
+    other_path.write_text("data_1A01\n")
+
+    assert manifest.hash_file(str(path)) == manifest.hash_file(str(path))
+    assert manifest.hash_file(str(path)) != manifest.hash_file(str(other_path))
+
+
+def test_record_files(manifest_cursor):
+    file_state = FileState("a/1a00.cif", 10, 1000, None)
+    manifest.record_files(manifest_cursor, [(file_state, "1A00")])
+    # recording a file again replaces its previous state
+    new_file_state = FileState("a/1a00.cif", 12, 2000, "abc")
+    manifest.record_files(manifest_cursor, [(new_file_state, "1A00")])
+
+    result = manifest_cursor.execute("SELECT * FROM files").fetchall()
+    assert result == [("a/1a00.cif", 12, 2000, "abc", "1A00")]
+    assert manifest.load_manifest(manifest_cursor) == {"a/1a00.cif": new_file_state}
+
+
+def test_changed_files_new_files(manifest_cursor, test_files):
+    result = list(manifest.changed_files(manifest_cursor, test_files))
+
+    assert [file_state.path for file_state in result] == test_files
+    assert result[0].size == os.stat(test_files[0]).st_size
+    assert result[0].hash is None
+
+
+def test_changed_files_unchanged_file_skipped(manifest_cursor, test_files):
+    record(manifest_cursor, test_files[0])
+    result = list(manifest.changed_files(manifest_cursor, test_files))
+
+    assert [file_state.path for file_state in result] == [test_files[1]]
+
+
+def test_changed_files_missing_file(manifest_cursor, test_files, tmp_path):
+    """
+    Test that a file removed since it was found is passed on, to fail when it is read, instead of stopping the run.
+    """
+    missing = str(tmp_path / "1a02.cif")
+    result = list(manifest.changed_files(manifest_cursor, [missing] + test_files, use_hash=True))
+
+    assert [file_state.path for file_state in result] == [missing] + test_files
+    assert result[0] == FileState(missing, None, None, None)
+
+
+def test_changed_files_modified_file(manifest_cursor, test_files):
+    record(manifest_cursor, test_files[0])
+    with open(test_files[0], "a") as file:
+        file.write("_entry.id 1A00\n")
+    result = list(manifest.changed_files(manifest_cursor, test_files[:1]))
+
+    assert [file_state.path for file_state in result] == [test_files[0]]
+
+
+def test_changed_files_touched_file_with_hash(manifest_cursor, test_files):
+    """
+    Test that a file whose modification time changed but whose content did not is skipped,
+    and its new modification time is recorded.
+    """
+    record(manifest_cursor, test_files[0], use_hash=True)
+    stat = os.stat(test_files[0])
+    os.utime(test_files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert list(manifest.changed_files(manifest_cursor, test_files[:1], use_hash=True)) == []
+    assert manifest.load_manifest(manifest_cursor)[test_files[0]].mtime == stat.st_mtime_ns + 10**9
+    # without hashing, the file counts as changed
+    os.utime(test_files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    assert len(list(manifest.changed_files(manifest_cursor, test_files[:1]))) == 1
+
+
+def test_recorded_files(manifest_cursor, test_files, tmp_path):
+    """
+    Test that only the files recorded in their current state are returned, leaving out files that were never
+    written, files changed since, and files that no longer exist.
+    """
+    record(manifest_cursor, test_files[0])
+    record(manifest_cursor, test_files[1])
+    with open(test_files[1], "a") as file:
+        file.write("_entry.id 1A01\n")
+    missing = str(tmp_path / "1a02.cif")
+    manifest.record_files(manifest_cursor, [(FileState(missing, 10, 1000, None), "1A02")])
+
+    assert manifest.recorded_files(manifest_cursor, test_files + [missing, str(tmp_path / "1a03.cif")]) == \
+        [test_files[0]]
@@ -0,0 +1,198 @@
+"""
+This script contains unit tests for testing methods in merge.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import os
+import pytest
+import sqlite3
+
+import merge
+import commands
+import manifest
+import journal
+import failures
+import quarantine
+import work_queue
+from manifest import FileState
+from journal import JournalRecord
+from failures import Failure
+from quarantine import QuarantineRecord
+from database import main_table, coil_table
+
+
+def main_row(entry_id: str) -> tuple:
+    return (entry_id, "protein", "title", "organism", "2000-12-31", "A", "P 1", 1, 1.0, 1.0, 1.0, 90.0, 90.0, 90.0)
+
+
+def coil_row(entry_id: str, coil_id: int) -> tuple:
+    return (entry_id, coil_id, "A", 0, "SEQ", "SEQ", 1, 3, 3)
+
+
+@pytest.fixture
+def make_shard(tmp_path):
+    """
+    Returns a function writing a shard database with the given entries, in the same way as main.py.
+    """
+    def make(name: str, entry_ids: list[str], coils_only: list[str] = []) -> str:
+        path = str(tmp_path / name)
+        con = sqlite3.connect(path)
+        cur = con.cursor()
+        commands.init_database(cur)
+        manifest.init_manifest(cur)
+        journal.init_journal(cur)
+        commands.insert_rows(cur, main_table, [main_row(entry_id) for entry_id in entry_ids])
+        commands.insert_rows(cur, coil_table, [coil_row(entry_id, coil_id)
+                                               for entry_id in entry_ids + coils_only for coil_id in (1, 2)])
+        manifest.record_files(cur, [(FileState(entry_id.lower() + ".cif", 10, 1000, None), entry_id)
+                                    for entry_id in entry_ids])
+        con.commit()
+        con.close()
+        return path
+    return make
+
+
+@pytest.fixture
+def output_database():
+    con = sqlite3.connect(":memory:")
+    commands.init_database(con.cursor())
+    manifest.init_manifest(con.cursor())
+    failures.init_failures(con.cursor())
+    quarantine.init_quarantine(con.cursor())
+    yield con
+    con.close()
+
+
+def test_merge_shards(make_shard, output_database):
+    shard_paths = [make_shard("shard0.db", ["1A00", "1A02"]), make_shard("shard1.db", ["1A01"])]
+    merge.merge_shards(output_database, shard_paths, verbose=False)
+
+    assert output_database.execute("SELECT entry_id FROM main ORDER BY entry_id").fetchall() == \
+        [("1A00",), ("1A01",), ("1A02",)]
+    assert output_database.execute("SELECT COUNT(*) FROM coils").fetchone() == (6,)
+    assert output_database.execute("SELECT COUNT(*) FROM files").fetchone() == (3,)
+    assert output_database.in_transaction is False
+
+
+def test_merge_shards_duplicate_entry(make_shard, output_database):
+    shard_paths = [make_shard("shard0.db", ["1A00", "1A01"]), make_shard("shard1.db", ["1A01"])]
+    with pytest.raises(ValueError, match="1 entries appear more than once: 1A01"):
+        merge.merge_shards(output_database, shard_paths, verbose=False)
+
+    # nothing is written if any shard fails the checks
+    assert output_database.execute("SELECT COUNT(*) FROM main").fetchone() == (0,)
+
+
+def test_merge_shards_entry_already_in_output(make_shard, output_database):
+    commands.insert_rows(output_database.cursor(), main_table, [main_row("1A00")])
+    with pytest.raises(ValueError, match="appear more than once: 1A00"):
+        merge.merge_shards(output_database, [make_shard("shard0.db", ["1A00"])], verbose=False)
+
+
+def test_merge_shards_partial_entry(make_shard, output_database):
+    shard_path = make_shard("shard0.db", ["1A00"], coils_only=["1A01"])
+    with pytest.raises(ValueError, match="1 entries have no row in the main table: 1A01"):
+        merge.merge_shards(output_database, [shard_path], verbose=False)
+
+
+def test_merge_shards_resumed(make_shard, output_database, monkeypatch):
+    """
+    Test that a merge interrupted after its first shard is resumed by running it again, skipping that shard.
+    """
+    shard_paths = [make_shard("shard0.db", ["1A00", "1A02"]), make_shard("shard1.db", ["1A01"])]
+    merge_shard = merge.merge_shard
+    def interrupted(con, shard_path, *args):
+        if shard_path == shard_paths[1]:
+            raise KeyboardInterrupt
+        merge_shard(con, shard_path, *args)
+    monkeypatch.setattr(merge, "merge_shard", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        merge.merge_shards(output_database, shard_paths, verbose=False)
+    monkeypatch.setattr(merge, "merge_shard", merge_shard)
+
+    assert output_database.execute("SELECT COUNT(*) FROM main").fetchone() == (2,)
+    merge.merge_shards(output_database, shard_paths, verbose=False)
+    assert output_database.execute("SELECT entry_id FROM main ORDER BY entry_id").fetchall() == \
+        [("1A00",), ("1A01",), ("1A02",)]
+    assert merge.load_merged(output_database.cursor()) == {os.path.abspath(path) for path in shard_paths}
+
+
+def test_merge_shards_interrupted_shard(make_shard, output_database):
+    shard_path = make_shard("shard0.db", ["1A00"])
+    con = sqlite3.connect(shard_path)
+    journal.record_files(con.cursor(), [JournalRecord("1a00.cif", "1A00", "done")])
+    con.commit()
+    con.close()
+
+    with pytest.raises(ValueError, match="was interrupted after 1 files"):
+        merge.merge_shards(output_database, [shard_path], verbose=False)
+
+
+def test_merge_shards_from_queue(make_shard, output_database, tmp_path):
+    shard_paths = [make_shard("host1.db", ["1A00", "1A01"]), make_shard("host2.db", ["1A01", "1A02"])]
+    queue_path = str(tmp_path / "queue.db")
+    queue = work_queue.connect(queue_path)
+    work_queue.enqueue(queue, ["1a00.cif", "1a01.cif", "1a02.cif"])
+    work_queue.register_worker(queue, "host1", shard_paths[0])
+    work_queue.register_worker(queue, "host2", shard_paths[1])
+    # host1 wrote 1a01.cif but its lease expired before it marked it as done, so host2 wrote it again
+    work_queue.claim(queue, "host1", 2, 60, now=lambda: 1000)
+    work_queue.complete(queue, "host1", ["1a00.cif"])
+    work_queue.claim(queue, "host2", 2, 60, now=lambda: 2000)
+    work_queue.complete(queue, "host2", ["1a01.cif", "1a02.cif"])
+    queue.close()
+
+    excluded = merge.queue_shards(queue_path)
+    assert excluded == {shard_paths[0]: {"1A01"}, shard_paths[1]: set()}
+    merge.merge_shards(output_database, list(excluded), verbose=False, excluded=excluded)
+
+    assert output_database.execute("SELECT entry_id FROM main ORDER BY entry_id").fetchall() == \
+        [("1A00",), ("1A01",), ("1A02",)]
+    assert output_database.execute("SELECT COUNT(*) FROM coils").fetchone() == (6,)
+    assert output_database.execute("SELECT COUNT(*) FROM files").fetchone() == (3,)
+
+
+def record_failure(shard_path: str, file_path: str, quarantined: bool = False):
+    con = sqlite3.connect(shard_path)
+    failures.init_failures(con.cursor())
+    quarantine.init_quarantine(con.cursor())
+    failures.record_failures(con.cursor(), [Failure(file_path, None, "guard" if quarantined else "sequence",
+                                                    "KeyError", "'A'", "2000-12-31T00:00:00+00:00")])
+    if quarantined:
+        con.execute("INSERT INTO quarantine VALUES(?, 10, 1000, 'timed out')", (file_path,))
+    con.commit()
+    con.close()
+
+
+def test_merge_shards_failures(make_shard, output_database):
+    """
+    Test that the failures and quarantine of every shard are merged, leaving out the files done in the queue.
+    """
+    shard_paths = [make_shard("host1.db", ["1A00"]), make_shard("host2.db", ["1A01"])]
+    record_failure(shard_paths[0], "7bad.cif")
+    record_failure(shard_paths[0], "1a01.cif")
+    record_failure(shard_paths[1], "8bad.cif", quarantined=True)
+    merge.merge_shards(output_database, shard_paths, verbose=False, done_paths={"1a00.cif", "1a01.cif"})
+
+    assert output_database.execute("SELECT path, stage FROM failures ORDER BY path").fetchall() == \
+        [("7bad.cif", "sequence"), ("8bad.cif", "guard")]
+    assert quarantine.load_quarantine(output_database.cursor()) == \
+        {"8bad.cif": QuarantineRecord("8bad.cif", 10, 1000, "timed out")}
+
+
+def test_merge_shards_coverage(make_shard, output_database):
+    """
+    Test that an entry missing from every shard is an error, unless its file failed in a shard.
+    """
+    shard_paths = [make_shard("shard0.db", ["1A00"]), make_shard("shard1.db", ["1A01"])]
+    record_failure(shard_paths[1], "mirror/a0/7bad.cif.gz", quarantined=True)
+    file_paths = ["mirror/a0/1a00.cif.gz", "mirror/a0/1a01.cif.gz", "mirror/a0/7bad.cif.gz", "mirror/a0/1a02.cif.gz"]
+    with pytest.raises(ValueError, match="1 entries are missing from every shard: 1A02"):
+        merge.merge_shards(output_database, shard_paths, verbose=False, file_paths=file_paths)
+    assert output_database.execute("SELECT COUNT(*) FROM main").fetchone() == (0,)
+
+    merge.merge_shards(output_database, shard_paths, verbose=False, file_paths=file_paths[:3])
+    assert output_database.execute("SELECT COUNT(*) FROM main").fetchone() == (2,)
@@ -11,7 +11,7 @@ import pytest
 from unittest.mock import patch, MagicMock
 import gemmi 
 
-from polymer_sequence import PolymerSequence, Monomer, letter_code_3to1, sequence_3to1, binary_search
+from polymer_sequence import PolymerSequence, Monomer, SecondaryStructure, ChainPolymer, empty_polymer, letter_code_3to1, sequence_3to1, binary_search
 
 
 def test_polymer_sequence_initialisation(mock_doc, fake_sequence_3to1):
@@ -201,6 +201,21 @@ def test_get_chain_annotated_subsequence_end_smaller_than_start_index(mock_binar
     assert result == "DNR"  # sequence is reversed 
 
 
+def test_get_chain_annotated_ranges(test_polymer_sequence, mock_span):
+    """
+    Test that the annotated sequence of every range is the same as that of get_chain_annotated_subsequence,
+    including ranges starting or ending at an unobserved residue.
+    """
+    span = mock_span[:4] + mock_span[5:]  # label_seq 5 is unobserved
+    test_chain_string = 'ARND-QEGHI'
+    ranges = [(1, 3), (4, 6), (5, 5), (6, 10)]
+
+    expected = [test_polymer_sequence.get_chain_annotated_subsequence(span, test_chain_string, start_id, end_id)
+                for start_id, end_id in ranges]
+    assert test_polymer_sequence.get_chain_annotated_ranges(span, test_chain_string, ranges) == expected
+    assert test_polymer_sequence.get_chain_annotated_ranges([], test_chain_string, ranges) == ["", "", "", ""]
+
+
 def test_contains_unconfirmed_residues_residues_within_range(test_polymer_sequence):
     test_polymer_sequence.bad_indices = [5, 10]
     # start_id: 0, end_id: 11
@@ -215,6 +230,16 @@ def test_contains_unconfirmed_residues_no_residues_in_range(test_polymer_sequenc
     assert result == 0
 
 
+def test_contains_unconfirmed_residues_outside_range(test_polymer_sequence):
+    """
+    Test that unconfirmed residues before and after the range are not counted.
+    """
+    test_polymer_sequence.bad_indices = [0, 10]
+    # start_id: 1, end_id: 9
+    result = test_polymer_sequence.contains_unconfirmed_residues('A', 2, 10)
+    assert result == 0
+
+
 def test_contains_unconfirmed_residues_no_bad_indices(test_polymer_sequence):
     test_polymer_sequence.bad_indices = []
     # start_id: 0, end_id: 11
@@ -222,6 +247,31 @@ def test_contains_unconfirmed_residues_no_bad_indices(test_polymer_sequence):
     assert result == 0
 
 
+def test_index_of(test_polymer_sequence):
+    assert test_polymer_sequence.index_of(0, 10, 5) == 4
+    # The sequence ids are not consecutive, so the index is searched for
+    test_polymer_sequence.sequence.pop(2)
+    assert test_polymer_sequence.index_of(0, 9, 5) == 3
+    with pytest.raises(Exception, match="Couldn't find index"):
+        test_polymer_sequence.index_of(0, 9, 3)
+
+
+def test_get_chain_ranges(test_polymer_sequence):
+    """
+    Test that the sequence and unconfirmed flag of every range are the same as those of get_chain_subsequence and
+    contains_unconfirmed_residues.
+    """
+    test_polymer_sequence.bad_indices = [1, 5, 6]
+    ranges = [(1, 1), (2, 4), (5, 5), (8, 11)]
+
+    expected = [(test_polymer_sequence.get_chain_subsequence('A', start_id, end_id)[0],
+                 test_polymer_sequence.contains_unconfirmed_residues('A', start_id, end_id))
+                for start_id, end_id in ranges]
+    assert test_polymer_sequence.get_chain_ranges('A', ranges) == expected
+    assert expected == [('A', 0), ('RND', 1), ('C', 0), ('GHIX', 0)]
+    assert test_polymer_sequence.get_chain_ranges('A', []) == []
+
+
 def test_get_chain_start_id(test_polymer_sequence):
     result = test_polymer_sequence.get_chain_start_id('A')
     assert result == 1
@@ -267,6 +317,78 @@ def test_get_chain_end_id_empty_sequence(test_polymer_sequence):
         test_polymer_sequence.get_chain_end_id('A')
 
 
+def test_get_helices(mock_structure, test_polymer_sequence, mock_helix):
+    """
+    Test that the helices of a structure are only resolved once, for every extractor given the same structure.
+    """
+    mock_chain = MagicMock(spec=gemmi.Chain)
+    mock_chain.name = 'A'
+    mock_structure[0].find_cra.return_value.chain = mock_chain
+    mock_chain.__getitem__.side_effect = lambda x: [MagicMock(label_seq=int(x))]
+    mock_structure.helices = [mock_helix]
+
+    expected = [SecondaryStructure('A', 'A', 1, 11)]
+    assert test_polymer_sequence.get_helices(mock_structure) == expected
+    assert test_polymer_sequence.get_helices(mock_structure) == expected
+    assert mock_structure[0].find_cra.call_count == 2
+
+    # Another structure is resolved again
+    other_structure = MagicMock(spec=gemmi.Structure)
+    other_structure.helices = []
+    assert test_polymer_sequence.get_helices(other_structure) == []
+
+
+def test_get_strands(mock_structure, test_polymer_sequence, mock_sheet, mock_strand):
+    mock_start_chain = MagicMock(spec=gemmi.Chain)
+    mock_start_chain.name = 'A'
+    mock_end_chain = MagicMock(spec=gemmi.Chain)
+    mock_end_chain.name = 'B'
+    mock_structure[0].find_cra.side_effect = [MagicMock(chain=mock_start_chain), MagicMock(chain=mock_end_chain)]
+    mock_start_chain.__getitem__.return_value = [MagicMock(label_seq=1)]
+    mock_end_chain.__getitem__.return_value = [MagicMock(label_seq=11)]
+    mock_sheet.strands = [mock_strand]
+    mock_structure.sheets = [mock_sheet]
+
+    expected = [[SecondaryStructure('A', 'B', 1, 11)]]
+    assert test_polymer_sequence.get_strands(mock_structure) == expected
+    assert test_polymer_sequence.get_strands(mock_structure) == expected
+    assert mock_structure[0].find_cra.call_count == 2
+
+
+def test_get_chain_polymers(mock_structure, test_polymer_sequence):
+    """
+    Test that the polymers of the chains are only computed once, keeping the first chain of a name, and that an
+    empty polymer has no author ids.
+    """
+    residues = [MagicMock(seqid=gemmi.SeqId(num, ' ')) for num in (5, 6, 8)]
+    mock_chain = MagicMock(spec=gemmi.Chain)
+    mock_chain.name = 'A'
+    mock_chain.get_polymer.return_value.first_conformer.return_value = residues
+    mock_chain.get_polymer.return_value.make_one_letter_sequence.return_value = 'AR-N'
+    mock_empty_chain = MagicMock(spec=gemmi.Chain)
+    mock_empty_chain.name = 'B'
+    mock_empty_chain.get_polymer.return_value.first_conformer.return_value = []
+    mock_duplicate_chain = MagicMock(spec=gemmi.Chain)
+    mock_duplicate_chain.name = 'A'
+    mock_structure.__getitem__.return_value = [mock_chain, mock_empty_chain, mock_duplicate_chain]
+
+    expected = {'A': ChainPolymer(residues, 'AR-N', 5, 8), 'B': empty_polymer}
+    assert test_polymer_sequence.get_chain_polymers(mock_structure) == expected
+    assert test_polymer_sequence.get_chain_polymers(mock_structure) == expected
+    mock_chain.get_polymer.assert_called_once()
+    mock_duplicate_chain.get_polymer.assert_not_called()
+
+
+@patch('polymer_sequence.PolymerSequence.binary_search')
+def test_get_secondary_structure_sequence(mock_binary_search, test_polymer_sequence):
+    mock_binary_search.side_effect = [0, 10]
+
+    assert test_polymer_sequence.get_secondary_structure_sequence(SecondaryStructure('A', 'A', 1, 11)) == \
+        ('ARNDCQEGHIX', 11)
+    assert test_polymer_sequence.get_secondary_structure_sequence(SecondaryStructure('A', 'B', 1, 11)) == \
+        ("MULTIPLE CHAINS ERROR", 0)
+
+
 @patch('polymer_sequence.PolymerSequence.binary_search')
 def test_get_helix_sequence(mock_binary_search, mock_structure, test_polymer_sequence, mock_helix):
     mock_chain = MagicMock(spec=gemmi.Chain)
@@ -0,0 +1,152 @@
+"""
+This script contains unit tests for testing methods in probe.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import io
+import gzip
+from unittest.mock import patch
+
+import probe
+
+HEADER = "data_1A00\n#\n_entry.id 1A00\n#\n"
+ATOM_SITE = "loop_\n_atom_site.group_PDB\n_atom_site.id\n" + "ATOM 1\n" * 1000 + "#\n"
+REVISION_LOOP = ("loop_\n"
+                 "_pdbx_audit_revision_history.ordinal\n"
+                 "_pdbx_audit_revision_history.data_content_type\n"
+                 "_pdbx_audit_revision_history.revision_date\n"
+                 "1 'Structure model' 1998-04-08\n"
+                 "2 \"Structure model\" 2003-04-01\n"
+                 "3 'Structure model' 2011-07-13\n"
+                 "#\n")
+REVISION_SINGLE = ("_pdbx_audit_revision_history.ordinal 1\n"
+                   "_pdbx_audit_revision_history.data_content_type 'Structure model'\n"
+                   "_pdbx_audit_revision_history.revision_date 1998-04-08\n"
+                   "#\n")
+
+
+class RecordingFile(io.BytesIO):
+    """
+    File that records how far it was read before being closed.
+    """
+    def close(self):
+        self.position = self.tell()
+        super().close()
+
+
+def test_probe_file_loop(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_text(HEADER + ATOM_SITE + REVISION_LOOP)
+
+    assert probe.probe_file(str(path)) == ("1A00", "2011-07-13")
+
+
+def test_probe_file_single_value(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_text(HEADER + REVISION_SINGLE + ATOM_SITE)
+
+    assert probe.probe_file(str(path)) == ("1A00", "1998-04-08")
+
+
+def test_probe_file_gzip(tmp_path):
+    path = tmp_path / "1a00.cif.gz"
+    with gzip.open(path, "wt") as file:
+        file.write(HEADER + ATOM_SITE + REVISION_LOOP)
+
+    assert probe.probe_file(str(path)) == ("1A00", "2011-07-13")
+
+
+def test_probe_file_marker_between_chunks(tmp_path):
+    """
+    Test that the revision history is found when it is split between two chunks.
+    """
+    path = tmp_path / "1a00.cif"
+    path.write_text(HEADER + ATOM_SITE + REVISION_LOOP)
+    start = (HEADER + ATOM_SITE + REVISION_LOOP).index("\n_pdbx_audit_revision_history.")
+
+    with patch("probe.chunk_size", start + 10):
+        assert probe.probe_file(str(path)) == ("1A00", "2011-07-13")
+
+
+def test_probe_file_stops_before_atom_site(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_text(HEADER + REVISION_SINGLE + ATOM_SITE)
+    file = RecordingFile(path.read_bytes())
+
+    with patch("probe.chunk_size", len(HEADER + REVISION_SINGLE) + 1), \
+         patch("cif_file.open_file", return_value=file):
+        assert probe.probe_file(str(path)) == ("1A00", "1998-04-08")
+
+    assert file.position <= len(HEADER + REVISION_SINGLE) + 1
+
+
+def test_probe_file_missing_revision_history(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_text(HEADER + ATOM_SITE)
+
+    assert probe.probe_file(str(path)) is None
+
+
+def test_probe_file_missing_entry_id(tmp_path):
+    path = tmp_path / "1a00.cif"
+    path.write_text("data_1A00\n#\n" + REVISION_LOOP)
+
+    assert probe.probe_file(str(path)) is None
+
+
+def test_probe_file_without_separators(tmp_path):
+    """
+    Test that the revision history ends at the next loop or category in a file without "#" separators,
+    instead of taking the values of the categories after it as revisions.
+    """
+    content = (HEADER + REVISION_LOOP + "loop_\n_pdbx_audit_revision_details.ordinal\n"
+               "_pdbx_audit_revision_details.provider\n1 repository\n2 author\n"
+               "_pdbx_database_status.recvd_initial_deposition_date 1997-12-01\n" + ATOM_SITE).replace("#\n", "")
+    path = tmp_path / "1a00.cif"
+    path.write_text(content)
+
+    assert probe.probe_file(str(path)) == ("1A00", "2011-07-13")
+
+    path.write_text((HEADER + REVISION_SINGLE + "_pdbx_database_status.status_code REL\n" + ATOM_SITE)
+                    .replace("#\n", ""))
+    assert probe.probe_file(str(path)) == ("1A00", "1998-04-08")
+
+
+def test_probe_file_unreadable():
+    assert probe.probe_file("test_path/missing.cif") is None
+
+
+def test_parse_revision_date_text_field():
+    """
+    Test that values spanning several lines do not shift the columns of the loop.
+    """
+    lines = ["_pdbx_audit_revision_history.ordinal",
+             "_pdbx_audit_revision_history.details",
+             "_pdbx_audit_revision_history.revision_date",
+             "1",
+             ";First line",
+             "second line",
+             ";",
+             "2000-12-31"]
+
+    assert probe.parse_revision_date(lines, True) == "2000-12-31"
+
+
+def test_parse_revision_date_partial_row():
+    """
+    Test that no date is returned when the values do not fill whole rows, so that the file is parsed in full.
+    """
+    lines = ["_pdbx_audit_revision_history.ordinal",
+             "_pdbx_audit_revision_history.revision_date",
+             "1 1998-04-08",
+             "2 2003-04-01",
+             "3"]
+
+    assert probe.parse_revision_date(lines, True) is None
+
+
+def test_tokenize():
+    assert probe.tokenize("1 'Structure model' \"it's\" 2000-12-31") == ["1", "Structure model", "it's", "2000-12-31"]
@@ -0,0 +1,96 @@
+"""
+This script contains unit tests for testing methods in quarantine.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import os
+import pytest
+import sqlite3
+
+import quarantine
+from quarantine import QuarantineRecord
+
+
+@pytest.fixture
+def test_cursor():
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    quarantine.init_quarantine(cur)
+    yield cur
+    con.close()
+
+
+@pytest.fixture
+def test_files(tmp_path):
+    file_paths = []
+    for name in ("1a00.cif", "1a01.cif"):
+        (tmp_path / name).write_text("data_" + name)
+        file_paths.append(str(tmp_path / name))
+    return file_paths
+
+
+def test_quarantine_file(test_cursor, test_files):
+    quarantine.quarantine_file(test_cursor, test_files[0], "Ran out of memory")
+    stat = os.stat(test_files[0])
+
+    assert quarantine.load_quarantine(test_cursor) == \
+        {test_files[0]: QuarantineRecord(test_files[0], stat.st_size, stat.st_mtime_ns, "Ran out of memory")}
+
+
+def test_load_quarantine_of_files(test_cursor, test_files):
+    for file_path in test_files:
+        quarantine.quarantine_file(test_cursor, file_path, "Ran out of memory")
+
+    assert list(quarantine.load_quarantine(test_cursor, [test_files[1], "1a02.cif"])) == [test_files[1]]
+
+
+def test_skip_quarantined(test_cursor, test_files):
+    quarantine.quarantine_file(test_cursor, test_files[0], "Ran out of memory")
+    quarantined = quarantine.load_quarantine(test_cursor)
+
+    assert list(quarantine.skip_quarantined(test_cursor, test_files, quarantined)) == [test_files[1]]
+    assert test_files[0] in quarantine.load_quarantine(test_cursor)
+
+
+def test_skip_quarantined_changed_file(test_cursor, test_files):
+    """
+    Test that a quarantined file is released once it changes.
+    """
+    quarantine.quarantine_file(test_cursor, test_files[0], "Ran out of memory")
+    quarantined = quarantine.load_quarantine(test_cursor)
+    with open(test_files[0], "a") as file:
+        file.write("\n_entry.id 1A00\n")
+
+    assert list(quarantine.skip_quarantined(test_cursor, test_files, quarantined)) == test_files
+    assert quarantine.load_quarantine(test_cursor) == {}
+
+
+def test_skip_quarantined_missing_file(test_cursor, test_files):
+    """
+    Test that a quarantined file removed since it was found is passed on, to fail when it is read,
+    instead of stopping the run.
+    """
+    quarantine.quarantine_file(test_cursor, test_files[0], "Ran out of memory")
+    quarantined = quarantine.load_quarantine(test_cursor)
+    os.remove(test_files[0])
+
+    assert list(quarantine.skip_quarantined(test_cursor, test_files, quarantined)) == test_files
+
+
+def test_quarantine_missing_file(test_cursor, test_files):
+    """
+    Test that a file removed after it ran out of time or memory is still recorded, without a size,
+    and released once it is found again.
+    """
+    os.remove(test_files[0])
+    quarantine.quarantine_file(test_cursor, test_files[0], "Timed out")
+
+    quarantined = quarantine.load_quarantine(test_cursor)
+    assert quarantined == {test_files[0]: QuarantineRecord(test_files[0], None, None, "Timed out")}
+    with open(test_files[0], "w") as file:
+        file.write("data_1a00.cif")
+    assert list(quarantine.skip_quarantined(test_cursor, test_files, quarantined)) == test_files
+    assert quarantine.load_quarantine(test_cursor) == {}
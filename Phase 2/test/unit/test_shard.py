@@ -0,0 +1,61 @@
+"""
+This script contains unit tests for testing methods in shard.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+
+import shard
+
+TEST_FILE_PATHS = ["mmCIF/a0/1a00.cif.gz", "mmCIF/a0/2a0b.cif", "mmCIF/b1/3b1c.cif.gz", "mmCIF/zz/9zzz.cif"]
+
+
+def test_entry_id_of():
+    assert shard.entry_id_of("mmCIF/a0/1a00.cif.gz") == "1A00"
+    assert shard.entry_id_of("2a0b.cif") == "2A0B"
+
+
+def test_directory_of():
+    assert shard.directory_of("1A00") == "a0"
+
+
+def test_hash_shards_partition_files():
+    """
+    Test that every file belongs to exactly one of the hash shards.
+    """
+    entry_ids = [f"{number}{letter}{index:02d}" for number in range(1, 10) for letter in "abcxyz" for index in range(20)]
+    shards = [shard.parse_shard(f"hash:{index}/4") for index in range(4)]
+
+    for entry_id in entry_ids:
+        assert sum(in_shard(entry_id) for in_shard in shards) == 1
+    # the shards are roughly balanced
+    for in_shard in shards:
+        assert len(entry_ids) / 8 < sum(map(in_shard, entry_ids)) < len(entry_ids) / 2
+
+
+def test_hash_shard_stable():
+    """
+    Test that the shard of an entry is the same in every process, unlike with hash().
+    """
+    assert shard.hash_shard("1A00", 7) == 3776225648 % 7
+
+
+def test_shard_files_directory_range():
+    result = list(shard.shard_files(TEST_FILE_PATHS, "dirs:a0-b1"))
+
+    assert result == TEST_FILE_PATHS[:3]
+
+
+def test_shard_files_directory_list():
+    result = list(shard.shard_files(TEST_FILE_PATHS, "dirs:A0,zz"))
+
+    assert result == ["mmCIF/a0/1a00.cif.gz", "mmCIF/a0/2a0b.cif", "mmCIF/zz/9zzz.cif"]
+
+
+@pytest.mark.parametrize("spec", ["hash:4/4", "hash:1", "hash:a/4", "dirs:", "a0-b1", "letters:a"])
+def test_parse_shard_invalid(spec):
+    with pytest.raises(ValueError):
+        shard.parse_shard(spec)
@@ -46,6 +46,19 @@ def test_create_table(test_table):
 
     assert result == expected
 
+def test_create_indexes(test_table):
+    test_table.attributes.indexes = [["a"], ["id", "a"]]
+    expected = ["CREATE INDEX IF NOT EXISTS test_table_a ON test_table (a)",
+                "CREATE INDEX IF NOT EXISTS test_table_id_a ON test_table (id, a)"]
+    result = test_table.create_indexes()
+
+    assert result == expected
+
+def test_create_indexes_no_indexes(test_table):
+    test_table.attributes.indexes = []
+
+    assert test_table.create_indexes() == []
+
 def test_retrieve_default_columns(test_table):
     expected = "SELECT * FROM test_table"
     result = test_table.retrieve()
@@ -88,6 +101,12 @@ def test_insert_row_invalid_data(test_table):
     with pytest.raises(TypeError):
         test_table.insert_row(invalid_test_data)
 
+def test_delete_entry(test_table):
+    expected = "DELETE FROM test_table WHERE id = ?"
+    result = test_table.delete_entry()
+
+    assert result == expected
+
 def test_update_row(test_table):
     test_data = {"col1": "value1", "col2": "value2"}
     test_primary_key_values = ["1"]
@@ -0,0 +1,91 @@
+"""
+This script contains unit tests for testing methods in upsert.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+import sqlite3
+from collections import Counter
+from unittest.mock import MagicMock
+
+import upsert
+import table
+from attributes import Attributes
+from upsert import RowChanges
+
+
+@pytest.fixture
+def coil_table():
+    attributes = Attributes([("entry_id", "VARCHAR"), ("coil_id", "INT"), ("coil_sequence", "VARCHAR"),
+                             ("length", "INT")], primary_keys=["entry_id", "coil_id"])
+    return table.Table("coils", attributes, MagicMock())
+
+
+@pytest.fixture
+def test_cursor(coil_table):
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    cur.execute(coil_table.create_table())
+    cur.executemany("INSERT INTO coils VALUES(?, ?, ?, ?)",
+                    [("1A00", 1, "AAA", 3), ("1A00", 2, "CC", 2), ("1A00", 3, "G", 1), ("1A01", 1, "TT", 2)])
+    yield cur
+    con.close()
+
+
+def stored_rows(cur: sqlite3.Cursor) -> list[tuple]:
+    return cur.execute("SELECT rowid, * FROM coils ORDER BY entry_id, coil_id").fetchall()
+
+
+def test_replace_rows(test_cursor, coil_table):
+    changes = upsert.replace_rows(test_cursor, coil_table, ["1A00"],
+                                  [("1A00", 1, "AAA", 3), ("1A00", 2, "CCC", 3), ("1A00", 4, "W", 1)])
+
+    assert changes == RowChanges(inserted=1, updated=1, deleted=1, unchanged=1)
+    assert stored_rows(test_cursor) == [(1, "1A00", 1, "AAA", 3), (2, "1A00", 2, "CCC", 3), (5, "1A00", 4, "W", 1),
+                                        (4, "1A01", 1, "TT", 2)]
+
+
+def test_replace_rows_unchanged(test_cursor, coil_table):
+    """
+    Test that rows equal to the stored ones once stored are not written, even if their Python types differ.
+    """
+    before = stored_rows(test_cursor)
+    changes = upsert.replace_rows(test_cursor, coil_table, ["1A00"],
+                                  [("1A00", "1", "AAA", 3.0), ("1A00", 2, "CC", "2"), ("1A00", 3, "G", 1)])
+
+    assert changes == RowChanges(unchanged=3)
+    assert stored_rows(test_cursor) == before
+
+
+def test_replace_rows_no_rows(test_cursor, coil_table):
+    changes = upsert.replace_rows(test_cursor, coil_table, ["1A00"], [])
+
+    assert changes == RowChanges(deleted=3)
+    assert stored_rows(test_cursor) == [(4, "1A01", 1, "TT", 2)]
+
+
+def test_replace_rows_several_entries(test_cursor, coil_table):
+    changes = upsert.replace_rows(test_cursor, coil_table, ["1A01", "1A02"],
+                                  [("1A01", 1, "TT", 2), ("1A02", 1, "A", 1)])
+
+    assert changes == RowChanges(inserted=1, unchanged=1)
+    assert len(stored_rows(test_cursor)) == 5
+
+
+def test_replace_rows_duplicate_key(test_cursor, coil_table):
+    before = stored_rows(test_cursor)
+    with pytest.raises(sqlite3.IntegrityError):
+        upsert.replace_rows(test_cursor, coil_table, ["1A00"], [("1A00", 1, "AAA", 3), ("1A00", 1, "A", 1)])
+
+    assert stored_rows(test_cursor) == before
+
+
+def test_describe():
+    row_changes = Counter()
+    upsert.count_changes(row_changes, RowChanges(inserted=2, unchanged=5))
+    upsert.count_changes(row_changes, RowChanges(updated=1, deleted=1))
+
+    assert upsert.describe(row_changes) == "2 inserted, 1 updated, 1 deleted, 5 unchanged rows"
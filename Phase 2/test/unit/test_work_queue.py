@@ -0,0 +1,149 @@
+"""
+This script contains unit tests for testing methods in work_queue.py.
+Make sure to run from the Phase 2 directory for the correct relative paths.
+
+To run a specific test module, use the command "pytest test/unit/test_something.py".
+To run all tests in the test directory, use the command "pytest test/".
+Output verbosity can be adjusted by using the relevant flags in the command (e.g. -q, -v, -vv).
+"""
+import pytest
+
+import work_queue
+from work_queue import Worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    con = work_queue.connect(str(tmp_path / "queue.db"))
+    work_queue.enqueue(con, ["1a00.cif", "1a01.cif", "1a02.cif"])
+    yield con
+    con.close()
+
+
+def test_enqueue_skips_queued_files(queue):
+    assert work_queue.enqueue(queue, ["1a02.cif", "1a03.cif"]) == 1
+    assert work_queue.counts(queue.cursor()) == {"pending": 4}
+
+
+def test_claim(queue):
+    assert work_queue.claim(queue, "host1", 2, 60, now=lambda: 1000) == ["1a00.cif", "1a01.cif"]
+    assert work_queue.claim(queue, "host2", 2, 60, now=lambda: 1000) == ["1a02.cif"]
+    assert work_queue.claim(queue, "host3", 2, 60, now=lambda: 1000) == []
+
+    assert queue.execute("SELECT * FROM queue WHERE path = '1a00.cif'").fetchone() == \
+        ("1a00.cif", "leased", "host1", 1060, 1)
+    assert queue.in_transaction is False
+
+
+def test_claim_expired_lease(queue):
+    work_queue.claim(queue, "host1", 3, 60, now=lambda: 1000)
+    assert work_queue.claim(queue, "host2", 3, 60, now=lambda: 1059) == []
+    assert work_queue.claim(queue, "host2", 3, 60, now=lambda: 1061) == ["1a00.cif", "1a01.cif", "1a02.cif"]
+    assert queue.execute("SELECT worker_id, attempts FROM queue WHERE path = '1a00.cif'").fetchone() == ("host2", 2)
+
+
+def test_claim_fails_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(work_queue, "max_attempts", 2)
+    work_queue.claim(queue, "host1", 3, 60, now=lambda: 1000)
+    work_queue.complete(queue, "host1", ["1a01.cif", "1a02.cif"])
+    assert work_queue.claim(queue, "host2", 3, 60, now=lambda: 2000) == ["1a00.cif"]
+    # 1a00.cif was claimed twice without being written, so it is given up on
+    assert work_queue.claim(queue, "host3", 3, 60, now=lambda: 3000) == []
+    assert work_queue.counts(queue.cursor()) == {"done": 2, "failed": 1}
+    assert work_queue.is_finished(queue.cursor()) is True
+
+
+def test_complete(queue):
+    work_queue.claim(queue, "host1", 2, 60, now=lambda: 1000)
+    assert work_queue.complete(queue, "host1", ["1a00.cif", "1a01.cif"]) == []
+    assert work_queue.counts(queue.cursor()) == {"done": 2, "pending": 1}
+    assert work_queue.owners(queue.cursor()) == {"1a00.cif": "host1", "1a01.cif": "host1"}
+
+
+def test_complete_lost_lease(queue):
+    work_queue.claim(queue, "host1", 3, 60, now=lambda: 1000)
+    work_queue.claim(queue, "host2", 3, 60, now=lambda: 2000)
+    assert work_queue.complete(queue, "host1", ["1a00.cif"]) == ["1a00.cif"]
+    assert work_queue.complete(queue, "host2", ["1a00.cif"]) == []
+    assert work_queue.owners(queue.cursor()) == {"1a00.cif": "host2"}
+
+
+def test_is_finished(queue):
+    assert work_queue.is_finished(queue.cursor()) is False
+    work_queue.claim(queue, "host1", 3, 60)
+    assert work_queue.is_finished(queue.cursor()) is False
+    work_queue.complete(queue, "host1", ["1a00.cif", "1a01.cif", "1a02.cif"])
+    assert work_queue.is_finished(queue.cursor()) is True
+
+
+def test_load_queue(tmp_path, queue):
+    work_queue.register_worker(queue, "host1", "/shared/host1.db")
+    work_queue.register_worker(queue, "host1", "/shared/host1-new.db")
+    work_queue.claim(queue, "host1", 1, 60)
+    work_queue.complete(queue, "host1", ["1a00.cif"])
+
+    assert work_queue.load_queue(str(tmp_path / "queue.db")) == \
+        ({"1a00.cif": "host1"}, [Worker("host1", "/shared/host1-new.db")])
+
+
+def written(batches: list[list[str]], failing: set[str] = set()):
+    """
+    Returns a process function for run_worker recording its batches, which writes every file but the failing ones.
+    """
+    def process(file_paths: list[str]) -> list[str]:
+        batches.append(file_paths)
+        return [file_path for file_path in file_paths if file_path not in failing]
+    return process
+
+
+def test_release(queue, monkeypatch):
+    monkeypatch.setattr(work_queue, "max_attempts", 2)
+    work_queue.claim(queue, "host1", 2, 60, now=lambda: 1000)
+    assert work_queue.release(queue, "host1", ["1a00.cif"]) == []
+    assert work_queue.counts(queue.cursor()) == {"pending": 2, "leased": 1}
+    # a file leased to another worker is left alone
+    assert work_queue.release(queue, "host2", ["1a01.cif"]) == []
+    assert work_queue.claim(queue, "host1", 3, 60, now=lambda: 1000) == ["1a00.cif", "1a02.cif"]
+    assert work_queue.release(queue, "host1", ["1a00.cif"]) == ["1a00.cif"]
+    assert queue.execute("SELECT status, lease_expires, attempts FROM queue WHERE path = '1a00.cif'").fetchone() == \
+        ("failed", None, 2)
+    assert queue.in_transaction is False
+
+
+def test_run_worker(queue):
+    batches = []
+    work_queue.run_worker(queue, "host1", 2, 60, written(batches), verbose=False)
+
+    assert batches == [["1a00.cif", "1a01.cif"], ["1a02.cif"]]
+    assert work_queue.counts(queue.cursor()) == {"done": 3}
+
+
+def test_run_worker_failed_file(queue, monkeypatch):
+    """
+    Test that a file that was not written is not marked as done, but handed out again until it is marked as failed.
+    """
+    monkeypatch.setattr(work_queue, "max_attempts", 2)
+    batches = []
+    work_queue.run_worker(queue, "host1", 2, 60, written(batches, failing={"1a01.cif"}), verbose=False)
+
+    assert batches == [["1a00.cif", "1a01.cif"], ["1a01.cif", "1a02.cif"]]
+    assert work_queue.counts(queue.cursor()) == {"done": 2, "failed": 1}
+    assert work_queue.owners(queue.cursor()) == {"1a00.cif": "host1", "1a02.cif": "host1"}
+
+
+def test_run_worker_waits_for_other_leases(queue, monkeypatch):
+    work_queue.claim(queue, "host2", 1, 60)
+    sleeps = []
+
+    def sleep(seconds):
+        # host2 finishes its file while host1 waits
+        sleeps.append(seconds)
+        work_queue.complete(queue, "host2", ["1a00.cif"])
+
+    monkeypatch.setattr(work_queue.time, "sleep", sleep)
+    batches = []
+    work_queue.run_worker(queue, "host1", 5, 60, written(batches), verbose=False)
+
+    assert batches == [["1a01.cif", "1a02.cif"]]
+    assert sleeps == [work_queue.poll_interval]
+    assert work_queue.owners(queue.cursor()) == {"1a00.cif": "host2", "1a01.cif": "host1", "1a02.cif": "host1"}
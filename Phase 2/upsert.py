@@ -0,0 +1,66 @@
+"""
+This script contains the diff-based update of the rows of revised entries, used by commands.BatchWriter.
+Instead of deleting all the rows of an entry and inserting them again, the extracted rows are staged in a
+temporary table with the same columns and primary key, and compared with the stored rows in SQL, so that
+only the rows that were inserted, changed or deleted by the revision are written. As the staged values go
+through the same column types as the stored ones, they compare equal whenever storing them would give the
+same row. Most revisions only change the metadata of an entry, so most of its rows are left untouched,
+along with their index entries and pages.
+"""
+
+import sqlite3
+from collections import Counter
+from typing import NamedTuple
+from table import Table
+
+class RowChanges(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
+def staged_table(table_scheme: Table) -> str:
+    return "temp.staged_" + table_scheme.name
+
+def create_staged_table(cur: sqlite3.Cursor, table_scheme: Table):
+    attributes = table_scheme.attributes
+    columns = ", ".join(f"{name} {type}" for name, type in zip(attributes.attribute_names, attributes.attribute_types))
+    cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS staged_{table_scheme.name} "
+                f"({columns}, PRIMARY KEY ({', '.join(attributes.primary_keys)}))")
+
+def replace_rows(cur: sqlite3.Cursor, table_scheme: Table, entry_ids: list[str], rows: list[tuple]) -> RowChanges:
+    """
+    Replaces the rows of the given entries in the table with the given rows, only writing the rows that differ.
+    Rows are matched by primary key, so the table must have one.
+    Raises an sqlite3.IntegrityError if two of the rows have the same primary key, as inserting them would.
+    """
+    staged = staged_table(table_scheme)
+    create_staged_table(cur, table_scheme)
+    cur.execute(f"DELETE FROM {staged}")
+    if rows:
+        cur.executemany(f"INSERT INTO {staged} VALUES({', '.join('?' * len(rows[0]))})", rows)
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS staged_entries (entry_id VARCHAR PRIMARY KEY)")
+    cur.execute("DELETE FROM temp.staged_entries")
+    cur.executemany("INSERT OR IGNORE INTO temp.staged_entries VALUES(?)", [(entry_id,) for entry_id in entry_ids])
+
+    name = table_scheme.name
+    keys = table_scheme.attributes.primary_keys
+    # The first attribute of every table is its entry ID
+    in_entries = f"{table_scheme.attributes.attribute_names[0]} IN (SELECT entry_id FROM temp.staged_entries)"
+    deleted = cur.execute(f"DELETE FROM {name} WHERE {in_entries} AND NOT EXISTS (SELECT 1 FROM {staged} AS staged "
+                          f"WHERE {' AND '.join(f'staged.{key} IS {name}.{key}' for key in keys)})").rowcount
+    inserted = cur.execute(f"SELECT COUNT(*) FROM {staged} AS staged WHERE NOT EXISTS (SELECT 1 FROM {name} "
+                           f"WHERE {' AND '.join(f'{name}.{key} IS staged.{key}' for key in keys)})").fetchone()[0]
+    values = [column for column in table_scheme.attributes.attribute_names if column not in keys]
+    on_conflict = f"DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in values)}" \
+        if values else "DO NOTHING"
+    # Rows equal to a stored row are left out, the others are inserted or overwrite the row with their primary key
+    changed = cur.execute(f"INSERT INTO {name} SELECT * FROM {staged} EXCEPT SELECT * FROM {name} WHERE {in_entries} "
+                          f"ON CONFLICT ({', '.join(keys)}) {on_conflict}").rowcount
+    return RowChanges(inserted, changed - inserted, deleted, len(rows) - changed)
+
+def count_changes(row_changes: Counter, changes: RowChanges):
+    row_changes.update(changes._asdict())
+
+def describe(row_changes: Counter) -> str:
+    return ", ".join(f"{row_changes[field]} {field}" for field in RowChanges._fields) + " rows"
@@ -0,0 +1,205 @@
+"""
+This script contains the work queue used to share the extraction of the protein files between any number of
+machines. The queue is an SQLite database on storage shared by all the machines, listing every file with its
+status. Each worker claims a batch of pending files with a lease that expires after a while, writes their rows
+to its own shard database, then marks them as done. The files of a worker that crashed (or stalled) are claimed
+again by another worker once their lease expires, so a run finishes as soon as the fastest workers have
+worked through the queue. A file whose lease expired max_attempts times is marked as failed, so a file that
+crashes every worker reading it does not stop the run.
+
+A file is only marked as done after its rows are committed to the worker's shard, so a file may end up in
+two shards if its lease expired in between; merge.py --queue keeps it from the worker that marked it as done.
+A file that was not written, because reading or extracting it failed or it was quarantined, is released instead:
+it is handed out again until it was claimed max_attempts times, and then marked as failed. Its failure is kept in
+the failures and quarantine tables of the worker's shard, which merge.py copies along with the rows.
+"""
+
+import time
+import sqlite3
+from typing import NamedTuple, Iterable, Callable
+from table import Table
+from attributes import Attributes
+
+class QueueItem(NamedTuple):
+    path: str
+    status: str # "pending", "leased", "done" or "failed"
+    worker_id: str | None # Worker holding the lease, or that marked the file as done
+    lease_expires: float | None # Time (in seconds since the epoch) at which the lease expires
+    attempts: int # Number of times the file was claimed
+
+class Worker(NamedTuple):
+    worker_id: str
+    database: str # Location of the shard database the worker writes to
+
+queue_table_attributes = Attributes[QueueItem]\
+    ([("path", "VARCHAR NOT NULL"), ("status", "VARCHAR(10) NOT NULL"), ("worker_id", "VARCHAR"),
+      ("lease_expires", "FLOAT"), ("attempts", "INT NOT NULL")],
+      primary_keys=["path"],
+      indexes=[["status", "lease_expires"]])
+queue_table = Table("queue", queue_table_attributes, None)
+
+worker_table_attributes = Attributes[Worker]\
+    ([("worker_id", "VARCHAR NOT NULL"), ("database", "VARCHAR NOT NULL")],
+      primary_keys=["worker_id"])
+worker_table = Table("workers", worker_table_attributes, None)
+
+max_attempts = 3
+timeout = 60 # Seconds a connection waits for another machine to release its lock on the queue
+poll_interval = 30 # Seconds a worker waits for the leases of other workers when no file is pending
+
+def connect(queue_path: str) -> sqlite3.Connection:
+    """
+    Connects to the queue database. Transactions are begun explicitly, with BEGIN IMMEDIATE,
+    so that two workers never claim the same files.
+    """
+    con = sqlite3.connect(queue_path, timeout=timeout, isolation_level=None)
+    cur = con.cursor()
+    for table_scheme in (queue_table, worker_table):
+        cur.execute(table_scheme.create_table())
+        for statement in table_scheme.create_indexes():
+            cur.execute(statement)
+    return con
+
+def enqueue(con: sqlite3.Connection, file_paths: Iterable[str]) -> int:
+    """
+    Adds the files that are not in the queue yet, and returns how many were added.
+    """
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    before = con.total_changes
+    cur.executemany("INSERT OR IGNORE INTO " + queue_table.name + " VALUES(?, 'pending', NULL, NULL, 0)",
+                    ((file_path,) for file_path in file_paths))
+    added = con.total_changes - before
+    cur.execute("COMMIT")
+    return added
+
+def register_worker(con: sqlite3.Connection, worker_id: str, database: str):
+    con.execute("INSERT OR REPLACE INTO " + worker_table.name + " VALUES(?, ?)", (worker_id, database))
+
+def claim(con: sqlite3.Connection, worker_id: str, batch_size: int, lease_seconds: float,
+          now: Callable[[], float] = time.time) -> list[str]:
+    """
+    Leases up to batch_size files to the worker, taking pending files and files whose lease expired.
+    Files whose lease expired max_attempts times are marked as failed instead.
+    """
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        current_time = now()
+        cur.execute("UPDATE " + queue_table.name + " SET status = 'failed', lease_expires = NULL "
+                    "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (current_time, max_attempts))
+        file_paths = [row[0] for row in cur.execute(
+            "SELECT path FROM " + queue_table.name + " WHERE status = 'pending' "
+            "OR (status = 'leased' AND lease_expires < ?) LIMIT ?", (current_time, batch_size))]
+        cur.executemany("UPDATE " + queue_table.name + " SET status = 'leased', worker_id = ?, lease_expires = ?, "
+                        "attempts = attempts + 1 WHERE path = ?",
+                        [(worker_id, current_time + lease_seconds, file_path) for file_path in file_paths])
+        cur.execute("COMMIT")
+    except sqlite3.Error:
+        cur.execute("ROLLBACK")
+        raise
+    return file_paths
+
+def complete(con: sqlite3.Connection, worker_id: str, file_paths: list[str]) -> list[str]:
+    """
+    Marks the files leased to the worker as done.
+    Returns the files whose lease the worker no longer holds, as they were claimed by another worker.
+    """
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        lost = []
+        for file_path in file_paths:
+            cur.execute("UPDATE " + queue_table.name + " SET status = 'done', lease_expires = NULL "
+                        "WHERE path = ? AND worker_id = ? AND status = 'leased'", (file_path, worker_id))
+            if cur.rowcount == 0:
+                lost.append(file_path)
+        cur.execute("COMMIT")
+    except sqlite3.Error:
+        cur.execute("ROLLBACK")
+        raise
+    return lost
+
+def release(con: sqlite3.Connection, worker_id: str, file_paths: list[str]) -> list[str]:
+    """
+    Hands the files leased to the worker that it did not write back to the queue, marking those claimed
+    max_attempts times as failed instead.
+    Returns the files marked as failed.
+    """
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        failed = []
+        for file_path in file_paths:
+            row = cur.execute("SELECT attempts FROM " + queue_table.name + " WHERE path = ? AND worker_id = ? "
+                              "AND status = 'leased'", (file_path, worker_id)).fetchone()
+            if row is None:
+                continue
+            status = "failed" if row[0] >= max_attempts else "pending"
+            cur.execute("UPDATE " + queue_table.name + " SET status = ?, lease_expires = NULL WHERE path = ?",
+                        (status, file_path))
+            if status == "failed":
+                failed.append(file_path)
+        cur.execute("COMMIT")
+    except sqlite3.Error:
+        cur.execute("ROLLBACK")
+        raise
+    return failed
+
+def counts(cur: sqlite3.Cursor) -> dict[str, int]:
+    """
+    Returns the number of files with each status.
+    """
+    return dict(cur.execute("SELECT status, COUNT(*) FROM " + queue_table.name + " GROUP BY status").fetchall())
+
+def is_finished(cur: sqlite3.Cursor) -> bool:
+    """
+    Returns whether every file is either done or failed.
+    """
+    status_counts = counts(cur)
+    return not status_counts.get("pending") and not status_counts.get("leased")
+
+def owners(cur: sqlite3.Cursor) -> dict[str, str]:
+    """
+    Returns the worker that marked each done file as done.
+    """
+    return dict(cur.execute("SELECT path, worker_id FROM " + queue_table.name + " WHERE status = 'done'").fetchall())
+
+def load_queue(queue_path: str) -> tuple[dict[str, str], list[Worker]]:
+    """
+    Loads the owners of the done files and the registered workers, without modifying the queue.
+    """
+    con = sqlite3.connect(f"file:{queue_path}?mode=ro", uri=True)
+    try:
+        cur = con.cursor()
+        return owners(cur), workers(cur)
+    finally:
+        con.close()
+
+def workers(cur: sqlite3.Cursor) -> list[Worker]:
+    return [Worker(*row) for row in cur.execute(worker_table.retrieve())]
+
+def run_worker(con: sqlite3.Connection, worker_id: str, batch_size: int, lease_seconds: float,
+               process: Callable[[list[str]], list[str]], verbose: bool = True):
+    """
+    Claims batches of files and passes each to process, which returns the files it has written,
+    until every file of the queue is done or failed. The written files are marked as done, and the others
+    are released (see release). While the only files left are leased to other workers, the queue is polled
+    every poll_interval seconds, so the files of a worker that crashed are taken over once its leases expire.
+    """
+    cur = con.cursor()
+    while True:
+        file_paths = claim(con, worker_id, batch_size, lease_seconds)
+        if not file_paths:
+            if is_finished(cur):
+                return
+            time.sleep(poll_interval)
+            continue
+        written = set(process(file_paths))
+        lost = complete(con, worker_id, [file_path for file_path in file_paths if file_path in written])
+        failed = release(con, worker_id, [file_path for file_path in file_paths if file_path not in written])
+        if lost and verbose:
+            print(f"The lease on {len(lost)} files expired before they were written, "
+                  "they were claimed by another worker")
+        if failed and verbose:
+            print(f"{len(failed)} files were not written after {max_attempts} attempts, they are marked as failed")